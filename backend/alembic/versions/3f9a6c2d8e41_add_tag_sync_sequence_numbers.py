@@ -0,0 +1,32 @@
+"""Add commit-ordered tag sync sequence numbers to games, tags and tag tombstones
+
+Revision ID: 3f9a6c2d8e41
+Revises: 7c1d4e2a9b63
+Create Date: 2026-10-18 18:02:47.330912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a6c2d8e41'
+down_revision: Union[str, None] = '7c1d4e2a9b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('games', sa.Column('tag_sync_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('team_stats_tags', sa.Column('sync_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('player_stats_tags', sa.Column('sync_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('tag_tombstones', sa.Column('sync_seq', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('tag_tombstones', 'sync_seq')
+    op.drop_column('player_stats_tags', 'sync_seq')
+    op.drop_column('team_stats_tags', 'sync_seq')
+    op.drop_column('games', 'tag_sync_seq')
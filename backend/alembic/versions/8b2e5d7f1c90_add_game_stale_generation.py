@@ -0,0 +1,26 @@
+"""Add stale_generation to games for the team data version
+
+Revision ID: 8b2e5d7f1c90
+Revises: 3f9a6c2d8e41
+Create Date: 2026-10-18 18:41:09.672354
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e5d7f1c90'
+down_revision: Union[str, None] = '3f9a6c2d8e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('games', sa.Column('stale_generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('games', 'stale_generation')
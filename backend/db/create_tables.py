@@ -19,6 +19,7 @@ def force_drop_tables():
         print("Connection opens?")
         # Drop tables in reverse dependency order
         tables_to_drop = [
+            "game_kpi_snapshots",
             "player_stats_tag_participating",
             "player_stats_tag_on_ice", 
             "player_stats_tags",
@@ -0,0 +1,68 @@
+from sqlalchemy import func, select, true
+from sqlalchemy.orm import Session
+
+from db.models import Game, GameInRoster, Player, PlayerStatsTag, TeamStatsTag
+
+
+def get_team_data_version(team_id: int, db: Session) -> str:
+    """
+    Returns a cheap version string of a team's game data, computed with a single query.
+    The version changes whenever games, roster entries or player stats tags are added or deleted.
+    In-place changes (roster swaps, renamed players) go through mark_games_stale, which bumps the games'
+    stale generations, so those are covered by the generation sum. Recomputing the dashboard snapshots
+    does not touch the generations, so it leaves the version as it is.
+    Args:
+        team_id (int): Id of the team.
+        db (Session): Database session.
+    Returns:
+        str: Version string, equal for equal data. Safe to use as an ETag seed.
+    """
+
+    team_game_ids = select(Game.id).where(Game.team_id == team_id)
+
+    games = select(func.count(Game.id), func.max(Game.timestamp), func.sum(Game.stale_generation)).where(Game.team_id == team_id)
+    rosters = select(func.count(GameInRoster.id), func.max(GameInRoster.timestamp), func.sum(GameInRoster.player_id)).where(GameInRoster.game_id.in_(team_game_ids))
+    tags = select(func.count(PlayerStatsTag.id), func.max(PlayerStatsTag.timestamp), func.max(PlayerStatsTag.id)).where(PlayerStatsTag.game_id.in_(team_game_ids))
+
+    return f"{team_id}:" + ":".join(str(value) for value in _aggregate_row([games, rosters, tags], db))
+
+
+def get_games_data_version(team_id: int, game_ids: list[int] | None, db: Session) -> str:
+    """
+    Returns a version string of the data of a team's selected games, computed with a single query.
+    On top of what get_team_data_version covers for the selected games, it changes with the team stats
+    tags and with the team's players being added or deleted, so it changes whenever anything written to
+    an Excel export of the games changes. Updating a player (name, number, position) marks every game of
+    the team stale, which bumps the games' stale generations, so that is covered too.
+    Args:
+        team_id (int): Id of the team.
+        game_ids (list[int] | None): Ids of the selected games, None for all the team's games.
+        db (Session): Database session.
+    Returns:
+        str: Version string, equal for equal data.
+    """
+
+    selected_game_ids = select(Game.id).where(Game.team_id == team_id)
+    if game_ids is not None:
+        selected_game_ids = selected_game_ids.where(Game.id.in_(game_ids))
+
+    games = select(func.count(Game.id), func.sum(Game.id), func.max(Game.timestamp), func.sum(Game.stale_generation)).where(Game.id.in_(selected_game_ids))
+    # Weighting the player ids by the row ids catches a swap of two players, which keeps their plain sum
+    rosters = select(func.count(GameInRoster.id), func.max(GameInRoster.timestamp), func.sum(GameInRoster.id * GameInRoster.player_id)).where(GameInRoster.game_id.in_(selected_game_ids))
+    player_tags = select(func.count(PlayerStatsTag.id), func.max(PlayerStatsTag.id)).where(PlayerStatsTag.game_id.in_(selected_game_ids))
+    team_tags = select(func.count(TeamStatsTag.id), func.max(TeamStatsTag.id)).where(TeamStatsTag.game_id.in_(selected_game_ids))
+    players = select(func.count(Player.id), func.max(Player.id)).where(Player.team_id == team_id)
+
+    row = _aggregate_row([games, rosters, player_tags, team_tags, players], db)
+    return f"{team_id}:" + ":".join(str(value) for value in row)
+
+
+def _aggregate_row(aggregate_queries: list, db: Session) -> tuple:
+    # Each aggregate is a one-row subquery, join them side by side into a single row
+    subqueries = [aggregate_query.subquery() for aggregate_query in aggregate_queries]
+    from_clause = subqueries[0]
+    for subquery in subqueries[1:]:
+        from_clause = from_clause.join(subquery, true())
+
+    columns = [column for subquery in subqueries for column in subquery.c]
+    return tuple(db.execute(select(*columns).select_from(from_clause)).one())
@@ -0,0 +1,84 @@
+import logging
+import threading
+from enum import Enum
+from typing import Generic, Iterable, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.models import ShotArea, ShotAreaTypes, ShotResult, ShotResultTypes, ShotType, ShotTypeTypes
+
+logger = logging.getLogger(__name__)
+
+E = TypeVar("E", bound=Enum)
+
+
+class LookupTable(Generic[E]):
+    """Two-way enum <-> id map of one of the static lookup tables."""
+
+    def __init__(self, rows: list[tuple[int, E]] | None = None):
+        rows = rows or []
+        self.ids: dict[E, int] = {value: row_id for row_id, value in rows}
+        self.values: dict[int, E] = {row_id: value for row_id, value in rows}
+
+    def id_of(self, value: E) -> int | None:
+        return self.ids.get(value)
+
+    def value_of(self, row_id: int | None) -> E | None:
+        if row_id is None:
+            return None
+        return self.values.get(row_id)
+
+
+class LookupRegistry:
+    """
+    Process-wide cache of the shot_results, shot_areas and shot_types tables.
+    The tables are seeded once (db/seed_tables.py) and never change at runtime, so they are read
+    once at startup and tag inserts and readers resolve enums and ids without touching the db.
+    """
+
+    def __init__(self):
+        self.results: LookupTable[ShotResultTypes] = LookupTable()
+        self.areas: LookupTable[ShotAreaTypes] = LookupTable()
+        self.types: LookupTable[ShotTypeTypes] = LookupTable()
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        """(Re)reads all the lookup tables."""
+        results = LookupTable(db.execute(select(ShotResult.id, ShotResult.value)).tuples().all())
+        areas = LookupTable(db.execute(select(ShotArea.id, ShotArea.value)).tuples().all())
+        types = LookupTable(db.execute(select(ShotType.id, ShotType.value)).tuples().all())
+
+        missing = [value for table, enum in ((results, ShotResultTypes), (areas, ShotAreaTypes), (types, ShotTypeTypes)) for value in enum if table.id_of(value) is None]
+        with self._lock:
+            self.results, self.areas, self.types = results, areas, types
+            # Incomplete tables are read again on next use, e.g. once they have been seeded
+            self.loaded = not missing
+
+        if missing:
+            logger.warning(f"⚠️ Lookup tables are missing rows for {missing}, run db/seed_tables.py")
+
+    def ensure_loaded(self, db: Session) -> "LookupRegistry":
+        """Loads the tables on first use, e.g. if the startup load failed. Returns the registry for chaining."""
+        if not self.loaded:
+            self.load(db)
+        return self
+
+    def ensure_known(self, db: Session, result_ids: Iterable[int | None], area_ids: Iterable[int | None], type_ids: Iterable[int | None]) -> "LookupRegistry":
+        """
+        Like ensure_loaded, but also reads the tables again (once) if any of the given ids is not in them,
+        e.g. a row added to the db after the registry was loaded. Ids unknown even after that are left
+        for the caller to handle. Returns the registry for chaining.
+        """
+        if not self.loaded:
+            self.load(db)
+            return self
+
+        tables = ((self.results, result_ids), (self.areas, area_ids), (self.types, type_ids))
+        if any(row_id is not None and row_id not in table.values for table, row_ids in tables for row_id in set(row_ids)):
+            self.load(db)
+        return self
+
+
+lookups = LookupRegistry()
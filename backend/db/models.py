@@ -1,4 +1,4 @@
-from sqlalchemy import String, ForeignKey, Enum as SQLEnum, func, DateTime, Date
+from sqlalchemy import String, Text, ForeignKey, Enum as SQLEnum, func, DateTime, Date
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from datetime import datetime, date as datetime_date
 from typing import Optional, List
@@ -158,9 +158,16 @@ class Game(Base):
     powerplays: Mapped[Optional[int]] = mapped_column(nullable=True, default=None, server_default=None)
     penalty_kills: Mapped[Optional[int]] = mapped_column(nullable=True, default=None, server_default=None)
 
+    # Last tag sync sequence number handed out, see routes/tagging/tag_sync.py
+    tag_sync_seq: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Bumped whenever the game's tags, roster or players change (mark_games_stale), part of the team data version
+    stale_generation: Mapped[int] = mapped_column(default=0, server_default="0")
+
     in_rosters: Mapped[List["GameInRoster"]] = relationship(back_populates="game", foreign_keys="GameInRoster.game_id", passive_deletes=True)
     team_stats_tags: Mapped[List["TeamStatsTag"]] = relationship(back_populates="game", foreign_keys="TeamStatsTag.game_id", passive_deletes=True)
     player_stats_tags: Mapped[List["PlayerStatsTag"]] = relationship(back_populates="game", foreign_keys="PlayerStatsTag.game_id", passive_deletes=True)
+    kpi_snapshot: Mapped[Optional["GameKPISnapshot"]] = relationship(back_populates="game", foreign_keys="GameKPISnapshot.game_id", passive_deletes=True)
+    tag_tombstones: Mapped[List["TagTombstone"]] = relationship(back_populates="game", foreign_keys="TagTombstone.game_id", passive_deletes=True)
 
     team_id: Mapped[int] = mapped_column(ForeignKey("teams.id"), nullable=False)
     team: Mapped["Team"] = relationship(back_populates="games", foreign_keys=[team_id])
@@ -186,6 +193,7 @@ class TeamStatsTag(Base):
 
     game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"), nullable=False)
     game: Mapped["Game"] = relationship(back_populates="team_stats_tags", foreign_keys=[game_id])
+    sync_seq: Mapped[int] = mapped_column(default=0, server_default="0")  # The game's tag sync sequence number of the insert
 
     play_result: Mapped[str] = mapped_column(String(40), nullable=False)
     play_type: Mapped[str] = mapped_column(String(40), nullable=False)
@@ -240,6 +248,7 @@ class PlayerStatsTag(Base):
 
     game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"), nullable=False)
     game: Mapped["Game"] = relationship(back_populates="player_stats_tags", foreign_keys=[game_id])
+    sync_seq: Mapped[int] = mapped_column(default=0, server_default="0")  # The game's tag sync sequence number of the insert
 
     ice_x: Mapped[int] = mapped_column(nullable=False)
     ice_y: Mapped[int] = mapped_column(nullable=False)
@@ -307,3 +316,38 @@ class PlayerStatsTagParticipating(Base):
 
     tag_id: Mapped[int] = mapped_column(ForeignKey("player_stats_tags.id", ondelete="CASCADE"), nullable=False)
     tag: Mapped["PlayerStatsTag"] = relationship(back_populates="players_participating", foreign_keys=[tag_id])
+
+
+# SNAPSHOTS
+class GameKPISnapshot(Base):
+    """Serialized dashboard GameKPI of a game. Marked stale whenever the game's tags or roster change."""
+    __tablename__ = "game_kpi_snapshots"
+
+    game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"), nullable=False, unique=True)
+    game: Mapped["Game"] = relationship(back_populates="kpi_snapshot", foreign_keys=[game_id])
+
+    format_version: Mapped[int] = mapped_column(nullable=False)
+    kpi_json: Mapped[str] = mapped_column(Text, nullable=False)
+    is_stale: Mapped[bool] = mapped_column(default=False, server_default="false")
+
+    # Bumped on every write, so a snapshot marked stale while it was being recomputed is not overwritten as fresh
+    revision: Mapped[int] = mapped_column(nullable=False)
+
+    __mapper_args__ = {"version_id_col": revision}
+
+
+# TAG SYNC
+class TagTombstone(Base):
+    """A deleted team or player tag of a game. The tag sync hands these to clients so they can drop the tag."""
+    __tablename__ = "tag_tombstones"
+
+    game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"), nullable=False, index=True)
+    game: Mapped["Game"] = relationship(back_populates="tag_tombstones", foreign_keys=[game_id])
+
+    tag_kind: Mapped[str] = mapped_column(String(10), nullable=False)  # TAG_KIND_TEAM or TAG_KIND_PLAYER
+    tag_id: Mapped[int] = mapped_column(nullable=False)
+    sync_seq: Mapped[int] = mapped_column(default=0, server_default="0")  # The game's tag sync sequence number of the delete
+
+
+TAG_KIND_TEAM = "team"
+TAG_KIND_PLAYER = "player"
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, field_validator
 from db.models import Positions
-from typing import Optional, List, Dict
-from datetime import date
+from typing import Literal, Optional, List, Dict
+from datetime import date, datetime
 
 class UserCreate(BaseModel):
     model_config = {"extra": "forbid"}
@@ -96,6 +96,11 @@ class AddTag(BaseModel):
 
     tag: dict
 
+class AddTagsBatch(BaseModel):
+    model_config = {"extra": "forbid"}
+
+    tags: list[dict]
+
 class TeamResponse(BaseModel):
     team_name: str | None
     join_code: str | None
@@ -119,6 +124,13 @@ class GameInRosterResponse(BaseModel):
     position: str
     player: Optional[PlayerResponse]
 
+class RosterCopy(BaseModel):
+    model_config = {"extra": "forbid"}
+
+    target_game_ids: list[int]
+    source_game_id: Optional[int] = None  # Copy this game's whole roster...
+    roster: Optional[list[GameInRosterResponse]] = None  # ...or apply these entries
+
 class TeamStatsTagResponse(BaseModel):
     id: Optional[int]
     succes: bool
@@ -128,6 +140,14 @@ class PlayerStatsTagResponse(BaseModel):
     id: Optional[int]
     succes: bool
 
+class PlayerStatsTagsBatchResponse(BaseModel):
+    ids: list[int]  # In the order the tags were sent
+    succes: bool
+
+class StreamTicketResponse(BaseModel):
+    ticket: str  # Query parameter of GET /tagging/events/{game_id}
+    expires_in: int  # Seconds the ticket can be used for connecting
+
 class CreateCode(BaseModel):
     new_code_identifier: str
 
@@ -209,3 +229,54 @@ class GameKPI(BaseModel):
 class DashboardResponse(BaseModel):
     team_name: str
     games: List[GameKPI]  # All games with per-game zone and player stats
+
+
+class RangePlayerStats(GamePlayerStats):
+    """Summed stats of a single player over a range of games"""
+
+    games_played: int = 0
+
+
+class RangeSituationKPI(BaseModel):
+    """Summed KPIs of a situation over a range of games."""
+
+    goals_for: int
+    goals_against: int
+    chances_for: int
+    chances_against: int
+    efficiency_for: float
+    efficiency_against: float
+    ice_zones: Dict[str, ZoneData]
+    net_zones: Dict[str, ZoneData]
+    player_stats: List[RangePlayerStats]
+
+
+class DashboardRangeResponse(BaseModel):
+    team_name: str
+    # Indices of the first and last game in the range, newest game first (same order as DashboardResponse.games)
+    start: Optional[int]
+    end: Optional[int]
+    game_count: int
+    situations: Dict[str, RangeSituationKPI]  # keys: 'yht', '5v5', 'YV', 'AV'
+
+
+# =====================
+# Excel Export Job Schemas
+# =====================
+
+
+class ExcelJobCreate(BaseModel):
+    model_config = {"extra": "forbid"}
+
+    export: Literal["game-stats", "teamstats", "player-stats", "plusminus"]
+    game_ids: Optional[str] = None  # Comma-separated, as in the /excel routes
+
+
+class ExcelJobResponse(BaseModel):
+    id: str
+    export: str
+    status: str  # 'queued', 'running', 'done' or 'failed'
+    stage: Optional[str]  # While running: 'loading', 'aggregating', 'rendering_images' or 'writing'
+    error: Optional[str]
+    created_at: datetime
+    expires_at: Optional[datetime]  # A finished job and its workbook are dropped after this
@@ -2,8 +2,12 @@ import os
 from redis import Redis
 
 
+def get_redis_url() -> str:
+    return os.getenv("REDIS_URL", "redis://localhost:6379")
+
+
 def get_redis():
-    client = Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
+    client = Redis.from_url(get_redis_url(), decode_responses=True)
     try:
         yield client
     finally:
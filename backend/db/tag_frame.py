@@ -0,0 +1,338 @@
+import logging
+import threading
+
+import numpy as np
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import Session
+
+from db.data_version import get_team_data_version
+from db.lookups import lookups
+from db.models import Game, PlayerStatsTag, PlayerStatsTagOnIce, PlayerStatsTagParticipating, ShotAreaTypes, ShotResultTypes, ShotTypeTypes
+
+# Enum columns are stored as integer codes, the code being the index of the enum member in these lists.
+# Missing values (a tag without shot type, a crossice that was never set, no shooter) are stored as MISSING.
+RESULT_CODES: list[ShotResultTypes] = list(ShotResultTypes)
+AREA_CODES: list[ShotAreaTypes] = list(ShotAreaTypes)
+TYPE_CODES: list[ShotTypeTypes] = list(ShotTypeTypes)
+MISSING = -1
+
+RESULT_TO_CODE = {result: code for code, result in enumerate(RESULT_CODES)}
+AREA_TO_CODE = {area: code for code, area in enumerate(AREA_CODES)}
+TYPE_TO_CODE = {shot_type: code for code, shot_type in enumerate(TYPE_CODES)}
+
+logger = logging.getLogger(__name__)
+
+ON_ICE_LINK = 0
+PARTICIPATING_LINK = 1
+
+
+def result_table(values: dict[ShotResultTypes, int], default: int = 0) -> np.ndarray:
+    """Lookup array indexed by result code, e.g. `result_table(...)[frame.result]` maps every tag at once."""
+    return np.array([values.get(result, default) for result in RESULT_CODES], dtype=np.int64)
+
+
+def group_rows(keys: np.ndarray) -> dict[int, np.ndarray]:
+    """Key -> indices of the rows with that key, in their original order."""
+    order = np.argsort(keys, kind="stable")
+    unique_keys, starts = np.unique(keys[order], return_index=True)
+    return {int(key): rows for key, rows in zip(unique_keys, np.split(order, starts[1:]))}
+
+
+def take_csr(indptr: np.ndarray, values: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Selects the given rows of a CSR (indptr, values) pair, returning a new compact pair."""
+    lengths = indptr[rows + 1] - indptr[rows]
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+
+    # Position of every selected value in the old values array: row start + offset within the row
+    offsets = np.arange(new_indptr[-1]) - np.repeat(new_indptr[:-1], lengths)
+    return new_indptr, values[np.repeat(indptr[rows], lengths) + offsets]
+
+
+class TagFrame:
+    """
+    Player stats tags of a team stored column by column in NumPy arrays, one element per tag.
+    The players on ice and participating players of the tags are stored CSR style: the players
+    of tag i are `on_ice_players[on_ice_indptr[i]:on_ice_indptr[i + 1]]`.
+    Consumers select the tags they need with `take` / `for_games` and aggregate with array
+    operations, instead of hydrating and walking PlayerStatsTag ORM objects.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        game_id: np.ndarray,
+        ice_x: np.ndarray,
+        ice_y: np.ndarray,
+        net_x: np.ndarray,
+        net_y: np.ndarray,
+        result: np.ndarray,
+        area: np.ndarray,
+        shot_type: np.ndarray,
+        strength: np.ndarray,
+        net_height: np.ndarray,
+        net_width: np.ndarray,
+        crossice: np.ndarray,
+        shooter_id: np.ndarray,
+        on_ice_indptr: np.ndarray,
+        on_ice_players: np.ndarray,
+        participating_indptr: np.ndarray,
+        participating_players: np.ndarray,
+        strength_values: list[str | None],
+        net_height_values: list[str],
+        net_width_values: list[str],
+    ):
+        self.ids = ids
+        self.game_id = game_id
+        self.ice_x = ice_x
+        self.ice_y = ice_y
+        self.net_x = net_x
+        self.net_y = net_y
+        self.result = result  # index into RESULT_CODES
+        self.area = area  # index into AREA_CODES
+        self.shot_type = shot_type  # index into TYPE_CODES or MISSING
+        self.strength = strength  # index into strength_values
+        self.net_height = net_height  # index into net_height_values
+        self.net_width = net_width  # index into net_width_values
+        self.crossice = crossice  # 1 / 0 / MISSING
+        self.shooter_id = shooter_id  # player id or MISSING
+
+        self.on_ice_indptr = on_ice_indptr
+        self.on_ice_players = on_ice_players
+        self.participating_indptr = participating_indptr
+        self.participating_players = participating_players
+
+        # Vocabularies of the string columns, shared (not copied) by the frames taken from this one
+        self.strength_values = strength_values
+        self.net_height_values = net_height_values
+        self.net_width_values = net_width_values
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, rows: np.ndarray) -> "TagFrame":
+        """New frame with the given rows (index array or boolean mask), in the given order."""
+        rows = np.flatnonzero(rows) if rows.dtype == bool else rows
+        on_ice_indptr, on_ice_players = take_csr(self.on_ice_indptr, self.on_ice_players, rows)
+        participating_indptr, participating_players = take_csr(self.participating_indptr, self.participating_players, rows)
+
+        return TagFrame(
+            ids=self.ids[rows],
+            game_id=self.game_id[rows],
+            ice_x=self.ice_x[rows],
+            ice_y=self.ice_y[rows],
+            net_x=self.net_x[rows],
+            net_y=self.net_y[rows],
+            result=self.result[rows],
+            area=self.area[rows],
+            shot_type=self.shot_type[rows],
+            strength=self.strength[rows],
+            net_height=self.net_height[rows],
+            net_width=self.net_width[rows],
+            crossice=self.crossice[rows],
+            shooter_id=self.shooter_id[rows],
+            on_ice_indptr=on_ice_indptr,
+            on_ice_players=on_ice_players,
+            participating_indptr=participating_indptr,
+            participating_players=participating_players,
+            strength_values=self.strength_values,
+            net_height_values=self.net_height_values,
+            net_width_values=self.net_width_values,
+        )
+
+    def empty(self) -> "TagFrame":
+        """Frame with the same vocabularies but no rows."""
+        return self.take(np.zeros(0, dtype=np.int64))
+
+    def for_games(self, game_ids: list[int]) -> "TagFrame":
+        """Tags of the given games."""
+        return self.take(np.isin(self.game_id, game_ids))
+
+    def by_game(self) -> dict[int, "TagFrame"]:
+        """Game id -> frame of that game's tags."""
+        return {game_id: self.take(rows) for game_id, rows in group_rows(self.game_id).items()}
+
+    def strength_codes(self, strengths: list[str]) -> list[int]:
+        """Codes of the given strengths values, values that no tag has are left out."""
+        return [code for code, value in enumerate(self.strength_values) if value in strengths]
+
+    def on_ice(self, row: int) -> np.ndarray:
+        return self.on_ice_players[self.on_ice_indptr[row] : self.on_ice_indptr[row + 1]]
+
+    def participating(self, row: int) -> np.ndarray:
+        return self.participating_players[self.participating_indptr[row] : self.participating_indptr[row + 1]]
+
+    def on_ice_rows(self) -> np.ndarray:
+        """Row index of every element of on_ice_players."""
+        return np.repeat(np.arange(len(self)), np.diff(self.on_ice_indptr))
+
+    def participating_rows(self) -> np.ndarray:
+        """Row index of every element of participating_players."""
+        return np.repeat(np.arange(len(self)), np.diff(self.participating_indptr))
+
+    def has_participant(self, player_id: int) -> np.ndarray:
+        """Boolean array telling for every tag whether the player participated in it."""
+        matches = np.zeros(len(self.participating_players) + 1, dtype=np.int64)
+        np.cumsum(self.participating_players == player_id, out=matches[1:])
+        return matches[self.participating_indptr[1:]] > matches[self.participating_indptr[:-1]]
+
+    def coordinates(self, rows: np.ndarray | None = None) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+        """(ice points, net points) of the given rows (all rows by default) as lists of plain int tuples."""
+        if rows is None:
+            rows = np.arange(len(self))
+        ice = list(zip(self.ice_x[rows].tolist(), self.ice_y[rows].tolist()))
+        net = list(zip(self.net_x[rows].tolist(), self.net_y[rows].tolist()))
+        return ice, net
+
+
+def encode_strings(values: list[str | None]) -> tuple[np.ndarray, list[str | None]]:
+    """Encodes strings as indices into a vocabulary of the distinct values, in order of first appearance."""
+    vocabulary: dict[str | None, int] = {}
+    codes = np.array([vocabulary.setdefault(value, len(vocabulary)) for value in values], dtype=np.int64)
+    return codes, list(vocabulary)
+
+
+def lookup_codes(row_ids: tuple[int | None, ...], values_by_id: dict, code_of: dict) -> np.ndarray:
+    """Maps lookup table ids (e.g. shot_result_id) to frame codes, through the registry's id -> enum map."""
+    code_by_id = {row_id: code_of[value] for row_id, value in values_by_id.items()}
+    return np.array([code_by_id.get(row_id, MISSING) for row_id in row_ids], dtype=np.int64)
+
+
+def build_csr(tag_ids: np.ndarray, link_tag_ids: np.ndarray, link_player_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the CSR (indptr, players) pair of a link table. Duplicate (tag, player) rows are dropped,
+    so a player is counted once per tag like in the set based lookups.
+    """
+    rows = np.searchsorted(tag_ids, link_tag_ids)
+    order = np.lexsort((link_player_ids, rows))
+    rows, players = rows[order], link_player_ids[order]
+
+    if len(rows):
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (players[1:] != players[:-1])
+        rows, players = rows[keep], players[keep]
+
+    indptr = np.zeros(len(tag_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(tag_ids)), out=indptr[1:])
+    return indptr, players
+
+
+def load_tag_frame(team_id: int, db: Session) -> TagFrame:
+    """
+    Loads all player stats tags of a team into a TagFrame.
+    The tag columns come from one query and the on-ice and participating rows from a second, so no ORM
+    objects are created. Shot result, area and type ids are resolved through the lookup registry,
+    tags with ids that are not in the lookup tables are logged and left out.
+    Args:
+        team_id (int): Id of the team.
+        db (Session): Database session.
+    Returns:
+        TagFrame: The team's tags ordered by id.
+    """
+
+    tag_query = (
+        select(
+            PlayerStatsTag.id,
+            PlayerStatsTag.game_id,
+            PlayerStatsTag.ice_x,
+            PlayerStatsTag.ice_y,
+            PlayerStatsTag.net_x,
+            PlayerStatsTag.net_y,
+            PlayerStatsTag.shot_result_id,
+            PlayerStatsTag.shot_area_id,
+            PlayerStatsTag.shot_type_id,
+            PlayerStatsTag.strengths,
+            PlayerStatsTag.net_height,
+            PlayerStatsTag.net_width,
+            PlayerStatsTag.crossice,
+            PlayerStatsTag.shooter_id,
+        )
+        .join(Game, Game.id == PlayerStatsTag.game_id)
+        .where(Game.team_id == team_id)
+        .order_by(PlayerStatsTag.id)
+    )
+    rows = db.execute(tag_query).all()
+    (ids, game_ids, ice_x, ice_y, net_x, net_y, result_ids, area_ids, shot_type_ids, strengths, net_heights, net_widths, crossices, shooter_ids) = (
+        zip(*rows) if rows else [()] * 14
+    )
+    registry = lookups.ensure_known(db, result_ids, area_ids, shot_type_ids)
+
+    team_tag_ids = select(PlayerStatsTag.id).join(Game, Game.id == PlayerStatsTag.game_id).where(Game.team_id == team_id)
+    link_query = union_all(
+        select(PlayerStatsTagOnIce.tag_id, PlayerStatsTagOnIce.player_id, literal(ON_ICE_LINK)).where(PlayerStatsTagOnIce.tag_id.in_(team_tag_ids)),
+        select(PlayerStatsTagParticipating.tag_id, PlayerStatsTagParticipating.player_id, literal(PARTICIPATING_LINK)).where(PlayerStatsTagParticipating.tag_id.in_(team_tag_ids)),
+    )
+    links = np.array(db.execute(link_query).all(), dtype=np.int64).reshape(-1, 3)
+
+    tag_ids = np.array(ids, dtype=np.int64)
+    result_codes = lookup_codes(result_ids, registry.results.values, RESULT_TO_CODE)
+    area_codes = lookup_codes(area_ids, registry.areas.values, AREA_TO_CODE)
+    shot_type_codes = lookup_codes(shot_type_ids, registry.types.values, TYPE_TO_CODE)
+    strength_codes, strength_values = encode_strings(list(strengths))
+    net_height_codes, net_height_values = encode_strings(list(net_heights))
+    net_width_codes, net_width_values = encode_strings(list(net_widths))
+
+    on_ice = links[links[:, 2] == ON_ICE_LINK]
+    participating = links[links[:, 2] == PARTICIPATING_LINK]
+    on_ice_indptr, on_ice_players = build_csr(tag_ids, on_ice[:, 0], on_ice[:, 1])
+    participating_indptr, participating_players = build_csr(tag_ids, participating[:, 0], participating[:, 1])
+
+    frame = TagFrame(
+        ids=tag_ids,
+        game_id=np.array(game_ids, dtype=np.int64),
+        ice_x=np.array(ice_x, dtype=np.int64),
+        ice_y=np.array(ice_y, dtype=np.int64),
+        net_x=np.array(net_x, dtype=np.int64),
+        net_y=np.array(net_y, dtype=np.int64),
+        result=result_codes,
+        area=area_codes,
+        shot_type=shot_type_codes,
+        strength=strength_codes,
+        net_height=net_height_codes,
+        net_width=net_width_codes,
+        crossice=np.array([MISSING if crossice is None else int(crossice) for crossice in crossices], dtype=np.int64),
+        shooter_id=np.array([MISSING if shooter_id is None else shooter_id for shooter_id in shooter_ids], dtype=np.int64),
+        on_ice_indptr=on_ice_indptr,
+        on_ice_players=on_ice_players,
+        participating_indptr=participating_indptr,
+        participating_players=participating_players,
+        strength_values=strength_values,
+        net_height_values=net_height_values,
+        net_width_values=net_width_values,
+    )
+
+    # Result and area codes index lookup arrays, so tags whose ids are not in the lookup tables are left out.
+    # A MISSING shot type is only valid for a tag without one.
+    unknown = (result_codes == MISSING) | (area_codes == MISSING) | ((shot_type_codes == MISSING) & np.array([type_id is not None for type_id in shot_type_ids], dtype=bool))
+    if unknown.any():
+        logger.warning(f"⚠️ Left out {int(unknown.sum())} tags of team {team_id} with unknown shot result, area or type ids: {tag_ids[unknown].tolist()}")
+        frame = frame.take(~unknown)
+
+    return frame
+
+
+# team_id -> (data version, frame). The frames are never modified in place, so they can be shared between requests.
+_tag_frame_cache: dict[int, tuple[str, TagFrame]] = {}
+_tag_frame_lock = threading.Lock()
+
+
+def get_team_tag_frame(team_id: int, db: Session) -> TagFrame:
+    """
+    Returns the TagFrame of a team, reusing the cached frame while the team's data version is unchanged.
+    Args:
+        team_id (int): Id of the team.
+        db (Session): Database session.
+    Returns:
+        TagFrame: All the team's tags. Use `for_games` to narrow it down to a selection of games.
+    """
+
+    data_version = get_team_data_version(team_id, db)
+    with _tag_frame_lock:
+        cached = _tag_frame_cache.get(team_id)
+    if cached is not None and cached[0] == data_version:
+        return cached[1]
+
+    frame = load_tag_frame(team_id, db)
+    with _tag_frame_lock:
+        _tag_frame_cache[team_id] = (data_version, frame)
+    return frame
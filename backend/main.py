@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -11,12 +12,38 @@ from routes.auth import auth_router
 from routes.admin import admin_router
 from routes.excel import excel_router
 from routes.users import users_router
+from db.db_manager import SessionLocal
+from db.lookups import lookups
+from routes.tagging.question_trees import question_trees
+from routes.tagging.tag_events import tag_events
+from routes.excel.render_pool import shutdown_render_pool
+from sqlalchemy.exc import SQLAlchemyError
 import logging
 # Load the environment variables from the .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the static shot result/area/type lookup tables once for the whole process
+    try:
+        with SessionLocal() as db_session:
+            lookups.load(db_session)
+    except SQLAlchemyError as e:
+        logger.warning(f"⚠️ Could not load the lookup tables at startup, loading them on first use: {e}")
+
+    # Read, validate and serialize the tagging question trees once. A malformed tree stops the startup.
+    question_trees.load()
+    yield
+
+    await tag_events.close()
+    shutdown_render_pool()
+
+
 # Initialize the FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Include all the routers. REMEMBER TO ADD HERE ANY NEW ROUTERS.
 app.include_router(users_router.router)
@@ -38,6 +65,7 @@ app.add_middleware(
     allow_credentials=True, # Allows cookies to be included in requests
     allow_methods=["*"],    # Allows all methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],    # Allows all headers
+    expose_headers=["X-Next-After-Id", "X-Questions-Version"],  # Custom headers the frontend reads
 )
 
 logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
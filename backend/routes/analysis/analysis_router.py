@@ -1,13 +1,19 @@
 # routes/analysis.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from typing import Optional
+import re
+import numpy as np
 from pydantic import BaseModel
 from db.db_manager import get_db_session
-from db.models import PlayerStatsTag, Game, User, ShotType, ShotResultTypes
+from db.models import PlayerStatsTag, Game, User, ShotResultTypes
+from db.data_version import get_team_data_version
+from db.lookups import lookups
 from utils import (
     get_current_user_id, to_label, side_of_enum, is_goal_enum,
-    allow_result_enum, parse_shot_type_values, is_chance_enum, is_shot_enum
+    allow_result_enum, parse_shot_type_values, is_chance_enum, is_shot_enum,
+    make_etag, etag_matches, etag_headers, not_modified_response
 )
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
@@ -19,6 +25,15 @@ class HeatPoint(BaseModel):
 class NetBinCount(BaseModel):
     zone: str; count: int
 
+class HeatGrid(BaseModel):
+    # counts[row][col]: row along y, col along x, both over the 0-100 coordinate range
+    side: str; result: str; total: int
+    counts: list[list[int]]
+
+class GridInfo(BaseModel):
+    columns: int; rows: int
+    x_range: tuple[int, int]; y_range: tuple[int, int]
+
 class AnalysisResponse(BaseModel):
     game_ids: list[int]
     totals: dict
@@ -30,9 +45,53 @@ class AnalysisResponse(BaseModel):
     ice_points: list[HeatPoint]
     net_points: list[HeatPoint]
     net_bins: list[NetBinCount]
+    # Only with binning=grid
+    grid: Optional[GridInfo] = None
+    ice_grids: Optional[list[HeatGrid]] = None
+    net_grids: Optional[list[HeatGrid]] = None
+
+# Ice and net coordinates are percentages of the image size
+COORDINATE_RANGE = (0, 100)
+MAX_GRID_BINS = 200
+BINS_PATTERN = re.compile(r"^(\d+)x(\d+)$")
+
+
+def parse_bins(bins: str) -> tuple[int, int]:
+    """Parse an 'NxM' bins value into (columns, rows)."""
+    match = BINS_PATTERN.match(bins.strip())
+    if not match:
+        raise HTTPException(400, "bins must be given as NxM, e.g. 20x10")
+    columns, rows = int(match.group(1)), int(match.group(2))
+    if not (1 <= columns <= MAX_GRID_BINS and 1 <= rows <= MAX_GRID_BINS):
+        raise HTTPException(400, f"bins must be between 1 and {MAX_GRID_BINS} in both directions")
+    return columns, rows
+
+
+def build_heat_grids(x: np.ndarray, y: np.ndarray, results: list[str], sides: list[str], columns: int, rows: int) -> list[dict]:
+    """
+    Bins the points into one density grid per (side, result), in the order the results first appear.
+    Points outside the coordinate range are clipped to the edge bins.
+    """
+    x = np.clip(x, *COORDINATE_RANGE)
+    y = np.clip(y, *COORDINATE_RANGE)
+    results_array = np.array(results, dtype=object)
+
+    grids = []
+    for result, side in dict.fromkeys(zip(results, sides)):
+        selected = results_array == result
+        counts, _, _ = np.histogram2d(
+            y[selected], x[selected], bins=[rows, columns], range=[COORDINATE_RANGE, COORDINATE_RANGE]
+        )
+        grids.append({
+            "side": side, "result": result, "total": int(selected.sum()),
+            "counts": counts.astype(np.int64).tolist(),
+        })
+    return grids
 
-@router.get("", response_model=AnalysisResponse)
+@router.get("", response_model=AnalysisResponse, response_model_exclude_none=True)
 def get_analysis(
+    request: Request,
+    response: Response,
     game_ids: str = Query(...),
     shooter_ids: Optional[str] = Query(None),
     strengths: Optional[str] = Query(None),
@@ -43,6 +102,9 @@ def get_analysis(
     show_ga: bool = Query(True),
     show_sf: bool = Query(True),   # NEW
     show_sa: bool = Query(True),   # NEW
+    binning: Optional[str] = Query(None, description="'grid' to return pre-binned density grids per side and result"),
+    bins: str = Query("20x20", description="Grid size as NxM (columns along x, rows along y), used with binning=grid"),
+    include_points: bool = Query(False, description="Also return the raw points with binning=grid"),
     db: Session = Depends(get_db_session),
     current_user_id: int = Depends(get_current_user_id),
 ):
@@ -54,6 +116,9 @@ def get_analysis(
 
     if not gid_list:
         raise HTTPException(400, "Provide at least one game_id")
+    if binning not in (None, "grid"):
+        raise HTTPException(400, "binning must be 'grid' if given")
+    grid_bins = parse_bins(bins) if binning == "grid" else None
 
     # permission check
     user = db.query(User).filter(User.id == current_user_id).first()
@@ -62,78 +127,127 @@ def get_analysis(
     for g in games:
         if g.team != user.team: raise HTTPException(401, "No permission for one or more games")
 
-    # base query
-    q = db.query(PlayerStatsTag).filter(PlayerStatsTag.game_id.in_(gid_list))
+    # Answer with 304 if the client already has this analysis for the current data
+    query_params = sorted(request.query_params.multi_items())
+    etag = make_etag("analysis", get_team_data_version(user.team.id, db), query_params)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified_response(etag)
+    response.headers.update(etag_headers(etag))
+
+    # Filters as SQL predicates, the result toggles included, so only the matching tags are read
+    allowed_results = [
+        result for result in ShotResultTypes
+        if allow_result_enum(result, show_gf, show_ga, show_cf, show_ca, show_sf, show_sa)
+    ]
+    # Results, areas and types are resolved through the in-memory lookup registry instead of joins
+    registry = lookups.ensure_loaded(db)
+    allowed_result_ids = [registry.results.id_of(result) for result in allowed_results]
+    conditions = [PlayerStatsTag.game_id.in_(gid_list), PlayerStatsTag.shot_result_id.in_(allowed_result_ids)]
     if shooter_list:
-        q = q.filter(PlayerStatsTag.shooter_id.in_(shooter_list))
+        conditions.append(PlayerStatsTag.shooter_id.in_(shooter_list))
     if strengths_list:
-        q = q.filter(PlayerStatsTag.strengths.in_(strengths_list))
+        conditions.append(PlayerStatsTag.strengths.in_(strengths_list))
     if shot_types_list:
         enum_vals = parse_shot_type_values(shot_types_list)
         if enum_vals:
-            q = q.join(PlayerStatsTag.shot_type, isouter=True).filter(ShotType.value.in_(enum_vals))
+            conditions.append(PlayerStatsTag.shot_type_id.in_([registry.types.id_of(v) for v in enum_vals]))
 
-    tags = q.all()
+    def filtered_tags(*columns):
+        return select(*columns).where(*conditions)
 
-    # filter by result type using enums
-    tags = [
-        t for t in tags
-        if t.shot_result and allow_result_enum(
-            t.shot_result.value, show_gf, show_ga, show_cf, show_ca, show_sf, show_sa
-        )
-    ]
+    # Aggregates: one small GROUP BY per breakdown, so each returns a row per distinct value instead of
+    # a row per combination of all the dimensions. Ordered by first appearance, like folding the tags in id order.
+    def count_by(*columns):
+        return db.execute(
+            filtered_tags(*columns, func.count(PlayerStatsTag.id))
+            .group_by(*columns)
+            .order_by(func.min(PlayerStatsTag.id))
+        ).all()
 
-    # after tags filtering
-    events_total = len(tags)
-    goals = sum(1 for t in tags if is_goal_enum(t.shot_result.value))
-    maalipaikat = sum(1 for t in tags if is_chance_enum(t.shot_result.value))
-    laukaukset = sum(1 for t in tags if is_shot_enum(t.shot_result.value))
-
-    # keep your existing behavior for Sh% (goals / all returned events)
-    shooting_pct = round((goals / events_total) * 100, 1) if events_total else 0.0
-
-
-    def inc(d: dict, key: Optional[str]):
+    def inc(d: dict, key: Optional[str], count: int):
         key = key if key is not None else "NONE"
-        d[key] = d.get(key, 0) + 1
+        d[key] = d.get(key, 0) + count
 
+    events_total = goals = maalipaikat = laukaukset = 0
     by_result: dict[str,int] = {}
     by_type: dict[str,int] = {}
     by_strengths: dict[str,int] = {}
     by_area: dict[str,int] = {}
     crossice = {"true": 0, "false": 0, "none": 0}
-    ice_points, net_points = [], []
     net_bins = {}
 
-    for t in tags:
-        res_enum: ShotResultTypes = t.shot_result.value
-        res_label = to_label(res_enum) or ""
-        stype_label = to_label(t.shot_type.value) if t.shot_type else None
-        area_label = to_label(t.shot_area.value) if t.shot_area else None
+    for result_id, count in count_by(PlayerStatsTag.shot_result_id):
+        res_enum = registry.results.value_of(result_id)
+        events_total += count
+        if is_goal_enum(res_enum): goals += count
+        if is_chance_enum(res_enum): maalipaikat += count
+        if is_shot_enum(res_enum): laukaukset += count
+        inc(by_result, to_label(res_enum) or "", count)
 
-        inc(by_result, res_label)
-        inc(by_type, stype_label)
-        inc(by_strengths, t.strengths)
-        inc(by_area, area_label)
+    for type_id, count in count_by(PlayerStatsTag.shot_type_id):
+        inc(by_type, to_label(registry.types.value_of(type_id)), count)
 
-        if t.crossice is True: crossice["true"] += 1
-        elif t.crossice is False: crossice["false"] += 1
-        else: crossice["none"] += 1
+    for tag_strengths, count in count_by(PlayerStatsTag.strengths):
+        inc(by_strengths, tag_strengths, count)
 
-        side = side_of_enum(res_enum)
-        goal = is_goal_enum(res_enum)
+    for area_id, count in count_by(PlayerStatsTag.shot_area_id):
+        inc(by_area, to_label(registry.areas.value_of(area_id)), count)
 
-        ice_points.append({
-            "x": t.ice_x, "y": t.ice_y, "weight": 1.0,
-            "result": res_label, "side": side, "is_goal": goal, "area": area_label or ""
-        })
-        net_points.append({
-            "x": t.net_x, "y": t.net_y, "weight": 1.0,
-            "result": res_label, "side": side, "is_goal": goal, "area": area_label or ""
-        })
+    for tag_crossice, count in count_by(PlayerStatsTag.crossice):
+        if tag_crossice is True: crossice["true"] += count
+        elif tag_crossice is False: crossice["false"] += count
+        else: crossice["none"] += count
+
+    for net_height, net_width, count in count_by(PlayerStatsTag.net_height, PlayerStatsTag.net_width):
+        inc(net_bins, f"{net_height}-{net_width}", count)
+
+    # keep your existing behavior for Sh% (goals / all returned events)
+    shooting_pct = round((goals / events_total) * 100, 1) if events_total else 0.0
+
+    # Points: only the coordinates and labels of the filtered tags are read.
+    # With binning=grid they are binned here and only returned as raw points on request.
+    points = db.execute(
+        filtered_tags(
+            PlayerStatsTag.ice_x, PlayerStatsTag.ice_y, PlayerStatsTag.net_x, PlayerStatsTag.net_y,
+            PlayerStatsTag.shot_result_id, PlayerStatsTag.shot_area_id,
+        ).order_by(PlayerStatsTag.id)
+    ).all()
+
+    ice_points, net_points = [], []
+    grid_data = {}
+    if points:
+        ice_x, ice_y, net_x, net_y, result_ids, area_ids = zip(*points)
+        res_enums = [registry.results.value_of(result_id) for result_id in result_ids]
+        areas = [registry.areas.value_of(area_id) for area_id in area_ids]
+        res_labels = [to_label(res_enum) or "" for res_enum in res_enums]
+        sides = [side_of_enum(res_enum) for res_enum in res_enums]
+
+        if grid_bins is not None:
+            columns, rows = grid_bins
+            grid_data = {
+                "ice_grids": build_heat_grids(np.array(ice_x), np.array(ice_y), res_labels, sides, columns, rows),
+                "net_grids": build_heat_grids(np.array(net_x), np.array(net_y), res_labels, sides, columns, rows),
+            }
+
+        if grid_bins is None or include_points:
+            area_labels = [to_label(area) or "" for area in areas]
+            goal_flags = [is_goal_enum(res_enum) for res_enum in res_enums]
+            for point in zip(ice_x, ice_y, net_x, net_y, res_labels, sides, goal_flags, area_labels):
+                px_ice, py_ice, px_net, py_net, res_label, side, goal, area_label = point
+                ice_points.append({
+                    "x": px_ice, "y": py_ice, "weight": 1.0,
+                    "result": res_label, "side": side, "is_goal": goal, "area": area_label
+                })
+                net_points.append({
+                    "x": px_net, "y": py_net, "weight": 1.0,
+                    "result": res_label, "side": side, "is_goal": goal, "area": area_label
+                })
 
-        zone = f"{t.net_height}-{t.net_width}"
-        net_bins[zone] = net_bins.get(zone, 0) + 1
+    if grid_bins is not None:
+        columns, rows = grid_bins
+        grid_data["grid"] = {"columns": columns, "rows": rows, "x_range": COORDINATE_RANGE, "y_range": COORDINATE_RANGE}
+        grid_data.setdefault("ice_grids", [])
+        grid_data.setdefault("net_grids", [])
 
     return {
         "game_ids": gid_list,
@@ -152,4 +266,5 @@ def get_analysis(
         "ice_points": ice_points,
         "net_points": net_points,
         "net_bins": [{"zone": k, "count": v} for k, v in sorted(net_bins.items())],
+        **grid_data,
     }
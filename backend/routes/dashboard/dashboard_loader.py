@@ -0,0 +1,64 @@
+from collections import defaultdict
+from typing import TypedDict
+
+from sqlalchemy.orm import Session
+
+from db.models import GameInRoster, Player
+from db.tag_frame import TagFrame, get_team_tag_frame
+
+
+class GameKPIInputs(TypedDict):
+    tags: TagFrame
+    players: list[Player]
+
+
+def load_players_by_game(game_ids: list[int], db: Session) -> defaultdict[int, list[Player]]:
+    """Roster players of every given game, fetched with a single joined query."""
+    rows = (
+        db.query(GameInRoster.game_id, Player)
+        .join(Player, Player.id == GameInRoster.player_id)
+        .filter(GameInRoster.game_id.in_(game_ids))
+        .order_by(GameInRoster.game_id, Player.id)
+        .all()
+    )
+
+    players_by_game: defaultdict[int, list[Player]] = defaultdict(list)
+    seen: set[tuple[int, int]] = set()
+    for game_id, player in rows:
+        if (game_id, player.id) in seen:
+            continue
+        seen.add((game_id, player.id))
+        players_by_game[game_id].append(player)
+
+    return players_by_game
+
+
+def load_game_kpi_inputs(team_id: int, game_ids: list[int], db: Session) -> dict[int, GameKPIInputs]:
+    """
+    Loads everything the KPI engine needs for the given games in a fixed number of queries.
+    The tags come from the team's shared tag frame and the rosters are fetched once for all
+    the games together and then split into per-game slices, so the number of round trips does
+    not grow with the number of games.
+    Args:
+        team_id (int): Id of the team the games belong to.
+        game_ids (list[int]): Ids of the games to load.
+        db (Session): Database session.
+    Returns:
+        dict[int, GameKPIInputs]: Game id -> the tag frame and roster players of that game.
+    """
+
+    if not game_ids:
+        return {}
+
+    players_by_game = load_players_by_game(game_ids, db)
+    frame = get_team_tag_frame(team_id, db).for_games(game_ids)
+    frames_by_game = frame.by_game()
+
+    inputs: dict[int, GameKPIInputs] = {}
+    for game_id in game_ids:
+        inputs[game_id] = {
+            "tags": frames_by_game.get(game_id, frame.empty()),
+            "players": players_by_game[game_id],
+        }
+
+    return inputs
@@ -1,224 +1,163 @@
 # routes/dashboard.py
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date as datetime_date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from db.db_manager import get_db_session
-from db.models import (
-    User, Game, Player, PlayerStatsTag, PlayerStatsTagOnIce, 
-    PlayerStatsTagParticipating, ShotResultTypes, GameInRoster
-)
-from db.pydantic_schemas import ZoneData, GamePlayerStats, GameKPI, DashboardResponse
-from utils import get_current_user_id
+from db.models import User, Team, Game, GameKPISnapshot
+from db.pydantic_schemas import GameKPI, DashboardResponse, DashboardRangeResponse
+from routes.dashboard.kpi_engine import build_game_kpi
+from routes.dashboard.dashboard_loader import load_game_kpi_inputs
+from routes.dashboard.kpi_snapshots import read_snapshot, save_snapshots
+from routes.dashboard.range_sums import DashboardPrefixSums, get_cached_prefix_sums, cache_prefix_sums
+from db.data_version import get_team_data_version
+from utils import get_current_user_id, make_etag, etag_matches, etag_headers, not_modified_response
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 
-def calculate_game_kpi(game: Game, tags: list[PlayerStatsTag], db: Session) -> GameKPI:
-    """Calculate KPIs for a single game from its tags, including per-player stats.
+def get_user_team(current_user_id: int, db: Session) -> Team:
+    user = db.query(User).filter(User.id == current_user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not user.team:
+        raise HTTPException(status_code=404, detail="User has no team")
+
+    return user.team
 
-    This function now also computes per-situation aggregates and returns them in the
-    `situations` field of the returned GameKPI. Situations keys are: 'yht' (total),
-    '5v5' (ES), 'YV' (PP), 'AV' (PK).
+
+def get_game_kpis(team: Team, db: Session) -> list[GameKPI]:
+    """
+    KPIs of all the team's games, newest game first.
+    Fresh snapshots are served as is, missing or stale ones are recomputed and saved.
     """
+    # Get ALL games ordered by date descending (newest first), together with their KPI snapshots
+    games_with_snapshots = db.query(Game, GameKPISnapshot).outerjoin(
+        GameKPISnapshot, GameKPISnapshot.game_id == Game.id
+    ).filter(
+        Game.team_id == team.id
+    ).order_by(desc(Game.date)).all()
 
-    # Prepare roster and on-ice/participating lookups once (used by all situation aggregations)
-    roster_entries = db.query(GameInRoster).filter(GameInRoster.game_id == game.id).all()
-    player_ids_in_game = [r.player_id for r in roster_entries]
-    players_in_game = db.query(Player).filter(Player.id.in_(player_ids_in_game)).all()
-
-    tag_ids = [t.id for t in tags]
-    on_ice_records = db.query(PlayerStatsTagOnIce).filter(
-        PlayerStatsTagOnIce.tag_id.in_(tag_ids)
-    ).all() if tag_ids else []
-    participating_records = db.query(PlayerStatsTagParticipating).filter(
-        PlayerStatsTagParticipating.tag_id.in_(tag_ids)
-    ).all() if tag_ids else []
-
-    on_ice_by_tag = {}
-    for rec in on_ice_records:
-        on_ice_by_tag.setdefault(rec.tag_id, set()).add(rec.player_id)
-
-    participating_by_tag = {}
-    for rec in participating_records:
-        participating_by_tag.setdefault(rec.tag_id, set()).add(rec.player_id)
-
-    def build_kpi_from_tags(tag_list: list[PlayerStatsTag]):
-        # basic counts
-        gf = sum(1 for t in tag_list if t.shot_result.value == ShotResultTypes.GOAL_FOR)
-        ga = sum(1 for t in tag_list if t.shot_result.value == ShotResultTypes.GOAL_AGAINST)
-        cf = sum(1 for t in tag_list if t.shot_result.value in (ShotResultTypes.CHANCE_FOR, ShotResultTypes.GOAL_FOR))
-        ca = sum(1 for t in tag_list if t.shot_result.value in (ShotResultTypes.CHANCE_AGAINST, ShotResultTypes.GOAL_AGAINST))
-
-        eff_f = round((gf / cf * 100), 1) if cf > 0 else 0.0
-        eff_a = round((ga / ca * 100), 1) if ca > 0 else 0.0
-
-        ice_z: dict[str, ZoneData] = {}
-        net_z: dict[str, ZoneData] = {}
-
-        for tag in tag_list:
-            result = tag.shot_result.value
-            ice_zone_name = tag.shot_area.value.value if tag.shot_area else "UNKNOWN"
-            # Split mirrored zones by side based on ice_x coordinate
-            if ice_zone_name in ["ZONE_2_SIDE", "ZONE_4", "OUTSIDE_FAR", "OUTSIDE_CLOSE"]:
-                if tag.ice_x is not None:
-                    side = "_LEFT" if tag.ice_x < 50 else "_RIGHT"
-                else:
-                    side = "_LEFT"  # default to left if no ice_x
-                ice_zone_name += side
-
-            net_zone_name = f"{tag.net_height}-{tag.net_width}"
-
-            if ice_zone_name not in ice_z:
-                ice_z[ice_zone_name] = ZoneData()
-            if net_zone_name not in net_z:
-                net_z[net_zone_name] = ZoneData()
-
-            if result == ShotResultTypes.GOAL_FOR:
-                ice_z[ice_zone_name].goals_for += 1
-                ice_z[ice_zone_name].chances_for += 1
-                net_z[net_zone_name].goals_for += 1
-                net_z[net_zone_name].chances_for += 1
-            elif result == ShotResultTypes.GOAL_AGAINST:
-                ice_z[ice_zone_name].goals_against += 1
-                ice_z[ice_zone_name].chances_against += 1
-                net_z[net_zone_name].goals_against += 1
-                net_z[net_zone_name].chances_against += 1
-            elif result == ShotResultTypes.CHANCE_FOR:
-                ice_z[ice_zone_name].chances_for += 1
-                net_z[net_zone_name].chances_for += 1
-            elif result == ShotResultTypes.CHANCE_AGAINST:
-                ice_z[ice_zone_name].chances_against += 1
-                net_z[net_zone_name].chances_against += 1
-
-        # per-player stats for this tag subset
-        player_stats_local: list[GamePlayerStats] = []
-        for player in players_in_game:
-            stats = GamePlayerStats(
-                player_id=player.id,
-                first_name=player.first_name,
-                last_name=player.last_name,
-                jersey_number=player.jersey_number,
-            )
-
-            for tag in tag_list:
-                result = tag.shot_result.value
-                is_shooter = tag.shooter_id == player.id
-                is_on_ice = player.id in on_ice_by_tag.get(tag.id, set())
-                is_participating = player.id in participating_by_tag.get(tag.id, set())
-
-                if is_shooter:
-                    if result == ShotResultTypes.GOAL_FOR:
-                        stats.goals += 1
-                        stats.chances += 1
-                    elif result == ShotResultTypes.CHANCE_FOR:
-                        stats.chances += 1
-
-                if is_on_ice:
-                    if result == ShotResultTypes.GOAL_FOR:
-                        stats.goals_plus_on_ice += 1
-                        stats.chances_plus_on_ice += 1
-                    elif result == ShotResultTypes.GOAL_AGAINST:
-                        stats.goals_minus_on_ice += 1
-                        stats.chances_minus_on_ice += 1
-                    elif result == ShotResultTypes.CHANCE_FOR:
-                        stats.chances_plus_on_ice += 1
-                    elif result == ShotResultTypes.CHANCE_AGAINST:
-                        stats.chances_minus_on_ice += 1
-
-                if is_participating:
-                    if result == ShotResultTypes.GOAL_FOR:
-                        stats.goals_plus_participating += 1
-                        stats.chances_plus_participating += 1
-                    elif result == ShotResultTypes.GOAL_AGAINST:
-                        stats.goals_minus_participating += 1
-                        stats.chances_minus_participating += 1
-                    elif result == ShotResultTypes.CHANCE_FOR:
-                        stats.chances_plus_participating += 1
-                    elif result == ShotResultTypes.CHANCE_AGAINST:
-                        stats.chances_minus_participating += 1
-
-            player_stats_local.append(stats)
-
-        return {
-            "goals_for": gf,
-            "goals_against": ga,
-            "chances_for": cf,
-            "chances_against": ca,
-            "efficiency_for": eff_f,
-            "efficiency_against": eff_a,
-            "ice_zones": ice_z,
-            "net_zones": net_z,
-            "player_stats": player_stats_local,
-        }
-
-    # Build situation-specific tag lists
-    situations = {}
-    # Total (yht) includes all tags (including EN+/EN-)
-    situations["yht"] = build_kpi_from_tags(tags)
-    # 5v5 -> strengths == 'ES'
-    situations["5v5"] = build_kpi_from_tags([t for t in tags if getattr(t, "strengths", None) == "ES"]) if tags else build_kpi_from_tags([])
-    # YV (powerplay) -> strengths == 'PP'
-    situations["YV"] = build_kpi_from_tags([t for t in tags if getattr(t, "strengths", None) == "PP"]) if tags else build_kpi_from_tags([])
-    # AV (penaltykill) -> strengths == 'PK'
-    situations["AV"] = build_kpi_from_tags([t for t in tags if getattr(t, "strengths", None) == "PK"]) if tags else build_kpi_from_tags([])
-
-    # Use the total (yht) as the top-level KPI for backward compatibility
-    total_kpi = situations["yht"]
-
-    return GameKPI(
-        game_id=game.id,
-        date=str(game.date),
-        opponent=game.opponent,
-        home=game.home,
-        goals_for=total_kpi["goals_for"],
-        goals_against=total_kpi["goals_against"],
-        chances_for=total_kpi["chances_for"],
-        chances_against=total_kpi["chances_against"],
-        efficiency_for=total_kpi["efficiency_for"],
-        efficiency_against=total_kpi["efficiency_against"],
-        ice_zones=total_kpi["ice_zones"],
-        net_zones=total_kpi["net_zones"],
-        player_stats=total_kpi["player_stats"],
-        situations=situations,
-    )
+    # Use the snapshots that are still fresh, the rest of the games have to be recomputed
+    kpis_by_game: dict[int, GameKPI] = {}
+    snapshots_by_game: dict[int, GameKPISnapshot] = {}
+    games_to_recompute: list[Game] = []
+    for game, snapshot in games_with_snapshots:
+        if snapshot is not None:
+            snapshots_by_game[game.id] = snapshot
+
+        kpi = read_snapshot(snapshot)
+        if kpi is None:
+            games_to_recompute.append(game)
+        else:
+            kpis_by_game[game.id] = kpi
+
+    # Load the tag frames and rosters of the stale games in a fixed number of queries
+    kpi_inputs = load_game_kpi_inputs(team.id, [g.id for g in games_to_recompute], db)
+
+    # Calculate KPI for each stale game (includes zone stats and player stats per game)
+    recomputed_kpis: list[GameKPI] = []
+    for game in games_to_recompute:
+        game_inputs = kpi_inputs[game.id]
+        kpi = build_game_kpi(game, game_inputs["tags"], game_inputs["players"])
+        kpis_by_game[game.id] = kpi
+        recomputed_kpis.append(kpi)
+
+    # Collect the list before saving, committing expires the loaded games
+    game_kpis = [kpis_by_game[game.id] for game, _ in games_with_snapshots]
+
+    save_snapshots(recomputed_kpis, snapshots_by_game, db)
+
+    return game_kpis
 
 
 @router.get("", response_model=DashboardResponse)
 def get_dashboard(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db_session),
     current_user_id: int = Depends(get_current_user_id),
 ):
     """Get dashboard summary data for the current user's team."""
     
-    # Get user and team
-    user = db.query(User).filter(User.id == current_user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    if not user.team:
-        raise HTTPException(status_code=404, detail="User has no team")
-    
-    team = user.team
-    
-    # Get ALL games ordered by date descending (newest first)
-    all_games = db.query(Game).filter(
-        Game.team_id == team.id
-    ).order_by(desc(Game.date)).all()
-    
-    all_game_ids = [g.id for g in all_games]
-    
-    # Get all tags for ALL games
-    all_season_tags = db.query(PlayerStatsTag).filter(
-        PlayerStatsTag.game_id.in_(all_game_ids)
-    ).all() if all_game_ids else []
-    
-    # Calculate KPI for each game (includes zone stats and player stats per game)
-    game_kpis: list[GameKPI] = []
-    for game in all_games:
-        game_tags = [t for t in all_season_tags if t.game_id == game.id]
-        kpi = calculate_game_kpi(game, game_tags, db)
-        game_kpis.append(kpi)
+    team = get_user_team(current_user_id, db)
+
+    # Answer with 304 if the client already has the dashboard for the current data
+    data_version = get_team_data_version(team.id, db)
+    etag = make_etag("dashboard", data_version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified_response(etag)
     
+    game_kpis = get_game_kpis(team, db)
+
+    # The ETag is only given when no change was committed while the stale snapshots were recomputed
+    if get_team_data_version(team.id, db) == data_version:
+        response.headers.update(etag_headers(etag))
+
     return DashboardResponse(
         team_name=team.name,
         games=game_kpis,
     )
+
+
+@router.get("/range", response_model=DashboardRangeResponse)
+def get_dashboard_range(
+    request: Request,
+    response: Response,
+    start: Optional[int] = Query(None, ge=0, description="Index of the first game, 0 is the newest game"),
+    end: Optional[int] = Query(None, ge=0, description="Index of the last game (inclusive)"),
+    start_date: Optional[datetime_date] = Query(None, description="First game date (inclusive)"),
+    end_date: Optional[datetime_date] = Query(None, description="Last game date (inclusive)"),
+    db: Session = Depends(get_db_session),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Get the dashboard KPIs summed over a range of games, given either as indices
+    (newest game first, like the dashboard's game list) or as a date range.
+    The per-game KPIs are turned into prefix sums once per team data version, so
+    any range is answered without walking through its games.
+    """
+
+    if (start is not None or end is not None) and (start_date is not None or end_date is not None):
+        raise HTTPException(status_code=400, detail="Give the range either as indices or as dates, not both")
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be greater than end")
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    team = get_user_team(current_user_id, db)
+
+    data_version = get_team_data_version(team.id, db)
+    etag = make_etag("dashboard-range", data_version, start, end, start_date, end_date)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified_response(etag)
+
+    prefix_sums = get_cached_prefix_sums(team.id, data_version)
+    if prefix_sums is None:
+        prefix_sums = DashboardPrefixSums(get_game_kpis(team, db))
+        # Recomputing the stale snapshots leaves the version as it is, unless a change was committed meanwhile
+        if get_team_data_version(team.id, db) == data_version:
+            cache_prefix_sums(team.id, data_version, prefix_sums)
+            response.headers.update(etag_headers(etag))
+    else:
+        response.headers.update(etag_headers(etag))
+
+    if start_date is not None or end_date is not None:
+        index_range = prefix_sums.index_range_for_dates(start_date, end_date)
+    else:
+        first = start if start is not None else 0
+        last = min(end if end is not None else prefix_sums.game_count - 1, prefix_sums.game_count - 1)
+        index_range = (first, last) if first <= last else None
+
+    if index_range is None:
+        return DashboardRangeResponse(team_name=team.name, start=None, end=None, game_count=0, situations=prefix_sums.empty_range())
+
+    first, last = index_range
+    return DashboardRangeResponse(
+        team_name=team.name,
+        start=first,
+        end=last,
+        game_count=last - first + 1,
+        situations=prefix_sums.sum_range(first, last),
+    )
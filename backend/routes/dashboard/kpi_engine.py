@@ -0,0 +1,223 @@
+import numpy as np
+
+from db.models import Game, Player, ShotResultTypes
+from db.tag_frame import AREA_CODES, RESULT_CODES, TagFrame
+from db.pydantic_schemas import GameKPI, GamePlayerStats, SituationKPI, ZoneData
+
+# Situation keys used in GameKPI.situations. "yht" (total) takes every tag, the others
+# only take tags with the matching strengths value.
+TOTAL_SITUATION = "yht"
+STRENGTH_TO_SITUATION = {
+    "ES": "5v5",
+    "PP": "YV",
+    "PK": "AV",
+}
+SITUATION_KEYS = [TOTAL_SITUATION, *STRENGTH_TO_SITUATION.values()]
+TOTAL_INDEX = 0
+
+# Ice zones that are mirrored on the rink and are split by the side of the shot
+MIRRORED_ZONES = {"ZONE_2_SIDE", "ZONE_4", "OUTSIDE_FAR", "OUTSIDE_CLOSE"}
+
+# (goals_for, goals_against, chances_for, chances_against) increments per result.
+# Goals also count as chances. Shots are not counted, but still open a zone entry.
+RESULT_INCREMENTS: dict[ShotResultTypes, tuple[int, int, int, int]] = {
+    ShotResultTypes.GOAL_FOR: (1, 0, 1, 0),
+    ShotResultTypes.GOAL_AGAINST: (0, 1, 0, 1),
+    ShotResultTypes.CHANCE_FOR: (0, 0, 1, 0),
+    ShotResultTypes.CHANCE_AGAINST: (0, 0, 0, 1),
+}
+NO_INCREMENT = (0, 0, 0, 0)
+
+# Counter columns of a player, in the same order as the fields of GamePlayerStats
+PLAYER_COUNTER_FIELDS = [
+    "goals",
+    "chances",
+    "goals_plus_on_ice",
+    "goals_minus_on_ice",
+    "chances_plus_on_ice",
+    "chances_minus_on_ice",
+    "goals_plus_participating",
+    "goals_minus_participating",
+    "chances_plus_participating",
+    "chances_minus_participating",
+]
+ON_ICE_OFFSET = 2
+PARTICIPATING_OFFSET = 6
+
+
+# (goals_for, goals_against, chances_for, chances_against) increments indexed by result code
+INCREMENTS_BY_RESULT = np.array([RESULT_INCREMENTS.get(result, NO_INCREMENT) for result in RESULT_CODES], dtype=np.int64).reshape(-1, 4)
+MIRRORED_BY_AREA = np.array([area.value in MIRRORED_ZONES for area in AREA_CODES])
+
+
+def get_ice_zone_keys(frame: TagFrame) -> np.ndarray:
+    """Integer ice zone key of every tag: area code * 2, plus 1 for the right side of a mirrored zone."""
+    right_side = MIRRORED_BY_AREA[frame.area] & (frame.ice_x >= 50)
+    return frame.area * 2 + right_side
+
+
+def get_ice_zone_name(key: int) -> str:
+    """Ice zone name of a key from get_ice_zone_keys. Mirrored zones are split by side."""
+    area = AREA_CODES[key // 2]
+    if area.value not in MIRRORED_ZONES:
+        return area.value
+    return area.value + ("_RIGHT" if key % 2 else "_LEFT")
+
+
+class RosterIndex:
+    """Maps player ids to their positions in a game's roster list."""
+
+    def __init__(self, players_in_game: list[Player]):
+        self.player_ids = np.array([player.id for player in players_in_game], dtype=np.int64)
+        self.sorter = np.argsort(self.player_ids)
+        self.sorted_ids = self.player_ids[self.sorter]
+
+    def positions(self, player_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(roster positions, found mask) of the given player ids. Positions of ids not in the roster are meaningless."""
+        if len(self.sorted_ids) == 0:
+            return np.zeros(len(player_ids), dtype=np.int64), np.zeros(len(player_ids), dtype=bool)
+
+        found_at = np.minimum(np.searchsorted(self.sorted_ids, player_ids), len(self.sorted_ids) - 1)
+        return self.sorter[found_at], self.sorted_ids[found_at] == player_ids
+
+
+def get_tag_situations(frame: TagFrame) -> np.ndarray:
+    """Index into SITUATION_KEYS of every tag's own situation, TOTAL_INDEX for tags whose strengths has none."""
+    situation_by_strength = [SITUATION_KEYS.index(STRENGTH_TO_SITUATION[value]) if value in STRENGTH_TO_SITUATION else TOTAL_INDEX for value in frame.strength_values]
+    return np.array(situation_by_strength, dtype=np.int64)[frame.strength]
+
+
+def with_situations(tag_situations: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs every element (a tag, or a player linked to a tag, `rows` being the tag row of each element) with the
+    total situation and, if its tag has one, with its own situation as well.
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (situation index, element index) of every pair.
+    """
+    own_situations = tag_situations[rows]
+    with_own = np.flatnonzero(own_situations != TOTAL_INDEX)
+    situations = np.concatenate([np.full(len(rows), TOTAL_INDEX, dtype=np.int64), own_situations[with_own]])
+    return situations, np.concatenate([np.arange(len(rows)), with_own])
+
+
+class SituationCounters:
+    """
+    Integer counters of every situation of one game, indexed by SITUATION_KEYS position.
+    Tags are added for the total ("yht") and for their own situation (5v5, YV or AV) at the same time,
+    so the team, zone and per-player numbers of all situations are collected in one pass over the frame.
+    """
+
+    def __init__(self, players_in_game: list[Player]):
+        self.totals = np.zeros((len(SITUATION_KEYS), 4), dtype=np.int64)
+        self.players = np.zeros((len(SITUATION_KEYS), len(players_in_game), len(PLAYER_COUNTER_FIELDS)), dtype=np.int64)
+        self.ice_zones: list[dict[str, ZoneData]] = [{} for _ in SITUATION_KEYS]
+        self.net_zones: list[dict[str, ZoneData]] = [{} for _ in SITUATION_KEYS]
+
+    def add_tags(self, frame: TagFrame, roster: "RosterIndex") -> None:
+        increments = INCREMENTS_BY_RESULT[frame.result]
+        tag_situations = get_tag_situations(frame)
+        situations, rows = with_situations(tag_situations, np.arange(len(frame)))
+        entry_increments = increments[rows]
+
+        # 1. Team totals and zones
+        np.add.at(self.totals, situations, entry_increments)
+        add_zones(self.ice_zones, situations, get_ice_zone_keys(frame)[rows], entry_increments, get_ice_zone_name)
+
+        net_widths = len(frame.net_width_values)
+
+        def net_zone_name(key: int) -> str:
+            height, width = divmod(key, net_widths)
+            return f"{frame.net_height_values[height]}-{frame.net_width_values[width]}"
+
+        add_zones(self.net_zones, situations, (frame.net_height * net_widths + frame.net_width)[rows], entry_increments, net_zone_name)
+
+        # 2. Shooter goals and chances
+        shooter_positions, in_roster = roster.positions(frame.shooter_id[rows])
+        shooter_index = (situations[in_roster], shooter_positions[in_roster])
+        np.add.at(self.players[:, :, 0], shooter_index, entry_increments[in_roster, 0])
+        np.add.at(self.players[:, :, 1], shooter_index, entry_increments[in_roster, 2])
+
+        # 3. On ice and participating +/-, one element per (tag, player) pair
+        for link_rows, link_players, offset in ((frame.on_ice_rows(), frame.on_ice_players, ON_ICE_OFFSET), (frame.participating_rows(), frame.participating_players, PARTICIPATING_OFFSET)):
+            link_situations, links = with_situations(tag_situations, link_rows)
+            player_positions, in_roster = roster.positions(link_players[links])
+            player_index = (link_situations[in_roster], player_positions[in_roster])
+            np.add.at(self.players[:, :, offset : offset + 4], player_index, increments[link_rows[links[in_roster]]])
+
+    def to_situation_kpi(self, situation: int, players_in_game: list[Player]) -> SituationKPI:
+        gf, ga, cf, ca = self.totals[situation].tolist()
+
+        player_stats = []
+        for player, counters in zip(players_in_game, self.players[situation].tolist()):
+            stats = GamePlayerStats(
+                player_id=player.id,
+                first_name=player.first_name,
+                last_name=player.last_name,
+                jersey_number=player.jersey_number,
+                **dict(zip(PLAYER_COUNTER_FIELDS, counters)),
+            )
+            player_stats.append(stats)
+
+        return SituationKPI(
+            goals_for=gf,
+            goals_against=ga,
+            chances_for=cf,
+            chances_against=ca,
+            efficiency_for=round((gf / cf * 100), 1) if cf > 0 else 0.0,
+            efficiency_against=round((ga / ca * 100), 1) if ca > 0 else 0.0,
+            ice_zones=self.ice_zones[situation],
+            net_zones=self.net_zones[situation],
+            player_stats=player_stats,
+        )
+
+
+def add_zones(zones: list[dict[str, ZoneData]], situations: np.ndarray, keys: np.ndarray, increments: np.ndarray, name_of) -> None:
+    """Sums the increments per situation and zone key. Zones are listed in the order their first tag appears in the situation."""
+    key_count = int(keys.max()) + 1 if len(keys) else 1
+    unique_keys, first_rows, inverse = np.unique(situations * key_count + keys, return_index=True, return_inverse=True)
+    sums = np.zeros((len(unique_keys), 4), dtype=np.int64)
+    np.add.at(sums, inverse, increments)
+
+    for i in np.argsort(first_rows):
+        situation, key = divmod(int(unique_keys[i]), key_count)
+        gf, ga, cf, ca = sums[i].tolist()
+        zones[situation][name_of(key)] = ZoneData(goals_for=gf, goals_against=ga, chances_for=cf, chances_against=ca)
+
+
+def build_game_kpi(game: Game, frame: TagFrame, players_in_game: list[Player]) -> GameKPI:
+    """
+    Builds the GameKPI of a single game from the game's tag frame.
+    Every tag is added to the total ("yht") counters and to the counters of its own
+    situation (5v5, YV or AV), so all situations are aggregated in the same pass.
+    Args:
+        game (Game): The game the tags belong to.
+        frame (TagFrame): The tags of the game.
+        players_in_game (list[Player]): Players in the game's roster, in the order they are reported.
+    Returns:
+        GameKPI: KPIs of the game, with the per-situation aggregates in `situations`.
+    """
+
+    counters = SituationCounters(players_in_game)
+    counters.add_tags(frame, RosterIndex(players_in_game))
+
+    situations = {situation: counters.to_situation_kpi(index, players_in_game) for index, situation in enumerate(SITUATION_KEYS)}
+
+    # Use the total (yht) as the top-level KPI for backward compatibility
+    total_kpi = situations[TOTAL_SITUATION]
+
+    return GameKPI(
+        game_id=game.id,
+        date=str(game.date),
+        opponent=game.opponent,
+        home=game.home,
+        goals_for=total_kpi.goals_for,
+        goals_against=total_kpi.goals_against,
+        chances_for=total_kpi.chances_for,
+        chances_against=total_kpi.chances_against,
+        efficiency_for=total_kpi.efficiency_for,
+        efficiency_against=total_kpi.efficiency_against,
+        ice_zones=total_kpi.ice_zones,
+        net_zones=total_kpi.net_zones,
+        player_stats=total_kpi.player_stats,
+        situations=situations,
+    )
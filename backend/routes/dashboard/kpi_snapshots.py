@@ -0,0 +1,80 @@
+import logging
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from db.models import Game, GameKPISnapshot
+from db.pydantic_schemas import GameKPI
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the shape of GameKPI (or the way it is calculated) changes,
+# so the snapshots written by older code get recomputed instead of served.
+SNAPSHOT_FORMAT_VERSION = 1
+
+STALE_UPDATE = {GameKPISnapshot.is_stale: True, GameKPISnapshot.revision: GameKPISnapshot.revision + 1}
+
+
+def mark_games_stale(game_ids: list[int], db: Session) -> None:
+    """
+    Marks the KPI snapshots of the given games stale, so the next dashboard request recomputes them, and
+    bumps the games' stale generations, which changes the team data version.
+    Does not commit, the caller commits it together with the change that made the snapshots stale.
+    """
+    if not game_ids:
+        return
+
+    # One game at a time in id order, so concurrent writers lock the game rows in the same order
+    for game_id in sorted(set(game_ids)):
+        db.execute(update(Game).where(Game.id == game_id).values(stale_generation=Game.stale_generation + 1))
+    db.query(GameKPISnapshot).filter(GameKPISnapshot.game_id.in_(game_ids)).update(STALE_UPDATE, synchronize_session=False)
+
+
+def mark_team_stale(team_id: int, db: Session) -> None:
+    """Marks the KPI snapshots of every game of a team stale (e.g. after a player is renamed)."""
+    mark_games_stale(db.scalars(select(Game.id).where(Game.team_id == team_id)).all(), db)
+
+
+def read_snapshot(snapshot: GameKPISnapshot | None) -> GameKPI | None:
+    """Returns the GameKPI stored in a snapshot, or None if the snapshot is missing, stale or outdated."""
+    if snapshot is None or snapshot.is_stale or snapshot.format_version != SNAPSHOT_FORMAT_VERSION:
+        return None
+
+    try:
+        return GameKPI.model_validate_json(snapshot.kpi_json)
+    except ValueError as e:
+        logger.warning(f"⚠️ Unreadable KPI snapshot for game {snapshot.game_id}: {e}")
+        return None
+
+
+def save_snapshots(kpis: list[GameKPI], existing: dict[int, GameKPISnapshot], db: Session) -> None:
+    """
+    Writes fresh snapshots for the given KPIs, updating the existing rows and inserting the missing ones.
+    A failed write is only logged, the snapshots will simply be recomputed on the next request. This
+    happens when another request inserted the same game's snapshot at the same time, or when a snapshot
+    was marked stale again while it was being recomputed (its revision no longer matches).
+    Args:
+        kpis (list[GameKPI]): Freshly calculated KPIs.
+        existing (dict[int, GameKPISnapshot]): Game id -> the snapshot row already in the db, if any.
+        db (Session): Database session.
+    """
+    if not kpis:
+        return
+
+    for kpi in kpis:
+        snapshot = existing.get(kpi.game_id)
+        if snapshot is None:
+            snapshot = GameKPISnapshot(game_id=kpi.game_id)
+            db.add(snapshot)
+
+        snapshot.format_version = SNAPSHOT_FORMAT_VERSION
+        snapshot.kpi_json = kpi.model_dump_json()
+        snapshot.is_stale = False
+
+    try:
+        db.commit()
+    except (IntegrityError, StaleDataError) as e:
+        db.rollback()
+        logger.warning(f"⚠️ Failed to save KPI snapshots: {e}")
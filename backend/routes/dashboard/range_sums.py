@@ -0,0 +1,199 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date as datetime_date
+
+import numpy as np
+
+from db.pydantic_schemas import GameKPI, GamePlayerStats, RangePlayerStats, RangeSituationKPI, SituationKPI, ZoneData
+from routes.dashboard.kpi_engine import PLAYER_COUNTER_FIELDS, SITUATION_KEYS
+
+# Counters summed for the team totals and for every ice/net zone
+TEAM_FIELDS = ["goals_for", "goals_against", "chances_for", "chances_against"]
+ZONE_FIELDS = TEAM_FIELDS
+PLAYER_FIELDS = [*PLAYER_COUNTER_FIELDS, "games_played"]
+
+
+class DashboardPrefixSums:
+    """
+    Cumulative per-game sums of every dashboard counter of a team.
+    Each counter (team totals, ice/net zone values and per-player values of every situation)
+    is one column of a games x counters matrix. Row i of the prefix matrix holds the sums of the
+    first i games, so the totals of any game range are one row subtraction, independent of the
+    number of games in the range.
+    """
+
+    def __init__(self, game_kpis: list[GameKPI]):
+        """
+        Args:
+            game_kpis (list[GameKPI]): KPIs of all the team's games, newest game first (as on the dashboard).
+        """
+        self.game_count = len(game_kpis)
+        # Dates in ascending order for bisecting, the games themselves stay newest first
+        self.ascending_dates = [datetime_date.fromisoformat(kpi.date) for kpi in reversed(game_kpis)]
+
+        self.team_columns: dict[str, dict[str, int]] = {}
+        self.ice_zone_columns: dict[str, dict[str, dict[str, int]]] = {}
+        self.net_zone_columns: dict[str, dict[str, dict[str, int]]] = {}
+        self.player_columns: dict[str, dict[int, dict[str, int]]] = {}
+        self.players: dict[int, GamePlayerStats] = {}
+        self.column_count = 0
+
+        rows: list[dict[int, int]] = []
+        for kpi in game_kpis:
+            row: dict[int, int] = {}
+            for situation, situation_kpi in self._situations_of(kpi).items():
+                self._add_situation_values(row, situation, situation_kpi)
+            rows.append(row)
+
+        values = np.zeros((self.game_count, self.column_count), dtype=np.int64)
+        for i, row in enumerate(rows):
+            if row:
+                values[i, list(row.keys())] = list(row.values())
+
+        self.prefix = np.zeros((self.game_count + 1, self.column_count), dtype=np.int64)
+        np.cumsum(values, axis=0, out=self.prefix[1:])
+
+    @staticmethod
+    def _situations_of(kpi: GameKPI) -> dict[str, SituationKPI]:
+        if kpi.situations:
+            return kpi.situations
+
+        # Games without per-situation aggregates only have the totals
+        total = SituationKPI(
+            goals_for=kpi.goals_for,
+            goals_against=kpi.goals_against,
+            chances_for=kpi.chances_for,
+            chances_against=kpi.chances_against,
+            efficiency_for=kpi.efficiency_for,
+            efficiency_against=kpi.efficiency_against,
+            ice_zones=kpi.ice_zones,
+            net_zones=kpi.net_zones,
+            player_stats=kpi.player_stats,
+        )
+        return {SITUATION_KEYS[0]: total}
+
+    def _new_column(self) -> int:
+        self.column_count += 1
+        return self.column_count - 1
+
+    def _columns_for(self, fields: list[str]) -> dict[str, int]:
+        return {field: self._new_column() for field in fields}
+
+    def _add_situation_values(self, row: dict[int, int], situation: str, situation_kpi: SituationKPI) -> None:
+        team_columns = self.team_columns.setdefault(situation, {})
+        if not team_columns:
+            team_columns.update(self._columns_for(TEAM_FIELDS))
+        for field, column in team_columns.items():
+            row[column] = getattr(situation_kpi, field)
+
+        for zones, zone_columns in ((situation_kpi.ice_zones, self.ice_zone_columns), (situation_kpi.net_zones, self.net_zone_columns)):
+            situation_zone_columns = zone_columns.setdefault(situation, {})
+            for zone_name, zone_data in zones.items():
+                if zone_name not in situation_zone_columns:
+                    situation_zone_columns[zone_name] = self._columns_for(ZONE_FIELDS)
+                for field, column in situation_zone_columns[zone_name].items():
+                    row[column] = getattr(zone_data, field)
+
+        situation_player_columns = self.player_columns.setdefault(situation, {})
+        for player_stats in situation_kpi.player_stats:
+            # The newest game a player appears in gives the name and number to report
+            self.players.setdefault(player_stats.player_id, player_stats)
+
+            if player_stats.player_id not in situation_player_columns:
+                situation_player_columns[player_stats.player_id] = self._columns_for(PLAYER_FIELDS)
+            for field, column in situation_player_columns[player_stats.player_id].items():
+                row[column] = 1 if field == "games_played" else getattr(player_stats, field)
+
+    def index_range_for_dates(self, start_date: datetime_date | None, end_date: datetime_date | None) -> tuple[int, int] | None:
+        """
+        Converts an inclusive date range to an inclusive (start, end) index range, newest game first.
+        Returns None if no game falls in the date range.
+        """
+        first_ascending = bisect_left(self.ascending_dates, start_date) if start_date else 0
+        last_ascending = bisect_right(self.ascending_dates, end_date) - 1 if end_date else self.game_count - 1
+        if first_ascending > last_ascending:
+            return None
+
+        # Flip the ascending positions to the newest-first indices
+        return self.game_count - 1 - last_ascending, self.game_count - 1 - first_ascending
+
+    def sum_range(self, start: int, end: int) -> dict[str, RangeSituationKPI]:
+        """Sums every counter over the games start..end (inclusive, newest game first)."""
+        totals = self.prefix[end + 1] - self.prefix[start]
+
+        situations: dict[str, RangeSituationKPI] = {}
+        for situation, team_columns in self.team_columns.items():
+            gf, ga, cf, ca = (int(totals[team_columns[field]]) for field in TEAM_FIELDS)
+
+            player_stats = []
+            for player_id, columns in self.player_columns[situation].items():
+                player_values = {field: int(totals[column]) for field, column in columns.items()}
+                if player_values["games_played"] == 0:
+                    continue
+                player = self.players[player_id]
+                player_stats.append(
+                    RangePlayerStats(
+                        player_id=player_id,
+                        first_name=player.first_name,
+                        last_name=player.last_name,
+                        jersey_number=player.jersey_number,
+                        **player_values,
+                    )
+                )
+
+            situations[situation] = RangeSituationKPI(
+                goals_for=gf,
+                goals_against=ga,
+                chances_for=cf,
+                chances_against=ca,
+                efficiency_for=round((gf / cf * 100), 1) if cf > 0 else 0.0,
+                efficiency_against=round((ga / ca * 100), 1) if ca > 0 else 0.0,
+                ice_zones=self._sum_zones(totals, self.ice_zone_columns[situation]),
+                net_zones=self._sum_zones(totals, self.net_zone_columns[situation]),
+                player_stats=player_stats,
+            )
+
+        return situations
+
+    @staticmethod
+    def _sum_zones(totals: np.ndarray, zone_columns: dict[str, dict[str, int]]) -> dict[str, ZoneData]:
+        zones = {}
+        for zone_name, columns in zone_columns.items():
+            zone_values = {field: int(totals[column]) for field, column in columns.items()}
+            if any(zone_values.values()):
+                zones[zone_name] = ZoneData(**zone_values)
+        return zones
+
+    def empty_range(self) -> dict[str, RangeSituationKPI]:
+        """KPIs of a range that contains no games."""
+        empty = RangeSituationKPI(
+            goals_for=0,
+            goals_against=0,
+            chances_for=0,
+            chances_against=0,
+            efficiency_for=0.0,
+            efficiency_against=0.0,
+            ice_zones={},
+            net_zones={},
+            player_stats=[],
+        )
+        return {situation: empty for situation in SITUATION_KEYS}
+
+
+# team_id -> (data version, prefix sums). One entry per team, replaced when the team's data version changes.
+_prefix_sums_cache: dict[int, tuple[str, DashboardPrefixSums]] = {}
+_prefix_sums_lock = threading.Lock()
+
+
+def get_cached_prefix_sums(team_id: int, data_version: str) -> DashboardPrefixSums | None:
+    with _prefix_sums_lock:
+        cached = _prefix_sums_cache.get(team_id)
+
+    if cached is None or cached[0] != data_version:
+        return None
+    return cached[1]
+
+
+def cache_prefix_sums(team_id: int, data_version: str, prefix_sums: DashboardPrefixSums) -> None:
+    with _prefix_sums_lock:
+        _prefix_sums_cache[team_id] = (data_version, prefix_sums)
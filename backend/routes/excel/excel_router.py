@@ -5,6 +5,8 @@ from routes.excel.game_stats.router import router as game_stats_router
 from routes.excel.team_stats.router import router as team_stats_router
 from routes.excel.player_plus_minus.router import router as player_plus_minus_router
 from routes.excel.player_stats.router import router as player_stats_router
+from routes.excel.jobs.router import router as jobs_router
+from routes.excel.season_pack.router import router as season_pack_router
 
 router = APIRouter(
     prefix="/excel",
@@ -16,3 +18,5 @@ router.include_router(game_stats_router)
 router.include_router(team_stats_router)
 router.include_router(player_plus_minus_router)
 router.include_router(player_stats_router)
+router.include_router(jobs_router)
+router.include_router(season_pack_router)
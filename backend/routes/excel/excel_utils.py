@@ -1,7 +1,13 @@
+import logging
+from collections import defaultdict
 from io import BytesIO
+import numpy as np
 from openpyxl import Workbook
 
-from db.models import PlayerStatsTag, ShotResultTypes
+from db.models import ShotResultTypes
+from db.tag_frame import MISSING, TagFrame, result_table
+
+logger = logging.getLogger(__name__)
 
 
 def sanitize_opponent_name(name: str) -> str:
@@ -25,30 +31,67 @@ def workbook_to_bytesio(workbook: Workbook) -> BytesIO:
     return output
 
 
-def get_outcome_cell_adjustment(tag: PlayerStatsTag) -> dict:
+# Cell offsets by result code. The adjustment is determined as follows:
+#   - CHANCE_AGAINST: column is incremented by 1.
+#   - GOAL_FOR: row is incremented by 1.
+#   - GOAL_AGAINST: both row and column are incremented by 1.
+#   - Others (CHANCE_FOR and shots): no adjustment.
+OUTCOME_COLUMN_ADJUSTMENT = result_table({ShotResultTypes.CHANCE_AGAINST: 1, ShotResultTypes.GOAL_AGAINST: 1})
+OUTCOME_ROW_ADJUSTMENT = result_table({ShotResultTypes.GOAL_FOR: 1, ShotResultTypes.GOAL_AGAINST: 1})
+
+
+def get_outcome_cell_adjustments(tags: TagFrame) -> tuple[np.ndarray, np.ndarray]:
     """
-    Calculates the adjustment to be made to a cell's row and column based on the outcome of a player's shot.
+    Calculates the adjustments to be made to the cells' columns and rows based on the outcome of every shot.
     Args:
-        tag (PlayerStatsTag): An object containing information about the player's shot, including its result type.
+        tags (TagFrame): The shots, containing their result codes.
     Returns:
-        dict: A dictionary with 'row' and 'column' keys indicating the adjustment values to be applied.
-    The adjustment is determined as follows:
-        - If the shot result is CHANCE_AGAINST: column is incremented by 1.
-        - If the shot result is GOAL_FOR: row is incremented by 1.
-        - If the shot result is GOAL_AGAINST: both row and column are incremented by 1.
-        - For CHANCE_FOR: no adjustment is made (row and column remain 0).
+        tuple[np.ndarray, np.ndarray]: Column and row adjustment of every tag.
+    """
+
+    return OUTCOME_COLUMN_ADJUSTMENT[tags.result], OUTCOME_ROW_ADJUSTMENT[tags.result]
+
+
+def column_ords_for(values: list, mapping: dict) -> np.ndarray:
+    """
+    Lookup array of column letter ords by code, for the code vocabulary `values` (e.g. AREA_CODES or a
+    frame's strength_values). Values missing from the mapping get MISSING, so their tags can be dropped.
+    The extra last element maps MISSING codes (e.g. a tag without shot type) to MISSING as well.
+    """
+
+    return np.array([ord(mapping[value]) if value in mapping else MISSING for value in values] + [MISSING], dtype=np.int64)
+
+
+def log_left_out_tags(tags: TagFrame, kept: np.ndarray, reason: str) -> None:
     """
+    Logs the tags a collector leaves out because their value has no cell in the workbook, with their ids.
+    Args:
+        tags (TagFrame): The tags given to the collector.
+        kept (np.ndarray): Boolean mask of the tags the collector counted.
+        reason (str): What the left out tags are missing, e.g. "without a shot type".
+    """
+
+    left_out = tags.ids[~kept]
+    if len(left_out):
+        logger.warning(f"⚠️ Left out {len(left_out)} tags {reason} from the Excel export: {left_out.tolist()}")
 
-    adjustment = {"row": 0, "column": 0}
 
-    result_type = tag.shot_result.value
+def count_cells(column_ords: np.ndarray, rows: np.ndarray) -> defaultdict[str, int]:
+    """
+    Counts the occurrences of each cell given as parallel arrays of column letter ords and row numbers.
+    Args:
+        column_ords (np.ndarray): ord() of the column letter of every occurrence.
+        rows (np.ndarray): Row number of every occurrence.
+    Returns:
+        defaultdict[str, int]: Excel cell reference (e.g. "B5") -> number of occurrences.
+    """
+
+    cell_counts = defaultdict(int)
+    if len(rows) == 0:
+        return cell_counts
 
-    if result_type == ShotResultTypes.CHANCE_AGAINST:
-        adjustment["column"] = 1
-    elif result_type == ShotResultTypes.GOAL_FOR:
-        adjustment["row"] = 1
-    elif result_type == ShotResultTypes.GOAL_AGAINST:
-        adjustment["column"] = 1
-        adjustment["row"] = 1
+    cells, counts = np.unique(np.stack([column_ords, rows], axis=1), axis=0, return_counts=True)
+    for (column_ord, row), count in zip(cells.tolist(), counts.tolist()):
+        cell_counts[f"{chr(column_ord)}{row}"] += count
 
-    return adjustment
+    return cell_counts
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Callable
+
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from db.data_version import get_games_data_version
+from db.models import Team
+from db.redis_client import get_redis_url
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "excel-export:"
+
+# Bytes of finished exports kept per process, the least recently used are evicted past it. 0 disables the cache.
+EXCEL_CACHE_BYTES = int(os.getenv("EXCEL_CACHE_BYTES", 64 * 1024 * 1024))
+# "redis" also shares the finished exports between the server processes through Redis
+EXCEL_CACHE_BACKEND = os.getenv("EXCEL_CACHE_BACKEND", "memory")
+EXCEL_CACHE_TTL_SECONDS = int(os.getenv("EXCEL_CACHE_TTL_SECONDS", 24 * 60 * 60))
+# Seconds to skip Redis after a failed call, so a Redis outage does not slow down every export
+REDIS_RETRY_SECONDS = 30
+
+BuildExport = Callable[[str | None, Team, Session], BytesIO]
+
+
+def parse_game_ids(game_ids: str | None) -> list[int] | None:
+    """The selected game ids sorted and without duplicates, None if no games were selected (all games)."""
+    if not game_ids:
+        return None
+    return sorted({int(game_id) for game_id in game_ids.split(",")})
+
+
+def export_cache_key(route: str, team_id: int, game_ids: list[int] | None, data_version: str) -> str:
+    selection = "all" if game_ids is None else ",".join(map(str, game_ids))
+    digest = hashlib.sha256(f"{route}|{selection}|{data_version}".encode()).hexdigest()
+    return f"{KEY_PREFIX}{team_id}:{digest}"
+
+
+class ExportCache:
+    """
+    Cache of finished Excel exports (.xlsx bytes).
+    The keys hold the data version of the exported games, so an export is never served after its data
+    changed, the outdated entries simply stop being requested and age out. Every process keeps the
+    exports it has recently served in a size-bounded LRU. With the Redis backend the exports are also
+    stored in Redis, shared by all the server processes, and Redis is read on a local miss.
+    """
+
+    def __init__(self, max_bytes: int, use_redis: bool):
+        self.max_bytes = max_bytes
+        self.use_redis = use_redis
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+        self._redis: Redis | None = None
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                return data
+
+        data = self._redis_call(lambda client: client.get(key))
+        if data is not None:
+            self._store_locally(key, data)
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        self._store_locally(key, data)
+        self._redis_call(lambda client: client.set(key, data, ex=EXCEL_CACHE_TTL_SECONDS))
+
+    @property
+    def enabled(self) -> bool:
+        """Whether exports are kept at all, in this process or in Redis."""
+        return self.max_bytes > 0 or self.use_redis
+
+    def get_shared(self, key: str) -> bytes | None:
+        """Reads a small record shared by the server processes (e.g. an export job) from Redis. None without Redis."""
+        return self._redis_call(lambda client: client.get(key))
+
+    def set_shared(self, key: str, data: bytes, ttl_seconds: int) -> None:
+        """Stores a small record for the other server processes in Redis only, it is not kept locally."""
+        self._redis_call(lambda client: client.set(key, data, ex=ttl_seconds))
+
+    def _store_locally(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _redis_call(self, call: Callable[[Redis], bytes | None]) -> bytes | None:
+        if not self.use_redis or time.monotonic() < self._redis_down_until:
+            return None
+        try:
+            with self._lock:
+                if self._redis is None:
+                    self._redis = Redis.from_url(get_redis_url(), socket_connect_timeout=1, socket_timeout=1)
+            return call(self._redis)
+        except RedisError as e:
+            self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            logger.warning(f"⚠️ Excel export cache skipping Redis: {e}")
+            return None
+
+
+export_cache = ExportCache(EXCEL_CACHE_BYTES, use_redis=EXCEL_CACHE_BACKEND == "redis")
+
+
+def get_export_cache_key(route: str, game_ids: str | None, team: Team, db_session: Session) -> str:
+    """The export cache key of an export of the selected games' current data."""
+    selected_ids = parse_game_ids(game_ids)
+    return export_cache_key(route, team.id, selected_ids, get_games_data_version(team.id, selected_ids, db_session))
+
+
+def get_cached_export(route: str, build_export: BuildExport, game_ids: str | None, team: Team, db_session: Session) -> bytes:
+    """
+    Returns the finished workbook of an export from the export cache, building and caching it on a miss.
+    Args:
+        route (str): Name of the export, part of the cache key.
+        build_export (BuildExport): The export's builder, called as build_export(game_ids, team, db_session).
+        game_ids (str | None): Comma-separated ids of the selected games, as given to the route.
+        team (Team): The user's team.
+        db_session (Session): Database session.
+    Returns:
+        bytes: The .xlsx file.
+    """
+
+    if EXCEL_CACHE_BYTES <= 0:
+        return build_export(game_ids, team, db_session).getvalue()
+
+    # 1. The version is read before building, so a change made meanwhile only makes the entry newer than its key
+    key = get_export_cache_key(route, game_ids, team, db_session)
+
+    # 2. Serve a cached export of the same data
+    data = export_cache.get(key)
+    if data is not None:
+        return data
+
+    # 3. Build and cache the export
+    data = build_export(game_ids, team, db_session).getvalue()
+    export_cache.set(key, data)
+    return data
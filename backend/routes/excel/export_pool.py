@@ -0,0 +1,32 @@
+import asyncio
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# Exports built at the same time per process, the rest wait in line. Each export holds a workbook in memory.
+EXCEL_EXPORT_WORKERS = int(os.getenv("EXCEL_EXPORT_WORKERS", 2))
+
+# Background export jobs built at the same time per process. They have a pool of their own, so queued
+# full-season jobs never hold the threads the interactive downloads are waiting for.
+EXCEL_JOB_WORKERS = int(os.getenv("EXCEL_JOB_WORKERS", 1))
+
+_export_executor = ThreadPoolExecutor(max_workers=max(1, EXCEL_EXPORT_WORKERS), thread_name_prefix="excel-export")
+_job_executor = ThreadPoolExecutor(max_workers=max(1, EXCEL_JOB_WORKERS), thread_name_prefix="excel-job")
+
+
+async def run_export(build_export: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """
+    Runs the blocking part of an export (queries, stats, workbook and image building) in the export
+    worker pool, so the event loop keeps serving other requests meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_export_executor, partial(build_export, *args, **kwargs))
+
+
+def submit_export(build_export: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> Future[T]:
+    """Queues a background export job in the job worker pool without waiting for it."""
+    return _job_executor.submit(build_export, *args, **kwargs)
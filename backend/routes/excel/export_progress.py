@@ -0,0 +1,26 @@
+from contextvars import ContextVar
+from enum import Enum
+from typing import Callable
+
+
+class ExportStage(str, Enum):
+    LOADING = "loading"
+    AGGREGATING = "aggregating"
+    RENDERING_IMAGES = "rendering_images"
+    WRITING = "writing"
+
+
+# Receives the stages of the export running in the current thread, None when nobody is following it
+_stage_listener: ContextVar[Callable[[ExportStage], None] | None] = ContextVar("export_stage_listener", default=None)
+
+
+def report_stage(stage: ExportStage) -> None:
+    """Reports that the export running in the current thread has reached a stage. A no-op for plain exports."""
+    listener = _stage_listener.get()
+    if listener is not None:
+        listener(stage)
+
+
+def follow_stages(listener: Callable[[ExportStage], None] | None) -> None:
+    """Sends the stages reported in the current thread to the listener, None to stop following."""
+    _stage_listener.set(listener)
@@ -0,0 +1,24 @@
+from typing import NamedTuple
+
+from routes.excel.export_cache import BuildExport
+from routes.excel.game_stats.router import build_game_stats_export
+from routes.excel.player_plus_minus.router import build_plusminus_export
+from routes.excel.player_stats.router import build_player_stats_export
+from routes.excel.team_stats.router import build_team_stats_export
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ExcelExport(NamedTuple):
+    build: BuildExport
+    filename: str
+    requires_game_ids: bool  # The route has no "all games" default
+
+
+# The exports by the name of their /excel route, which is also their export cache name
+EXCEL_EXPORTS: dict[str, ExcelExport] = {
+    "game-stats": ExcelExport(build_game_stats_export, "pelitilastot.xlsx", requires_game_ids=False),
+    "teamstats": ExcelExport(build_team_stats_export, "joukkuetilastot.xlsx", requires_game_ids=True),
+    "player-stats": ExcelExport(build_player_stats_export, "pelaajayhteenveto.xlsx", requires_game_ids=False),
+    "plusminus": ExcelExport(build_plusminus_export, "plusminus.xlsx", requires_game_ids=True),
+}
@@ -1,19 +1,20 @@
 from typing import Any
-from collections import defaultdict
-from sqlalchemy.orm import Session, joinedload
-from routes.excel.excel_utils import get_outcome_cell_adjustment
-from db.models import Game, PlayerStatsTag, ShotAreaTypes, ShotResultTypes, ShotTypeTypes
-from routes.excel.stats_utils import MAP_RESULT_MAPPING, STATS_CELL_VALUES, STATS_MAP_COORDINATES, MapCategories, ResultMap
+import numpy as np
+from sqlalchemy.orm import Session
+from routes.excel.excel_utils import column_ords_for, count_cells, get_outcome_cell_adjustments, log_left_out_tags
+from db.models import Game, ShotAreaTypes, ShotResultTypes, ShotTypeTypes, Team
+from db.tag_frame import AREA_CODES, MISSING, TYPE_CODES, TagFrame, get_team_tag_frame, result_table
+from routes.excel.stats_utils import STATS_CELL_VALUES, STATS_MAP_COORDINATES, collect_mapped_data
 
 
-def collect_shotzone_data(player_stats_tags: list[PlayerStatsTag]) -> dict:
+def collect_shotzone_data(player_stats_tags: TagFrame) -> dict:
     """
-    Collects and aggregates shot zone data from a list of PlayerStatsTag objects.
+    Collects and aggregates shot zone data from a TagFrame.
     This function maps each shot area type to a specific Excel column, applies any necessary cell adjustments
     based on the outcome, and counts the occurrences of each resulting cell. The result is a dictionary
     mapping Excel cell references (e.g., "B5", "D6") to the number of times shots occurred in those zones.
     Args:
-        player_stats_tags (list[PlayerStatsTag]): A list of PlayerStatsTag objects representing shot events.
+        player_stats_tags (TagFrame): The tags of the shot events.
     Returns:
         dict: A dictionary where keys are Excel cell references (str) and values are the counts (int) of shots in those cells.
     """
@@ -32,32 +33,29 @@ def collect_shotzone_data(player_stats_tags: list[PlayerStatsTag]) -> dict:
 
     BASE_ROW = 5
 
-    zone_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        adjustment = get_outcome_cell_adjustment(tag)
-        cell_col = chr(ord(ZONE_COLUMN_MAPPING[tag.shot_area.value]) + adjustment["column"])
-        cell_row = BASE_ROW + adjustment["row"]
-        cell = f"{cell_col}{cell_row}"
-        zone_cell_stats_dict[cell] += 1
+    column_adjustment, row_adjustment = get_outcome_cell_adjustments(player_stats_tags)
+    cell_cols = column_ords_for(AREA_CODES, ZONE_COLUMN_MAPPING)[player_stats_tags.area] + column_adjustment
+    cell_rows = BASE_ROW + row_adjustment
 
-        # If its a goal, also increment the corresponding chance
-        if cell_row == 6:
-            zone_cell_stats_dict[f"{cell_col}{cell_row - 1}"] += 1
+    # If its a goal, also increment the corresponding chance
+    goals = cell_rows == 6
+    zone_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals]]), np.concatenate([cell_rows, cell_rows[goals] - 1]))
 
     return zone_cell_stats_dict
 
 
-def collect_shot_type_data(player_stats_tags: list[PlayerStatsTag]) -> dict:
+def collect_shot_type_data(player_stats_tags: TagFrame) -> dict:
     """
-    Collects and aggregates shot type data from a list of PlayerStatsTag objects, mapping each shot type to a specific Excel cell.
+    Collects and aggregates shot type data from a TagFrame, mapping each shot type to a specific Excel cell.
     Args:
-        player_stats_tags (list[PlayerStatsTag]): A list of PlayerStatsTag objects representing individual shot events.
+        player_stats_tags (TagFrame): The tags of the individual shot events.
     Returns:
         dict: A dictionary where keys are Excel cell references (e.g., "B12") and values are the counts of shots mapped to those cells.
     Notes:
         - The mapping of shot types to Excel columns is defined in TYPE_COLUMN_MAPPING.
         - The row is determined by BASE_ROW and may be adjusted based on the outcome and whether the shot was cross-ice.
-        - The function uses get_outcome_cell_adjustment to determine cell adjustments.
+        - The function uses get_outcome_cell_adjustments to determine cell adjustments.
+        - Tags without a shot type are left out and logged with their ids.
     """
 
     TYPE_COLUMN_MAPPING = {
@@ -72,24 +70,24 @@ def collect_shot_type_data(player_stats_tags: list[PlayerStatsTag]) -> dict:
     }
 
     BASE_ROW = 12
-    type_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        adjustment = get_outcome_cell_adjustment(tag)
-        if tag.crossice:
-            adjustment["column"] += 6
-        cell_col = chr(ord(TYPE_COLUMN_MAPPING[tag.shot_type.value]) + adjustment["column"])
-        cell_row = BASE_ROW + adjustment["row"]
-        cell = f"{cell_col}{cell_row}"
-        type_cell_stats_dict[cell] += 1
-
-        # If its a goal, also increment the corresponding chance
-        if cell_row == 13:
-            type_cell_stats_dict[f"{cell_col}{cell_row - 1}"] += 1
+    column_adjustment, row_adjustment = get_outcome_cell_adjustments(player_stats_tags)
+    column_adjustment = column_adjustment + np.where(player_stats_tags.crossice == 1, 6, 0)
+    type_cols = column_ords_for(TYPE_CODES, TYPE_COLUMN_MAPPING)[player_stats_tags.shot_type]
+
+    # Tags without a shot type have no cell to go to
+    has_type = type_cols != MISSING
+    log_left_out_tags(player_stats_tags, has_type, "without a shot type")
+    cell_cols = (type_cols + column_adjustment)[has_type]
+    cell_rows = (BASE_ROW + row_adjustment)[has_type]
+
+    # If its a goal, also increment the corresponding chance
+    goals = cell_rows == 13
+    type_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals]]), np.concatenate([cell_rows, cell_rows[goals] - 1]))
 
     return type_cell_stats_dict
 
 
-def collect_net_zone_data(player_stats_tags: list[PlayerStatsTag]) -> dict:
+def collect_net_zone_data(player_stats_tags: TagFrame) -> dict:
     WIDTH_COLUMN_MAPPING = {
         "Left": "C",
         "Mid": "D",
@@ -102,45 +100,36 @@ def collect_net_zone_data(player_stats_tags: list[PlayerStatsTag]) -> dict:
         "Bottom": 2,
     }
 
-    def get_adjustment(tag):
-        adjustment = {"row": 0, "column": 0}
-        result_type = tag.shot_result.value
-
-        if result_type == ShotResultTypes.CHANCE_FOR:
-            adjustment["column"] = 5
-        elif result_type == ShotResultTypes.GOAL_AGAINST:
-            adjustment["row"] = 7
-        elif result_type == ShotResultTypes.CHANCE_AGAINST:
-            adjustment["column"] = 5
-            adjustment["row"] = 7
-
-        return adjustment
+    # Chances go 5 columns right of the goals, tags against 7 rows below the tags for
+    NET_COLUMN_ADJUSTMENT = result_table({ShotResultTypes.CHANCE_FOR: 5, ShotResultTypes.CHANCE_AGAINST: 5})
+    NET_ROW_ADJUSTMENT = result_table({ShotResultTypes.GOAL_AGAINST: 7, ShotResultTypes.CHANCE_AGAINST: 7})
 
     BASE_ROW = 19
 
-    netzone_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        adjustment = get_adjustment(tag)
-        cell_col = chr(ord(WIDTH_COLUMN_MAPPING[tag.net_width]) + adjustment["column"])
-        cell_row = BASE_ROW + HEIGHT_ROW_MAPPING[tag.net_height] + adjustment["row"]
-        cell = f"{cell_col}{cell_row}"
-        netzone_cell_stats_dict[cell] += 1
+    width_cols = column_ords_for(player_stats_tags.net_width_values, WIDTH_COLUMN_MAPPING)[player_stats_tags.net_width]
+    height_rows = np.array([HEIGHT_ROW_MAPPING.get(height, MISSING) for height in player_stats_tags.net_height_values] + [MISSING])[player_stats_tags.net_height]
+    in_net = (width_cols != MISSING) & (height_rows != MISSING)
+    log_left_out_tags(player_stats_tags, in_net, "with an unknown net zone")
 
-        if cell_col in ["C", "D", "E"]:
-            chance_col = chr(ord(cell_col) + 5)
-            netzone_cell_stats_dict[f"{chance_col}{cell_row}"] += 1
+    tags_result = player_stats_tags.result[in_net]
+    cell_cols = width_cols[in_net] + NET_COLUMN_ADJUSTMENT[tags_result]
+    cell_rows = BASE_ROW + height_rows[in_net] + NET_ROW_ADJUSTMENT[tags_result]
+
+    # Goals (columns C-E) also count as chances, 5 columns to the right
+    goals = (cell_cols >= ord("C")) & (cell_cols <= ord("E"))
+    netzone_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals] + 5]), np.concatenate([cell_rows, cell_rows[goals]]))
 
     return netzone_cell_stats_dict
 
 
-def collect_shot_strengths_data(player_stats_tags: list[PlayerStatsTag]) -> dict:
+def collect_shot_strengths_data(player_stats_tags: TagFrame) -> dict:
     """
-    Collects and aggregates shot strengths data from a list of PlayerStatsTag objects.
+    Collects and aggregates shot strengths data from a TagFrame.
     This function maps each the number of players on the ice to a specific Excel cell based on predefined
     column mappings and calculated row/column adjustments. It then counts the occurrences of each
     cell reference, effectively summarizing the shot strengths distribution for later use in Excel export.
     Args:
-        player_stats_tags (list[PlayerStatsTag]): A list of PlayerStatsTag objects containing shot strength information.
+        player_stats_tags (TagFrame): The tags, containing shot strength information.
     Returns:
         dict: A dictionary where keys are Excel cell references (e.g., "B35") and values are the counts
               of shots mapped to each cell.
@@ -155,51 +144,26 @@ def collect_shot_strengths_data(player_stats_tags: list[PlayerStatsTag]) -> dict
     }
 
     BASE_ROW = 35
-    strengths_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        adjustment = get_outcome_cell_adjustment(tag)
-        cell_col = chr(ord(STRENGTHS_COLUMN_MAPPING[tag.strengths]) + adjustment["column"])
-        cell_row = BASE_ROW + adjustment["row"]
-        cell = f"{cell_col}{cell_row}"
-        strengths_cell_stats_dict[cell] += 1
-
-        # If its a goal, also increment the corresponding chance
-        if cell_row == 36:
-            strengths_cell_stats_dict[f"{cell_col}{cell_row - 1}"] += 1
-
-    return strengths_cell_stats_dict
-
+    column_adjustment, row_adjustment = get_outcome_cell_adjustments(player_stats_tags)
+    strength_cols = column_ords_for(player_stats_tags.strength_values, STRENGTHS_COLUMN_MAPPING)[player_stats_tags.strength]
 
-def collect_mapped_data(scoring_chances: list[PlayerStatsTag]) -> ResultMap:
-    """
-    Collects and maps scoring chance data into a structured format.
-
-    Args:
-        scoring_chances (list[PlayerStatsTag]): List of scoring chances to process.
-
-    Returns:
-        ResultMap: Dictionary mapping shot results to categories with ice and net coordinates.
-            So data[ShotResultTypes][MapCategories] is a list of (int, int)
-                    What outcome? Net or ice image? List of coordinates to draw.
-    """
+    known_strength = strength_cols != MISSING
+    log_left_out_tags(player_stats_tags, known_strength, "with unknown strengths")
+    cell_cols = (strength_cols + column_adjustment)[known_strength]
+    cell_rows = (BASE_ROW + row_adjustment)[known_strength]
 
-    data: ResultMap = {result: defaultdict(list) for result in ShotResultTypes}
-    for chance in scoring_chances:
-        ice = (chance.ice_x, chance.ice_y)
-        net = (chance.net_x, chance.net_y)
+    # If its a goal, also increment the corresponding chance
+    goals = cell_rows == 36
+    strengths_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals]]), np.concatenate([cell_rows, cell_rows[goals] - 1]))
 
-        for result in MAP_RESULT_MAPPING[chance.shot_result.value]:
-            data[result][MapCategories.ICE].append(ice)
-            data[result][MapCategories.NET].append(net)
-
-    return data
+    return strengths_cell_stats_dict
 
 
-def build_total_stats(scoring_chances: list[PlayerStatsTag]) -> dict[str, dict[str, int]]:
+def build_total_stats(scoring_chances: TagFrame) -> dict[str, dict[str, int]]:
     """
     Builds total game statistics by aggregating shot zone, shot type, net zone, strengths, and mapped data from scoring chances.
     Args:
-        scoring_chances (list[PlayerStatsTag]): List of player statistics tags.
+        scoring_chances (TagFrame): List of player statistics tags.
     Returns:
         dict[str, dict[str, int]]: Dictionary containing total stats with cell values and map coordinates.
     """
@@ -216,10 +180,8 @@ def build_total_stats(scoring_chances: list[PlayerStatsTag]) -> dict[str, dict[s
     return total_stats
 
 
-def build_per_game_stats(player_stats_tags: list[PlayerStatsTag], teams_games: list[Game]) -> list:
-    game_tags = defaultdict(list[PlayerStatsTag])
-    for tag in player_stats_tags:
-        game_tags[tag.game_id].append(tag)
+def build_per_game_stats(player_stats_tags: TagFrame, teams_games: list[Game]) -> list:
+    game_tags = player_stats_tags.by_game()
 
     per_game_stats = []
     for game in teams_games:
@@ -228,7 +190,7 @@ def build_per_game_stats(player_stats_tags: list[PlayerStatsTag], teams_games: l
         game_data["opponent"] = game.opponent
         game_data["home"] = game.home
 
-        tags_for_game = game_tags[game.id]
+        tags_for_game = game_tags.get(game.id, player_stats_tags.empty())
         shot_zone_data = collect_shotzone_data(tags_for_game)
         shot_type_data = collect_shot_type_data(tags_for_game)
         net_zone_data = collect_net_zone_data(tags_for_game)
@@ -243,7 +205,7 @@ def build_per_game_stats(player_stats_tags: list[PlayerStatsTag], teams_games: l
     return per_game_stats
 
 
-def get_game_stats(teams_games: list[Game], db_session: Session) -> tuple[list[dict[str, Any]], dict[str, dict[str, int]]]:
+def get_game_stats(teams_games: list[Game], team: Team, db_session: Session) -> tuple[list[dict[str, Any]], dict[str, dict[str, int]]]:
     """
     Collects and aggregates scoring-related statistics for a list of games.
     For each game in the provided list, this function gathers various player statistics
@@ -251,6 +213,7 @@ def get_game_stats(teams_games: list[Game], db_session: Session) -> tuple[list[d
     aggregates them per game, and also computes the totals across all games.
     Args:
         teams_games (list[Game]): A list of Game objects for which to collect statistics.
+        team (Team): The team the games belong to, its tag frame is used as the data source.
         db_session (Session): An active SQLAlchemy database session.
     Returns:
         tuple:
@@ -265,16 +228,7 @@ def get_game_stats(teams_games: list[Game], db_session: Session) -> tuple[list[d
 
     game_ids = [game.id for game in teams_games]
 
-    player_stats_tags = (
-        db_session.query(PlayerStatsTag)
-        .options(
-            joinedload(PlayerStatsTag.shot_result),
-            joinedload(PlayerStatsTag.shot_area),
-            joinedload(PlayerStatsTag.shot_type),
-        )
-        .filter(PlayerStatsTag.game_id.in_(game_ids))
-        .all()
-    )
+    player_stats_tags = get_team_tag_frame(team.id, db_session).for_games(game_ids)
 
     per_game_stats = build_per_game_stats(player_stats_tags, teams_games)
     total_stats = build_total_stats(player_stats_tags)
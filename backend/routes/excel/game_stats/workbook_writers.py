@@ -1,15 +1,27 @@
 from io import BytesIO
-import tempfile
 from typing import Any
 
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.drawing.image import Image as EXCLImage
-from PIL import Image
 
 from routes.excel.stats_utils import STATS_CELL_VALUES, STATS_MAP_COORDINATES
-from routes.excel.image_utils import get_map_images, scale_image
+from routes.excel.render_pool import render_map_image_sets
+from routes.excel.export_progress import ExportStage, report_stage
 from routes.excel.excel_utils import sanitize_opponent_name, workbook_to_bytesio
+from routes.excel.template_cache import load_template
+from routes.excel.streaming_workbook import STREAMING_EXPORTS, StreamingWorkbook, get_sheet_layout
+
+GAME_STATS_TEMPLATE = "excels/game_stats_template.xlsx"
+GAME_SHEET_TEMPLATE_INDEX = 0
+TOTAL_SHEET_TEMPLATE_INDEX = 1
+
+GAME_STATS_MAP_IMAGES = ("net_for", "ice_for", "net_vs", "ice_vs")
+GAME_STATS_IMAGE_CELLS = {
+    "net_for": "T20",
+    "ice_for": "T34",
+    "net_vs": "Y20",
+    "ice_vs": "Y34"} # fmt: skip
 
 
 def write_stats_to_cells(sheet: Worksheet, cell_values: dict):
@@ -17,89 +29,112 @@ def write_stats_to_cells(sheet: Worksheet, cell_values: dict):
         sheet[cell] = value
 
 
-def write_total_sheet_for_game_stats(workbook: Workbook, total_stats: dict[str, dict]):
-    total_sheet = workbook.worksheets[1]
+def write_total_sheet_for_game_stats(workbook: Workbook, total_stats: dict[str, dict], map_images: dict[str, bytes]):
+    total_sheet = workbook.worksheets[TOTAL_SHEET_TEMPLATE_INDEX]
 
-    coordinates = total_stats[STATS_MAP_COORDINATES]
-    map_images = get_map_images(coordinates)
     add_images_to_sheet(total_sheet, map_images)
     write_stats_to_cells(total_sheet, total_stats[STATS_CELL_VALUES])
 
 
-def write_game_metadata(game_sheet: Worksheet, game: dict[str, Any]):
+def game_sheet_title(game: dict[str, Any]) -> str:
     opponent_name = sanitize_opponent_name(game["opponent"])
-    game_sheet.title = f"{opponent_name} {game['date']}"
+    return f"{opponent_name} {game['date']}"
 
-    game_sheet["C1"] = game["date"]
-    game_sheet["G1"] = game["opponent"]
-    game_sheet["T1"] = game["home"]
 
+def game_metadata_cells(game: dict[str, Any]) -> dict[str, Any]:
+    return {"C1": game["date"], "G1": game["opponent"], "T1": game["home"]}
+
+
+def write_game_metadata(game_sheet: Worksheet, game: dict[str, Any]):
+    game_sheet.title = game_sheet_title(game)
+    write_stats_to_cells(game_sheet, game_metadata_cells(game))
 
-def add_images_to_sheet(sheet: Worksheet, map_images: dict[str, Image.Image]):
+
+def add_images_to_sheet(sheet: Worksheet, map_images: dict[str, bytes]):
     """
-    Adds scaled images to a worksheet at predefined cell positions based on a configuration dictionary.
-    This function processes a dictionary of PIL Image objects, scales each image according to the
-    specified scale factor, saves them temporarily as PNG files, and inserts them into the worksheet
-    at the designated cell locations. The configuration is hardcoded for specific image names.
+    Adds images to a worksheet at predefined cell positions based on a configuration dictionary.
+    This function processes a dictionary of PNG images, already rendered at their size in the
+    workbook, and inserts them into the worksheet from memory at the designated cell locations.
+    The configuration is hardcoded for specific image names.
     Parameters:
     - sheet (Worksheet): The openpyxl worksheet object where the images will be added.
-    - map_images (dict[str, Image.Image]): A dictionary mapping image names (e.g., "net_for", "ice_for")
-      to PIL Image objects that will be added to the sheet.
+    - map_images (dict[str, bytes]): A dictionary mapping image names (e.g., "net_for", "ice_for")
+      to the PNG data of the images that will be added to the sheet.
     The image configuration includes:
-    - "net_for": Scaled to 0.81 and placed at cell "T20".
-    - "ice_for": Scaled to 0.73 and placed at cell "T34".
-    - "net_vs": Scaled to 0.81 and placed at cell "Y20".
-    - "ice_vs": Scaled to 0.73 and placed at cell "Y34".
-    Note: Temporary PNG files are created and not automatically deleted (delete=False in NamedTemporaryFile).
-    Ensure proper cleanup to avoid accumulating temporary files.
+    - "net_for": Placed at cell "T20".
+    - "ice_for": Placed at cell "T34".
+    - "net_vs": Placed at cell "Y20".
+    - "ice_vs": Placed at cell "Y34".
     """
 
-    image_config = {
-        "net_for": {"scale": 0.81, "cell": "T20"}, 
-        "ice_for": {"scale": 0.73, "cell": "T34"},
-        "net_vs": {"scale": 0.81, "cell": "Y20"}, 
-        "ice_vs": {"scale": 0.73, "cell": "Y34"}} # fmt: skip
-
-    for img_name, config in image_config.items():
-        img = map_images[img_name]
-        scaled_img = scale_image(img, config["scale"])
-
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-            scaled_img.save(tmp_img.name)
-            excl_img = EXCLImage(tmp_img.name)
+    for img_name, cell in GAME_STATS_IMAGE_CELLS.items():
+        # A buffer of its own per image, openpyxl closes it after writing the image into the workbook
+        excl_img = EXCLImage(BytesIO(map_images[img_name]))
 
-        sheet.add_image(excl_img, config["cell"])
+        sheet.add_image(excl_img, cell)
 
 
-def write_per_game_sheets_for_game_stats(workbook: Workbook, per_game_stats: list[dict[str, Any]]):
-    template_sheet = workbook.worksheets[0]
+def write_per_game_sheets_for_game_stats(workbook: Workbook, per_game_stats: list[dict[str, Any]], per_game_map_images: list[dict[str, bytes]]):
+    template_sheet = workbook.worksheets[GAME_SHEET_TEMPLATE_INDEX]
 
-    per_game_stats.sort(key=lambda game: game["date"], reverse=True)
-    for game in per_game_stats:
+    for game, map_images in zip(per_game_stats, per_game_map_images):
         game_sheet = workbook.copy_worksheet(template_sheet)
         write_game_metadata(game_sheet, game)
 
-        coordinates = game[STATS_MAP_COORDINATES]
-        map_images = get_map_images(coordinates)
         add_images_to_sheet(game_sheet, map_images)
 
         write_stats_to_cells(game_sheet, game[STATS_CELL_VALUES])
 
 
+def stream_game_stats_workbook(
+    total_stats: dict[str, dict], per_game_stats: list[dict[str, Any]], total_map_images: dict[str, bytes], per_game_map_images: list[dict[str, bytes]]
+) -> BytesIO:
+    """
+    Writes the game stats workbook with xlsxwriter, streaming the sheets out one at a time on the template sheets' layouts.
+    Produces the same workbook as filling copies of the template sheets with openpyxl.
+    """
+
+    workbook = StreamingWorkbook()
+
+    # 1. The total sheet, first like in the template once its game sheet has been removed
+    total_layout = get_sheet_layout(GAME_STATS_TEMPLATE, TOTAL_SHEET_TEMPLATE_INDEX)
+    total_images = {cell: total_map_images[img_name] for img_name, cell in GAME_STATS_IMAGE_CELLS.items()}
+    workbook.add_sheet(total_layout, total_stats[STATS_CELL_VALUES], total_images)
+
+    # 2. A sheet per game
+    game_layout = get_sheet_layout(GAME_STATS_TEMPLATE, GAME_SHEET_TEMPLATE_INDEX)
+    for game, map_images in zip(per_game_stats, per_game_map_images):
+        cell_values = {**game_metadata_cells(game), **game[STATS_CELL_VALUES]}
+        images = {cell: map_images[img_name] for img_name, cell in GAME_STATS_IMAGE_CELLS.items()}
+        workbook.add_sheet(game_layout, cell_values, images, title=game_sheet_title(game))
+
+    return workbook.close()
+
+
 def build_game_stats_workbook(total_stats: dict[str, dict[str, int]], per_game_stats: list[dict[str, Any]]) -> BytesIO:
-    # 1. Load the excel file into a workbook object
-    workbook = load_workbook("excels/game_stats_template.xlsx")
+    # 1. Render the map images of all the sheets at once, newest game first
+    per_game_stats.sort(key=lambda game: game["date"], reverse=True)
+    coordinate_sets = [total_stats[STATS_MAP_COORDINATES], *(game[STATS_MAP_COORDINATES] for game in per_game_stats)]
+    report_stage(ExportStage.RENDERING_IMAGES)
+    total_map_images, *per_game_map_images = render_map_image_sets(coordinate_sets, GAME_STATS_MAP_IMAGES)
+    report_stage(ExportStage.WRITING)
+
+    if STREAMING_EXPORTS:
+        return stream_game_stats_workbook(total_stats, per_game_stats, total_map_images, per_game_map_images)
+
+    # 2. Load the excel file into a workbook object
+    workbook = load_template(GAME_STATS_TEMPLATE)
 
-    # 2. Write the total sheet (edits workbook in place)
-    write_total_sheet_for_game_stats(workbook, total_stats)
+    # 3. Write the total sheet (edits workbook in place)
+    write_total_sheet_for_game_stats(workbook, total_stats, total_map_images)
 
-    # 3. Write a separate sheet per game (edits workbook in place)
-    write_per_game_sheets_for_game_stats(workbook, per_game_stats)
+    # 4. Write a separate sheet per game (edits workbook in place)
+    write_per_game_sheets_for_game_stats(workbook, per_game_stats, per_game_map_images)
 
-    # 4. Delete the empty template sheet from the workbook
-    workbook.remove(workbook.worksheets[0])
+    # 5. Delete the empty template sheet from the workbook
+    workbook.remove(workbook.worksheets[GAME_SHEET_TEMPLATE_INDEX])
 
-    # 5. Convert the workbook to a BytesIO object to return
+    # 6. Convert the workbook to a BytesIO object to return
     output = workbook_to_bytesio(workbook)
 
     return output
@@ -1,8 +1,61 @@
-import tempfile
+import math
+import threading
+from functools import lru_cache
+from io import BytesIO
+from typing import Iterable
 from PIL import Image, ImageDraw
 from routes.excel.stats_utils import MapCategories
 from db.models import ShotResultTypes
 
+NET_IMG = "excels/images/maali.jpg"
+ICE_IMG = "excels/images/kaukalo.png"
+
+# Size of the maps in the workbooks relative to the templates. The maps are drawn at this size directly.
+NET_IMAGE_SCALE = 0.81
+ICE_IMAGE_SCALE = 0.73
+
+# zlib level 3 encodes the maps roughly 1.5-2x faster than the default level 6, at the cost of slightly
+# larger files: about 8% for the rink map and under 1% for the net map
+PNG_SAVE_OPTIONS = {"compress_level": 3}
+
+# Encoded maps kept by their drawing inputs, so identical maps (e.g. the empty maps of players without
+# shots) are drawn and encoded once. About 100 KB per map.
+MAP_PNG_CACHE_SIZE = 64
+
+# (template path, scale) -> decoded RGB template, shared by all the exports of the process
+_template_cache: dict[tuple[str, float], Image.Image] = {}
+_template_lock = threading.RLock()
+
+
+def get_template_image(img_path: str, scale: float = 1.0) -> Image.Image:
+    """
+    Returns a map template decoded to RGB and scaled by the given factor.
+    Each (template, scale) pair is decoded and scaled only once per process.
+    The returned image is shared: copy() it before drawing on it.
+    Args:
+        img_path (str): Path to the template image file.
+        scale (float): Scaling factor, 1.0 for the original size.
+    Returns:
+        Image.Image: The cached template image.
+    """
+
+    key = (img_path, scale)
+    template = _template_cache.get(key)
+    if template is not None:
+        return template
+
+    with _template_lock:
+        template = _template_cache.get(key)
+        if template is None:
+            if scale == 1.0:
+                with Image.open(img_path) as img:
+                    template = img.convert("RGB")
+            else:
+                template = scale_image(get_template_image(img_path), scale)
+            _template_cache[key] = template
+
+    return template
+
 
 def draw_x(img_draw: ImageDraw.ImageDraw, x: int, y: int, color: str, size: int = 12, thicknes: int = 7) -> None:
     """
@@ -19,7 +72,16 @@ def draw_o(img_draw: ImageDraw.ImageDraw, x: int, y: int, color: str, r: int = 1
     img_draw.ellipse((x - r, y - r, x + r, y + r), outline=color, width=width)
 
 
-def draw_map_image(goals: list[tuple[int, int]], chances: list[tuple[int, int]], img_path: str, color: str) -> Image.Image:
+def scale_length(length: int, scale: float) -> int:
+    return max(1, int(round(length * scale)))
+
+
+def scale_width(width: int, scale: float) -> int:
+    # Rounded up, the resampled full-size strokes used to look about this heavy
+    return max(1, math.ceil(width * scale))
+
+
+def draw_map_image(goals: list[tuple[int, int]], chances: list[tuple[int, int]], img_path: str, color: str, scale: float = 1.0) -> Image.Image:
     """
     Draws markers on a map image for goals and chances.
     Args:
@@ -27,12 +89,12 @@ def draw_map_image(goals: list[tuple[int, int]], chances: list[tuple[int, int]],
         chances (list[tuple[int, int]]): List of (x, y) coordinates for chances.
         img_path (str): Path to the template image file.
         color (str): Color for the markers.
+        scale (float): Size of the image relative to the template. The markers are scaled to match.
     Returns:
         Image.Image: The modified image with markers drawn.
     """
 
-    with Image.open(img_path) as img:
-        img = img.copy().convert("RGB")
+    img = get_template_image(img_path, scale).copy()
     draw = ImageDraw.Draw(img)
 
     x_scale = img.width / 100
@@ -46,53 +108,61 @@ def draw_map_image(goals: list[tuple[int, int]], chances: list[tuple[int, int]],
     for chance in chances:
         px = int(round(chance[0] * x_scale))
         py = int(round(chance[1] * y_scale))
-        draw_o(draw, px, py, color)
+        draw_o(draw, px, py, color, r=scale_length(10, scale), width=scale_width(5, scale))
 
     for goal in goals:
         px = int(round(goal[0] * x_scale))
         py = int(round(goal[1] * y_scale))
-        draw_x(draw, px, py, "black")
+        draw_x(draw, px, py, "black", size=scale_length(12, scale), thicknes=scale_width(7, scale))
 
     return img
 
 
-def get_map_images(coords: dict) -> dict[str, Image.Image]:
+def encode_png(img: Image.Image) -> bytes:
+    output = BytesIO()
+    img.save(output, format="PNG", **PNG_SAVE_OPTIONS)
+    return output.getvalue()
+
+
+@lru_cache(maxsize=MAP_PNG_CACHE_SIZE)
+def _render_map_png(goals: tuple[tuple[int, int], ...], chances: tuple[tuple[int, int], ...], img_path: str, color: str, scale: float) -> bytes:
+    return encode_png(draw_map_image(list(goals), list(chances), img_path, color, scale))
+
+
+# Map image name -> (goal result, chance result, net or ice, template, marker color, scale)
+MAP_IMAGE_SPECS = {
+    "net_for": (ShotResultTypes.GOAL_FOR, ShotResultTypes.CHANCE_FOR, MapCategories.NET, NET_IMG, "green", NET_IMAGE_SCALE),
+    "ice_for": (ShotResultTypes.GOAL_FOR, ShotResultTypes.CHANCE_FOR, MapCategories.ICE, ICE_IMG, "green", ICE_IMAGE_SCALE),
+    "net_vs": (ShotResultTypes.GOAL_AGAINST, ShotResultTypes.CHANCE_AGAINST, MapCategories.NET, NET_IMG, "red", NET_IMAGE_SCALE),
+    "ice_vs": (ShotResultTypes.GOAL_AGAINST, ShotResultTypes.CHANCE_AGAINST, MapCategories.ICE, ICE_IMG, "red", ICE_IMAGE_SCALE),
+}
+
+# Everything needed to render one map: (goals, chances, template path, color, scale). Hashable and picklable.
+MapImageJob = tuple[tuple[tuple[int, int], ...], tuple[tuple[int, int], ...], str, str, float]
+
+
+def get_map_image_jobs(coords: dict, names: Iterable[str] = MAP_IMAGE_SPECS) -> dict[str, MapImageJob]:
     """
-    Generates map images for goals and chances for and against, on net and ice.
+    Describes the map images for goals and chances for and against, on net and ice, at the size used in the workbooks.
     Args:
         coords (dict): Coordinates for shots, categorized by result and map category.
+        names (Iterable[str]): The images needed, by default 'net_for', 'ice_for', 'net_vs' and 'ice_vs'.
     Returns:
-        dict[str, Image.Image]: Dictionary with keys 'net_for', 'ice_for', 'net_vs', 'ice_vs' containing the generated images.
+        dict[str, MapImageJob]: The rendering job of each image, render them with render_map_image_job.
     """
 
-    NET_IMG = "excels/images/maali.jpg"
-    ICE_IMG = "excels/images/kaukalo.png"
-
-    net_for_img = draw_map_image(
-        goals=coords[ShotResultTypes.GOAL_FOR][MapCategories.NET], 
-        chances=coords[ShotResultTypes.CHANCE_FOR][MapCategories.NET],
-        img_path= NET_IMG, 
-        color="green") # fmt: skip
-
-    ice_for_img = draw_map_image(
-        goals=coords[ShotResultTypes.GOAL_FOR][MapCategories.ICE], 
-        chances=coords[ShotResultTypes.CHANCE_FOR][MapCategories.ICE],
-        img_path= ICE_IMG, 
-        color="green") # fmt: skip
-
-    net_vs_img = draw_map_image(
-        goals=coords[ShotResultTypes.GOAL_AGAINST][MapCategories.NET], 
-        chances=coords[ShotResultTypes.CHANCE_AGAINST][MapCategories.NET],
-        img_path= NET_IMG, 
-        color="red") # fmt: skip
-
-    ice_vs_img = draw_map_image(
-        goals=coords[ShotResultTypes.GOAL_AGAINST][MapCategories.ICE], 
-        chances=coords[ShotResultTypes.CHANCE_AGAINST][MapCategories.ICE],
-        img_path= ICE_IMG, 
-        color="red") # fmt: skip
-
-    return {"net_for": net_for_img, "ice_for": ice_for_img, "net_vs": net_vs_img, "ice_vs": ice_vs_img}
+    jobs = {}
+    for name in names:
+        goal_result, chance_result, category, img_path, color, scale = MAP_IMAGE_SPECS[name]
+        goals = tuple(map(tuple, coords[goal_result][category]))
+        chances = tuple(map(tuple, coords[chance_result][category]))
+        jobs[name] = (goals, chances, img_path, color, scale)
+    return jobs
+
+
+def render_map_image_job(job: MapImageJob) -> bytes:
+    """Renders a map image job to PNG data. A module level function, so it can run in a worker process."""
+    return _render_map_png(*job)
 
 
 def scale_image(img: Image.Image, scale: float) -> Image.Image:
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+
+from db.db_manager import SessionLocal
+from db.models import Team
+from db.pydantic_schemas import ExcelJobResponse
+from routes.excel.export_cache import export_cache, get_export_cache_key
+from routes.excel.export_pool import submit_export
+from routes.excel.export_progress import ExportStage, follow_stages
+from routes.excel.exports import EXCEL_EXPORTS
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY_PREFIX = "excel-job:"
+
+# Seconds a finished job is kept for downloading its workbook
+EXCEL_JOB_TTL_SECONDS = int(os.getenv("EXCEL_JOB_TTL_SECONDS", 60 * 60))
+# Queued and running jobs per team in a process, more are refused until some finish
+MAX_ACTIVE_JOBS_PER_TEAM = 4
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ExportJob:
+    """
+    A background export of a team and its progress. The finished workbook is kept in the export cache,
+    the job only holds its cache key.
+    """
+
+    def __init__(self, team_id: int, export: str, game_ids: str | None):
+        self.id = uuid.uuid4().hex
+        self.team_id = team_id
+        self.export = export
+        self.game_ids = game_ids
+        self.status = JobStatus.QUEUED
+        self.stage: ExportStage | None = None
+        self.error: str | None = None
+        self.cache_key: str | None = None
+        self.created_at = datetime.now(timezone.utc)
+        self.expires_at: datetime | None = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (JobStatus.QUEUED, JobStatus.RUNNING)
+
+    @property
+    def filename(self) -> str:
+        return EXCEL_EXPORTS[self.export].filename
+
+    def finish(self, status: JobStatus, error: str | None = None) -> None:
+        self.status = status
+        self.stage = None
+        self.error = error
+        self.expires_at = datetime.now(timezone.utc) + timedelta(seconds=EXCEL_JOB_TTL_SECONDS)
+
+    def to_record(self) -> bytes:
+        """The job as JSON, for the other server processes."""
+        return json.dumps(
+            {
+                "id": self.id,
+                "team_id": self.team_id,
+                "export": self.export,
+                "game_ids": self.game_ids,
+                "status": self.status.value,
+                "stage": self.stage.value if self.stage else None,
+                "error": self.error,
+                "cache_key": self.cache_key,
+                "created_at": self.created_at.isoformat(),
+                "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            }
+        ).encode()
+
+    @classmethod
+    def from_record(cls, data: bytes) -> "ExportJob":
+        record = json.loads(data)
+        job = cls(record["team_id"], record["export"], record["game_ids"])
+        job.id = record["id"]
+        job.status = JobStatus(record["status"])
+        job.stage = ExportStage(record["stage"]) if record["stage"] else None
+        job.error = record["error"]
+        job.cache_key = record["cache_key"]
+        job.created_at = datetime.fromisoformat(record["created_at"])
+        job.expires_at = datetime.fromisoformat(record["expires_at"]) if record["expires_at"] else None
+        return job
+
+    def to_response(self) -> ExcelJobResponse:
+        return ExcelJobResponse(
+            id=self.id,
+            export=self.export,
+            status=self.status.value,
+            stage=self.stage.value if self.stage else None,
+            error=self.error,
+            created_at=self.created_at,
+            expires_at=self.expires_at,
+        )
+
+
+class ExportJobStore:
+    """
+    The export jobs. A job runs in the job worker pool of the process that accepted it, which keeps it until
+    its TTL has passed. Every change of a job is also written to the export cache's Redis backend, if it has
+    one, so any server process can answer for any job; without Redis a job is only found through the process
+    that accepted it, like the cached exports. The finished workbooks are kept (and bounded) by the export
+    cache, the jobs only hold their cache keys.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, team_id: int, export: str, game_ids: str | None) -> ExportJob | None:
+        """Queues a new export job. None if the team already has too many jobs queued or running."""
+        with self._lock:
+            self._drop_expired()
+            active_jobs = sum(1 for job in self.jobs.values() if job.team_id == team_id and job.is_active)
+            if active_jobs >= MAX_ACTIVE_JOBS_PER_TEAM:
+                return None
+            job = ExportJob(team_id, export, game_ids)
+            self.jobs[job.id] = job
+
+        self._save(job)
+        submit_export(self._run, job)
+        return job
+
+    def get(self, job_id: str, team_id: int) -> ExportJob | None:
+        """Returns a job of the team, None if there is no such job or it has expired."""
+        with self._lock:
+            self._drop_expired()
+            job = self.jobs.get(job_id)
+
+        # A job accepted by another process
+        if job is None:
+            record = export_cache.get_shared(JOB_KEY_PREFIX + job_id)
+            job = ExportJob.from_record(record) if record is not None else None
+
+        if job is None or job.team_id != team_id:
+            return None
+        return job
+
+    def _save(self, job: ExportJob) -> None:
+        export_cache.set_shared(JOB_KEY_PREFIX + job.id, job.to_record(), EXCEL_JOB_TTL_SECONDS)
+
+    def _run(self, job: ExportJob) -> None:
+        """Builds a job's workbook into the export cache in a job worker thread, with a db session of its own."""
+
+        def set_stage(stage: ExportStage) -> None:
+            job.stage = stage
+            self._save(job)
+
+        job.status = JobStatus.RUNNING
+        set_stage(ExportStage.LOADING)
+        follow_stages(set_stage)
+        try:
+            with SessionLocal() as db_session:
+                team = db_session.get(Team, job.team_id)
+                export = EXCEL_EXPORTS[job.export]
+                cache_key = get_export_cache_key(job.export, job.game_ids, team, db_session)
+                if export_cache.get(cache_key) is None:
+                    export_cache.set(cache_key, export.build(job.game_ids, team, db_session).getvalue())
+            job.cache_key = cache_key
+            job.finish(JobStatus.DONE)
+        except Exception as e:
+            logger.warning(f"⚠️ Excel export job {job.id} ({job.export}) failed: {e}")
+            job.finish(JobStatus.FAILED, error="Error building the export")
+        finally:
+            follow_stages(None)
+        self._save(job)
+
+    def _drop_expired(self) -> None:
+        now = datetime.now(timezone.utc)
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.expires_at is not None and job.expires_at <= now]:
+            del self.jobs[job_id]
+
+
+export_jobs = ExportJobStore()
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+
+from db.models import Team, User
+from db.pydantic_schemas import ExcelJobCreate, ExcelJobResponse
+from utils import get_current_user_and_team
+
+from routes.excel.export_cache import export_cache, parse_game_ids
+from routes.excel.exports import EXCEL_EXPORTS, XLSX_MEDIA_TYPE
+from routes.excel.jobs.export_jobs import ExportJob, JobStatus, export_jobs
+
+router = APIRouter()
+
+
+def get_team_job(job_id: str, team: Team) -> ExportJob:
+    job = export_jobs.get(job_id, team.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found or expired")
+    return job
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED, response_model=ExcelJobResponse)
+def create_export_job(job_data: ExcelJobCreate, user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+    """
+    Starts building an export in the background and returns the job right away.
+    Poll GET /excel/jobs/{job_id} for its progress and download the workbook from /excel/jobs/{job_id}/download once it is done.
+    """
+    _, team = user_and_team
+
+    # The finished workbooks are kept in the export cache
+    if not export_cache.enabled:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Background exports need the export cache")
+    if EXCEL_EXPORTS[job_data.export].requires_game_ids and not job_data.game_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Select the games to export")
+    try:
+        parse_game_ids(job_data.game_ids)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid game ids")
+
+    job = export_jobs.submit(team.id, job_data.export, job_data.game_ids)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many exports in progress, wait for them to finish")
+
+    return job.to_response()
+
+
+@router.get("/jobs/{job_id}", response_model=ExcelJobResponse)
+def get_export_job(job_id: str, user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+    _, team = user_and_team
+    return get_team_job(job_id, team).to_response()
+
+
+@router.get("/jobs/{job_id}/download")
+def download_export_job(job_id: str, user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+    _, team = user_and_team
+    job = get_team_job(job_id, team)
+
+    # The failure itself is reported in the job status, the workbook just does not exist
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="The export failed, see the job status")
+    if job.status != JobStatus.DONE:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The export is not ready yet")
+
+    content = export_cache.get(job.cache_key)
+    if content is None:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="The export has expired, start a new one")
+
+    return Response(content=content, media_type=XLSX_MEDIA_TYPE, headers={"Content-Disposition": f"attachment; filename={job.filename}"})
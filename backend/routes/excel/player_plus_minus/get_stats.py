@@ -1,7 +1,14 @@
+import numpy as np
 from sqlalchemy.orm import Session, selectinload
 
-from db.models import Game, GameInRoster, Player, PlayerStatsTag, PlayerStatsTagOnIce, PlayerStatsTagParticipating, Team
-from routes.excel.player_plus_minus.plus_minus_utils import ParticipationTypes, PlusMinusPlayer, PlusMinusTag, should_skip_tag, split_game_ids, strenghts_str_to_enum
+from db.models import Game, GameInRoster, Player, ShotResultTypes, Team
+from db.tag_frame import RESULT_CODES, RESULT_TO_CODE, TagFrame, get_team_tag_frame
+from routes.excel.player_plus_minus.plus_minus_domain import PlusMinusTag, StrengthTypes
+from routes.excel.player_plus_minus.plus_minus_utils import ParticipationTypes, PlusMinusPlayer, split_game_ids, strenghts_str_to_enum
+from routes.excel.export_progress import ExportStage, report_stage
+
+STRENGTH_VALUES = [strength.value for strength in StrengthTypes]
+SHOT_CODES = [RESULT_TO_CODE[ShotResultTypes.SHOT_FOR], RESULT_TO_CODE[ShotResultTypes.SHOT_AGAINST]]
 
 
 def get_players_in_games(game_ids_str: str | None, team: Team, db: Session) -> dict[int, PlusMinusPlayer]:
@@ -16,40 +23,29 @@ def get_players_in_games(game_ids_str: str | None, team: Team, db: Session) -> d
     return plus_minus_players
 
 
-def get_participating_tags(game_ids_str: str | None, db: Session) -> list[PlayerStatsTagOnIce | PlayerStatsTagParticipating]:
-    """Retrieve all on-ice and participating stats tags for the specified games."""
-    game_ids = split_game_ids(game_ids_str)
-    oi_tags = (
-        db.query(PlayerStatsTagOnIce)
-        .join(PlayerStatsTagOnIce.tag)
-        .options(selectinload(PlayerStatsTagOnIce.tag).selectinload(PlayerStatsTag.shot_result))
-        .filter(PlayerStatsTag.game_id.in_(game_ids))
-        .all()
-    )
-    p_tags = (
-        db.query(PlayerStatsTagParticipating)
-        .join(PlayerStatsTagParticipating.tag)
-        .options(selectinload(PlayerStatsTagParticipating.tag).selectinload(PlayerStatsTag.shot_result))
-        .filter(PlayerStatsTag.game_id.in_(game_ids))
-        .all()
-    )
-    return oi_tags + p_tags
-
-
-def add_tags_to_players(players: dict[int, PlusMinusPlayer], tags: list[PlayerStatsTagOnIce | PlayerStatsTagParticipating]) -> None:
-    """Associate stats tags with their corresponding players."""
-    for tag in tags:
-        if should_skip_tag(tag.tag):  # Skip if empty net or shot tag (not needed for +/- stats)
-            continue
-        type_of_tag = ParticipationTypes.ON_ICE if type(tag) == PlayerStatsTagOnIce else ParticipationTypes.PARTICIPATING
-        pm_tag = PlusMinusTag(tag.tag.game_id, type_of_tag, strenghts_str_to_enum(tag.tag.strengths), tag.tag.shot_result.value)
-        players[tag.player_id].add_tag(tag.tag.game_id, pm_tag)
+def add_tags_to_players(players: dict[int, PlusMinusPlayer], tags: TagFrame) -> None:
+    """Associate the on-ice and participating entries of the stats tags with their corresponding players."""
+    # Skip empty net and shot tags (not needed for +/- stats)
+    counted = np.isin(tags.strength, tags.strength_codes(STRENGTH_VALUES))
+    counted &= ~np.isin(tags.result, SHOT_CODES)
+
+    strengths = [strenghts_str_to_enum(value) if value in STRENGTH_VALUES else None for value in tags.strength_values]
+    for type_of_tag, rows, player_ids in (
+        (ParticipationTypes.ON_ICE, tags.on_ice_rows(), tags.on_ice_players),
+        (ParticipationTypes.PARTICIPATING, tags.participating_rows(), tags.participating_players),
+    ):
+        selected = counted[rows]
+        rows, player_ids = rows[selected], player_ids[selected]
+        for game_id, strength, result, player_id in zip(tags.game_id[rows].tolist(), tags.strength[rows].tolist(), tags.result[rows].tolist(), player_ids.tolist()):
+            pm_tag = PlusMinusTag(game_id, type_of_tag, strengths[strength], RESULT_CODES[result])
+            players[player_id].add_tag(game_id, pm_tag)
 
 
 def get_players_with_stats(game_ids: str, team: Team, db_session: Session) -> dict[int, PlusMinusPlayer]:
     """Load players and their associated plus/minus stats for the specified games."""
     players: dict[int, PlusMinusPlayer] = get_players_in_games(game_ids, team, db_session)
-    tags = get_participating_tags(game_ids, db_session)
+    tags = get_team_tag_frame(team.id, db_session).for_games(split_game_ids(game_ids))
+    report_stage(ExportStage.AGGREGATING)
     add_tags_to_players(players, tags)
 
     return players
@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Session
 
-from db.models import Game, GameInRoster, Player, PlayerStatsTag, PlayerStatsTagOnIce, PlayerStatsTagParticipating, Positions, ShotResultTypes, Team
-from routes.excel.player_plus_minus.plus_minus_domain import RESULT_TO_COLUMN_MAP, ParticipationTypes, PlusMinusPlayer, PlusMinusTag, StrengthTypes
+from db.models import Game, GameInRoster, Player, Positions, ShotResultTypes, Team
+from routes.excel.player_plus_minus.plus_minus_domain import RESULT_TO_COLUMN_MAP, ParticipationTypes, PlusMinusPlayer, StrengthTypes
 
 
 def get_column_for_stat(strength: StrengthTypes, participation: ParticipationTypes, result: ShotResultTypes):
@@ -15,16 +15,6 @@ def strenghts_str_to_enum(strength_str: str) -> StrengthTypes:
     strength_enum = strength_mapping[strength_str]
     return strength_enum
 
-def should_skip_tag(tag: PlayerStatsTag) -> bool:
-    """Check if a tag should be excluded from plus/minus stats."""
-    if tag.strengths not in ["ES", "PP", "PK"]:
-        return True  # Skip "Empty net tags"
-
-    if tag.shot_result.value in [ShotResultTypes.SHOT_FOR, ShotResultTypes.SHOT_AGAINST]:
-        return True  # Skip shot tags, only process chances and goals
-
-    return False
-
 
 def format_player_name(player: PlusMinusPlayer, roster_players: list[PlusMinusPlayer]) -> str:
     """
@@ -66,16 +56,6 @@ def split_game_ids(game_ids: str | None) -> list[int]:
     return selected_ids
 
 
-def add_tags_to_players(players: dict[int, PlusMinusPlayer], tags: list[PlayerStatsTagOnIce | PlayerStatsTagParticipating]) -> None:
-    """Associate stats tags with their corresponding players."""
-    for tag in tags:
-        if should_skip_tag(tag.tag):  # Skip if empty net or shot tag (not needed for +/- stats)
-            continue
-        type_of_tag = ParticipationTypes.ON_ICE if type(tag) == PlayerStatsTagOnIce else ParticipationTypes.PARTICIPATING
-        pm_tag = PlusMinusTag(tag.tag.game_id, type_of_tag, strenghts_str_to_enum(tag.tag.strengths), tag.tag.shot_result.value)
-        players[tag.player_id].add_tag(tag.tag.game_id, pm_tag)
-
-
 def get_players_in_game(game: Game, players: dict[int, PlusMinusPlayer]) -> list[PlusMinusPlayer]:
     """Get all players who participated in a specific game, sorted by last name."""
     plr_ids = [roster_spot.player_id for roster_spot in game.in_rosters]
@@ -1,3 +1,5 @@
+from io import BytesIO
+
 from fastapi import Depends, APIRouter, Response
 from sqlalchemy.orm import Session
 
@@ -8,15 +10,13 @@ from db.models import Team, User
 
 from routes.excel.player_plus_minus.workbook_writer import build_workbook
 from routes.excel.player_plus_minus.get_stats import get_games_with_rosters, get_players_with_stats
+from routes.excel.export_pool import run_export
+from routes.excel.export_cache import get_cached_export
 
 router = APIRouter()
 
 
-@router.get("/plusminus")
-async def get_plusminus_excel(game_ids: str, db_session: Session = Depends(get_db_session), user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
-    """Generate plus/minus Excel report for selected games."""
-    _, team = user_and_team
-
+def build_plusminus_export(game_ids: str, team: Team, db_session: Session) -> BytesIO:
     # 1. Load the players in roster for this game, and PlusMinusTags for them
     players = get_players_with_stats(game_ids, team, db_session)
 
@@ -26,4 +26,13 @@ async def get_plusminus_excel(game_ids: str, db_session: Session = Depends(get_d
     # 3. Write the total and game sheets and return the workbook as BytesIO object
     output = build_workbook(players, games)
 
-    return Response(content=output.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=plusminus.xlsx"})
+    return output
+
+
+@router.get("/plusminus")
+async def get_plusminus_excel(game_ids: str, db_session: Session = Depends(get_db_session), user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+    """Generate plus/minus Excel report for selected games."""
+    _, team = user_and_team
+    content = await run_export(get_cached_export, "plusminus", build_plusminus_export, game_ids, team, db_session)
+
+    return Response(content=content, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=plusminus.xlsx"})
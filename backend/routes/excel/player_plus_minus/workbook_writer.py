@@ -1,9 +1,11 @@
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
 
 from db.models import Game, Positions
 from routes.excel.player_plus_minus.plus_minus_domain import FIRST_DEFENDER_ROW, FIRST_FORWARD_ROW, NAME_COLUMNS, PlusMinusPlayer
 from routes.excel.excel_utils import sanitize_opponent_name, workbook_to_bytesio
+from routes.excel.export_progress import ExportStage, report_stage
+from routes.excel.template_cache import load_template
 from routes.excel.player_plus_minus.plus_minus_utils import (
     format_player_name,
     get_column_for_stat,
@@ -109,7 +111,8 @@ def write_game_sheets(games: list[Game], players: dict[int, PlusMinusPlayer], wo
 def build_workbook(players: dict[int, PlusMinusPlayer], games: list[Game]):
     """Build complete Excel workbook with total and per-game sheets."""
     # 1. Load the excel file into a workbook object
-    workbook = load_workbook("excels/plus_minus_template.xlsx")
+    report_stage(ExportStage.WRITING)
+    workbook = load_template("excels/plus_minus_template.xlsx")
 
     # 2. Write the total and total avg sheet (edits workbook in place)
     write_total_sheets(players, workbook)
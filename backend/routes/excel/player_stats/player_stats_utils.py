@@ -1,12 +1,13 @@
 from typing import TypedDict
 from db.models import ShotAreaTypes
+from db.tag_frame import TagFrame
 
 class PlayerStats(TypedDict):
     games: int
     first_name: str
     last_name: str
-    shooter_tags: list
-    on_ice_tags: list
+    shooter_tags: TagFrame
+    on_ice_tags: TagFrame
     cell_values: dict
     per_game_stats: list
     coordinates: dict
@@ -1,11 +1,11 @@
 from collections import defaultdict
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
-from db.models import Game, PlayerStatsTag, Team
+from db.models import Game, Team
+from db.tag_frame import MISSING, TagFrame, get_team_tag_frame, group_rows
 from routes.excel.player_stats.player_stats_utils import PlayerStats
-from routes.excel.stats_utils import get_selected_games
 
-def build_players_to_analyze_dict(selected_games: list[Game]) -> defaultdict[int, PlayerStats]:
+def build_players_to_analyze_dict(selected_games: list[Game], no_tags: TagFrame) -> defaultdict[int, PlayerStats]:
     """
     Builds a data collecting dictionary that initializes player statistics for analysis.
     This function creates a defaultdict where each key is a player ID (int) and the value is a dictionary
@@ -15,14 +15,15 @@ def build_players_to_analyze_dict(selected_games: list[Game]) -> defaultdict[int
     each player across the games.
     Args:
         selected_games (list[Game]): A list of Game objects from which to extract player information.
+        no_tags (TagFrame): An empty tag frame, the initial value of the tag fields.
     Returns:
         defaultdict[int, dict]: A defaultdict with player IDs as keys and dictionaries as values,
-        each containing keys like 'games' (int), 'first_name' (str), 'last_name' (str), 'shooter_tags' (list),
-        'on_ice_tags' (list), 'cell_values' (dict), and 'per_game_stats' (list).
+        each containing keys like 'games' (int), 'first_name' (str), 'last_name' (str), 'shooter_tags' (TagFrame),
+        'on_ice_tags' (TagFrame), 'cell_values' (dict), and 'per_game_stats' (list).
     """
 
     players_to_analyze: defaultdict[int, PlayerStats] = defaultdict(
-        lambda: {"games": 0, "first_name": "", "last_name": "", "shooter_tags": [], "on_ice_tags": [], "cell_values": {}, "per_game_stats": [], "coordinates": {}}
+        lambda: {"games": 0, "first_name": "", "last_name": "", "shooter_tags": no_tags, "on_ice_tags": no_tags, "cell_values": {}, "per_game_stats": [], "coordinates": {}}
     )
 
     for game in selected_games:
@@ -37,55 +38,22 @@ def build_players_to_analyze_dict(selected_games: list[Game]) -> defaultdict[int
     return players_to_analyze
 
 
-def get_PSTs_for_games(selected_games: list[Game], db_session: Session):
-    """
-    Retrieves a list of PlayerStatsTag objects for the specified games, with eager loading of related entities.
-
-    This function performs a database query to fetch PlayerStatsTag records that are associated with the provided list of games.
-    It uses joinedload to eagerly load related objects (shooter, game, shot_result, shot_area, shot_type, players_on_ice, and players_participating)
-    to avoid N+1 query problems.
+def add_players_tags(players_to_analyze: defaultdict[int, PlayerStats], player_stats_tags: TagFrame) -> None:
+    # 1. Set the tags of each shooter as their "shooter_tags"
+    for shooter_id, rows in group_rows(player_stats_tags.shooter_id).items():
+        if shooter_id != MISSING:
+            players_to_analyze[shooter_id]["shooter_tags"] = player_stats_tags.take(rows)
 
-    Args:
-        db_session (Session): The SQLAlchemy database session used to execute the query.
-        selected_games (list[Game]): A list of Game objects to filter the PlayerStatsTag records by their associated game.
+    # 2. Set the tags each player was on ice for as their "on_ice_tags"
+    on_ice_rows = player_stats_tags.on_ice_rows()
+    for player_id, entries in group_rows(player_stats_tags.on_ice_players).items():
+        players_to_analyze[player_id]["on_ice_tags"] = player_stats_tags.take(on_ice_rows[entries])
 
-    Returns:
-        list[PlayerStatsTag]: A list of PlayerStatsTag objects matching the selected games, with related entities eager loaded.
-    """
 
+def get_players_to_analyze(selected_games: list[Game], team: Team, db_session: Session) -> defaultdict[int, PlayerStats]:
     game_ids = [game.id for game in selected_games]
-    player_stats_tags = (
-        db_session.query(PlayerStatsTag)
-        .options(
-            joinedload(PlayerStatsTag.shooter),
-            joinedload(PlayerStatsTag.game),
-            joinedload(PlayerStatsTag.shot_result),
-            joinedload(PlayerStatsTag.shot_area),
-            joinedload(PlayerStatsTag.shot_type),
-            joinedload(PlayerStatsTag.players_on_ice),
-            joinedload(PlayerStatsTag.players_participating),
-        )
-        .filter(PlayerStatsTag.game_id.in_(game_ids))
-        .all()
-    )
-    return player_stats_tags
-
-
-def add_players_tags(players_to_analyze: defaultdict[int, PlayerStats], player_stats_tags: list[PlayerStatsTag]) -> None:
-    for tag in player_stats_tags:
-        # 1. Add the tag to correct players "shooter_tags"
-        if tag.shooter:
-            players_to_analyze[tag.shooter.id]["shooter_tags"].append(tag)
-
-        # 2. Add the tag to "on_ice_tags" for all players on ice for the chance
-        for on_ice_tag in tag.players_on_ice:
-            players_to_analyze[on_ice_tag.player_id]["on_ice_tags"].append(tag)
-
-
-def get_players_to_analyze(game_ids_str: str | None, team: Team, db_session: Session) -> defaultdict[int, PlayerStats]:
-    selected_games = get_selected_games(game_ids_str, team, db_session)
-    player_stats_tags = get_PSTs_for_games(selected_games, db_session)
-    players_to_analyze = build_players_to_analyze_dict(selected_games)
+    player_stats_tags = get_team_tag_frame(team.id, db_session).for_games(game_ids)
+    players_to_analyze = build_players_to_analyze_dict(selected_games, player_stats_tags.empty())
     add_players_tags(players_to_analyze, player_stats_tags)  # edits palyers_to_analyze in place
 
     return players_to_analyze
@@ -1,3 +1,5 @@
+from io import BytesIO
+
 from fastapi import Depends, APIRouter, Response
 from openpyxl import load_workbook
 from sqlalchemy.orm import Session
@@ -8,25 +10,37 @@ from utils import get_current_user_and_team
 
 from routes.excel.player_stats.workbook_writer import build_player_stats_workbook, write_player_sheets
 from routes.excel.excel_utils import workbook_to_bytesio
+from routes.excel.export_pool import run_export
+from routes.excel.export_cache import get_cached_export
+from routes.excel.export_progress import ExportStage, report_stage
 from routes.excel.player_stats.stat_collectors import add_player_stats
 from routes.excel.player_stats.players_to_analyze import get_players_to_analyze
+from routes.excel.stats_utils import get_selected_games
 
 router = APIRouter()
 
 
-@router.get("/player-stats")
-async def get_player_scoring_excel(game_ids: str | None = None, db_session: Session = Depends(get_db_session), user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+def build_player_stats_export(game_ids: str | None, team: Team, db_session: Session) -> BytesIO:
     # 1. Get a data structure containing all the players for the seleceted games
-    _, team = user_and_team
-    players_to_analyze = get_players_to_analyze(game_ids, team, db_session)
+    selected_games = get_selected_games(game_ids, team, db_session)
+    players_to_analyze = get_players_to_analyze(selected_games, team, db_session)
 
     # 2. Edit players_to_analyze in place to record their stats for the selected games
-    add_player_stats(players_to_analyze)
+    report_stage(ExportStage.AGGREGATING)
+    add_player_stats(players_to_analyze, selected_games)
 
     # 3. Builds the full player stats workbook, and returns it as BytesIO object.
     output = build_player_stats_workbook(players_to_analyze)
 
+    return output
+
+
+@router.get("/player-stats")
+async def get_player_scoring_excel(game_ids: str | None = None, db_session: Session = Depends(get_db_session), user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+    _, team = user_and_team
+    content = await run_export(get_cached_export, "player-stats", build_player_stats_export, game_ids, team, db_session)
+
     # 4. Send the output (excel file) as a response
     return Response(
-        content=output.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=pelaajayhteenveto.xlsx"}
+        content=content, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=pelaajayhteenveto.xlsx"}
     )
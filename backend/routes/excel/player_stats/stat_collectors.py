@@ -1,28 +1,29 @@
 from collections import defaultdict
-from routes.excel.stats_utils import MAP_RESULT_MAPPING, STATS_CELL_VALUES, STATS_MAP_COORDINATES, STATS_ON_ICE_STATS, STATS_PER_GAME_STATS, STATS_SHOOTER_TAGS, MapCategories, ResultMap
-from db.models import PlayerStatsTag, ShotResultTypes, ShotTypeTypes
+import numpy as np
+from routes.excel.stats_utils import STATS_CELL_VALUES, STATS_MAP_COORDINATES, STATS_ON_ICE_STATS, STATS_PER_GAME_STATS, STATS_SHOOTER_TAGS, collect_mapped_data
+from db.models import Game, ShotResultTypes, ShotTypeTypes
+from db.tag_frame import AREA_CODES, MISSING, RESULT_CODES, RESULT_TO_CODE, TYPE_CODES, TagFrame
 from routes.excel.player_stats.player_stats_utils import ZONE_COLUMN_MAPPING, PlayerStats
-from routes.excel.excel_utils import get_outcome_cell_adjustment
+from routes.excel.excel_utils import column_ords_for, count_cells, get_outcome_cell_adjustments, log_left_out_tags
 
+GOAL_FOR_CODE = RESULT_TO_CODE[ShotResultTypes.GOAL_FOR]
+GOAL_CODES = [RESULT_TO_CODE[ShotResultTypes.GOAL_FOR], RESULT_TO_CODE[ShotResultTypes.GOAL_AGAINST]]
 
-def collect_shooter_zones(player_stats_tags: list[PlayerStatsTag]) -> dict:
+
+def collect_shooter_zones(player_stats_tags: TagFrame) -> dict:
     BASE_ROW = 4
 
-    zone_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        cell_col = ZONE_COLUMN_MAPPING[tag.shot_area.value]
-        cell = f"{cell_col}{BASE_ROW}"
-        zone_cell_stats_dict[cell] += 1
+    cell_cols = column_ords_for(AREA_CODES, ZONE_COLUMN_MAPPING)[player_stats_tags.area]
+    cell_rows = np.full(len(player_stats_tags), BASE_ROW)
 
-        # If its a goal
-        if tag.shot_result.value == ShotResultTypes.GOAL_FOR:
-            cell_col = chr(ord(ZONE_COLUMN_MAPPING[tag.shot_area.value]) + 1)
-            zone_cell_stats_dict[f"{cell_col}{BASE_ROW}"] += 1
+    # If its a goal, also increment the cell right of it
+    goals = player_stats_tags.result == GOAL_FOR_CODE
+    zone_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals] + 1]), np.concatenate([cell_rows, cell_rows[goals]]))
 
     return zone_cell_stats_dict
 
 
-def collect_shooter_shot_types(player_stats_tags: list[PlayerStatsTag]) -> dict:
+def collect_shooter_shot_types(player_stats_tags: TagFrame) -> dict:
     TYPE_COLUMN_MAPPING = {
         ShotTypeTypes.CARRY_SHOT: "B",
         ShotTypeTypes.CAN_SHOT: "D",
@@ -36,21 +37,21 @@ def collect_shooter_shot_types(player_stats_tags: list[PlayerStatsTag]) -> dict:
 
     BASE_ROW = 11
 
-    type_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        cell_col = TYPE_COLUMN_MAPPING[tag.shot_type.value]
-        cell = f"{cell_col}{BASE_ROW}"
-        type_cell_stats_dict[cell] += 1
+    # Tags without a shot type have no cell to go to
+    type_cols = column_ords_for(TYPE_CODES, TYPE_COLUMN_MAPPING)[player_stats_tags.shot_type]
+    has_type = type_cols != MISSING
+    log_left_out_tags(player_stats_tags, has_type, "without a shot type")
+    cell_cols = type_cols[has_type]
+    cell_rows = np.full(len(cell_cols), BASE_ROW)
 
-        # If its a goal
-        if tag.shot_result.value == ShotResultTypes.GOAL_FOR:
-            cell_col = chr(ord(TYPE_COLUMN_MAPPING[tag.shot_type.value]) + 1)
-            type_cell_stats_dict[f"{cell_col}{BASE_ROW}"] += 1
+    # If its a goal, also increment the cell right of it
+    goals = player_stats_tags.result[has_type] == GOAL_FOR_CODE
+    type_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals] + 1]), np.concatenate([cell_rows, cell_rows[goals]]))
 
     return type_cell_stats_dict
 
 
-def collect_shooter_net_zones(player_stats_tags: list[PlayerStatsTag]) -> dict:
+def collect_shooter_net_zones(player_stats_tags: TagFrame) -> dict:
     WIDTH_COLUMN_MAPPING = {
         "Left": "G",
         "Mid": "H",
@@ -65,21 +66,21 @@ def collect_shooter_net_zones(player_stats_tags: list[PlayerStatsTag]) -> dict:
 
     BASE_ROW = 17
 
-    netzone_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        cell_col = WIDTH_COLUMN_MAPPING[tag.net_width]
-        cell_row = BASE_ROW + HEIGHT_ROW_MAPPING[tag.net_height]
-        cell = f"{cell_col}{cell_row}"
-        netzone_cell_stats_dict[cell] += 1
+    width_cols = column_ords_for(player_stats_tags.net_width_values, WIDTH_COLUMN_MAPPING)[player_stats_tags.net_width]
+    height_rows = np.array([HEIGHT_ROW_MAPPING.get(height, MISSING) for height in player_stats_tags.net_height_values] + [MISSING])[player_stats_tags.net_height]
+    in_net = (width_cols != MISSING) & (height_rows != MISSING)
+    log_left_out_tags(player_stats_tags, in_net, "with an unknown net zone")
+    cell_cols = width_cols[in_net]
+    cell_rows = BASE_ROW + height_rows[in_net]
 
-        if tag.shot_result.value == ShotResultTypes.GOAL_FOR:
-            goal_col = chr(ord(cell_col) - 5)
-            netzone_cell_stats_dict[f"{goal_col}{cell_row}"] += 1
+    # Goals are also written 5 columns to the left
+    goals = player_stats_tags.result[in_net] == GOAL_FOR_CODE
+    netzone_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals] - 5]), np.concatenate([cell_rows, cell_rows[goals]]))
 
     return netzone_cell_stats_dict
 
 
-def collect_shooter_strengths(player_stats_tags: list[PlayerStatsTag]) -> dict:
+def collect_shooter_strengths(player_stats_tags: TagFrame) -> dict:
     STRENGTHS_COLUMN_MAPPING = {
         "ES": "B",
         "PP": "C",
@@ -89,38 +90,21 @@ def collect_shooter_strengths(player_stats_tags: list[PlayerStatsTag]) -> dict:
     }
 
     BASE_ROW = 31
-    strengths_cell_stats_dict = defaultdict(int)
-    for tag in player_stats_tags:
-        cell_col = STRENGTHS_COLUMN_MAPPING[tag.strengths]
-        cell = f"{cell_col}{BASE_ROW}"
-        strengths_cell_stats_dict[cell] += 1
-
-        # If its a goal, also increment the corresponding chance
-        if tag.shot_result.value == ShotResultTypes.GOAL_FOR:
-            strengths_cell_stats_dict[f"{cell_col}{BASE_ROW + 1}"] += 1
-
-    return strengths_cell_stats_dict
 
+    strength_cols = column_ords_for(player_stats_tags.strength_values, STRENGTHS_COLUMN_MAPPING)[player_stats_tags.strength]
+    known_strength = strength_cols != MISSING
+    log_left_out_tags(player_stats_tags, known_strength, "with unknown strengths")
+    cell_cols = strength_cols[known_strength]
+    cell_rows = np.full(len(cell_cols), BASE_ROW)
 
-def find_players_on_ice_tags(player_stats_tags: list[PlayerStatsTag]) -> dict[int, list[PlayerStatsTag]]:
-    """
-    Aggregates a dictionary mapping each player ID to a list of PlayerStatsTag objects in which the player was on ice.
-    Args:
-        player_stats_tags (list[PlayerStatsTag]): A list of PlayerStatsTag objects, each containing information about players on ice.
-    Returns:
-        dict: A dictionary mapping each player ID to a list of PlayerStatsTag objects in which the player was on ice.
-    """
+    # If its a goal, also increment the corresponding chance
+    goals = player_stats_tags.result[known_strength] == GOAL_FOR_CODE
+    strengths_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[goals]]), np.concatenate([cell_rows, cell_rows[goals] + 1]))
 
-    tags_for_each_player = defaultdict(list)
-
-    for tag in player_stats_tags:
-        for on_ice_tag in tag.players_on_ice:
-            tags_for_each_player[on_ice_tag.player_id].append(tag)
-
-    return tags_for_each_player
+    return strengths_cell_stats_dict
 
 
-def collect_shooter_total_strengths(players_on_ice_tags: list[PlayerStatsTag], player_id: int) -> dict:
+def collect_shooter_total_strengths(players_on_ice_tags: TagFrame, player_id: int) -> dict:
     STRENGTHS_COLUMN_MAPPING = {
         "ES": "B",
         "PP": "E",
@@ -129,107 +113,87 @@ def collect_shooter_total_strengths(players_on_ice_tags: list[PlayerStatsTag], p
         "EN-": "N",
     }
 
-    strengths_cell_stats_dict = defaultdict(int)
-    for tag in players_on_ice_tags:
-        participating_player_ids = [participating_tag.player_id for participating_tag in tag.players_participating]
-
-        if player_id in participating_player_ids:
-            base_rows = [38, 46]
-        else:
-            base_rows = [46]
+    column_adjustment, row_adjustment = get_outcome_cell_adjustments(players_on_ice_tags)
+    strength_cols = column_ords_for(players_on_ice_tags.strength_values, STRENGTHS_COLUMN_MAPPING)[players_on_ice_tags.strength]
+    known_strength = strength_cols != MISSING
+    log_left_out_tags(players_on_ice_tags, known_strength, "with unknown strengths")
+    goals = np.isin(players_on_ice_tags.result, GOAL_CODES)
 
-        adjustment = get_outcome_cell_adjustment(tag)
-        for row in base_rows:
-            cell_col = chr(ord(STRENGTHS_COLUMN_MAPPING[tag.strengths]) + adjustment["column"])
-            cell_row = row + adjustment["row"]
-            cell = f"{cell_col}{cell_row}"
-            strengths_cell_stats_dict[cell] += 1
+    # Every tag goes to the on ice block (row 46), tags the player participated in also to the participating block (row 38)
+    participating = players_on_ice_tags.has_participant(player_id) & known_strength
+    on_ice = known_strength
+    cell_cols = np.concatenate([strength_cols[participating] + column_adjustment[participating], strength_cols[on_ice] + column_adjustment[on_ice]])
+    cell_rows = np.concatenate([38 + row_adjustment[participating], 46 + row_adjustment[on_ice]])
+    cell_goals = np.concatenate([goals[participating], goals[on_ice]])
 
-            # If its a goal, also increment the corresponding chance
-            if tag.shot_result.value in [ShotResultTypes.GOAL_FOR, ShotResultTypes.GOAL_AGAINST]:
-                strengths_cell_stats_dict[f"{cell_col}{cell_row - 1}"] += 1
+    # If its a goal, also increment the corresponding chance
+    strengths_cell_stats_dict = count_cells(np.concatenate([cell_cols, cell_cols[cell_goals]]), np.concatenate([cell_rows, cell_rows[cell_goals] - 1]))
 
     return strengths_cell_stats_dict
 
 
-def collect_players_per_game_stats(players_stats_tags: list[PlayerStatsTag], player_id: int) -> list[dict]:
+def collect_players_per_game_stats(players_stats_tags: TagFrame, player_id: int, games_by_id: dict[int, Game]) -> list[dict]:
     game_cell_values = {}
-    for tag in players_stats_tags:
-        if tag.strengths == "ES":
+    participated = players_stats_tags.has_participant(player_id).tolist()
+    rows = zip(
+        players_stats_tags.game_id.tolist(),
+        [players_stats_tags.strength_values[code] for code in players_stats_tags.strength.tolist()],
+        [RESULT_CODES[code] for code in players_stats_tags.result.tolist()],
+        players_stats_tags.shooter_id.tolist(),
+        participated,
+    )
+    for game_id, strengths, result, shooter_id, is_participating in rows:
+        if strengths == "ES":
             chance_col_ord = 71
-        elif tag.strengths == "PP":
+        elif strengths == "PP":
             chance_col_ord = 84
-        elif tag.strengths == "PK":
+        elif strengths == "PK":
             chance_col_ord = 97
-        elif tag.strengths in ["EN+", "EN-"]:
+        elif strengths in ["EN+", "EN-"]:
             continue
         else:
-            raise ValueError(f"Unknown strengths value: {tag.strengths}")
+            raise ValueError(f"Unknown strengths value: {strengths}")
 
-        if tag.game_id not in game_cell_values:
-            game_cell_values[tag.game_id] = {}
-            game_cell_values[tag.game_id]["date"] = tag.game.date
-            game_cell_values[tag.game_id]["A"] = f"{tag.game.date} vs {tag.game.opponent}"
+        if game_id not in game_cell_values:
+            game_cell_values[game_id] = {}
+            game = games_by_id[game_id]
+            game_cell_values[game_id]["date"] = game.date
+            game_cell_values[game_id]["A"] = f"{game.date} vs {game.opponent}"
             for col in ["C", "D", "G", "H", "J", "K", "M", "N", "P", "Q", "T", "U", "W", "X", "Z", "AA", "AC", "AD", "AG", "AH", "AJ", "AK", "AM", "AN", "AP", "AQ"]:
-                game_cell_values[tag.game_id][col] = 0
+                game_cell_values[game_id][col] = 0
 
-        if tag.shooter_id == player_id:
-            game_cell_values[tag.game_id]["D"] += 1
-            if tag.shot_result.value == ShotResultTypes.GOAL_FOR:
-                game_cell_values[tag.game_id]["C"] += 1
+        if shooter_id == player_id:
+            game_cell_values[game_id]["D"] += 1
+            if result == ShotResultTypes.GOAL_FOR:
+                game_cell_values[game_id]["C"] += 1
 
-        if tag.shot_result.value == ShotResultTypes.GOAL_AGAINST:
+        if result == ShotResultTypes.GOAL_AGAINST:
             chance_col_ord += 1
-        elif tag.shot_result.value == ShotResultTypes.CHANCE_FOR:
+        elif result == ShotResultTypes.CHANCE_FOR:
             chance_col_ord += 3
-        elif tag.shot_result.value == ShotResultTypes.CHANCE_AGAINST:
+        elif result == ShotResultTypes.CHANCE_AGAINST:
             chance_col_ord += 4
 
         if chance_col_ord > 90:
             chance_col = f"A{chr(chance_col_ord-26)}"
         else:
             chance_col = chr(chance_col_ord)
-        game_cell_values[tag.game_id][chance_col] += 1
+        game_cell_values[game_id][chance_col] += 1
 
-        participating_player_ids = [participating_tag.player_id for participating_tag in tag.players_participating]
-        if player_id in participating_player_ids:
+        if is_participating:
             participating_col_ord = chance_col_ord + 6
             if participating_col_ord > 90:
                 participating_col = f"A{chr(participating_col_ord-26)}"
             else:
                 participating_col = chr(participating_col_ord)
-            game_cell_values[tag.game_id][participating_col] += 1
+            game_cell_values[game_id][participating_col] += 1
 
     sorted_games = sorted(game_cell_values.values(), key=lambda d: d["date"], reverse=True)
     return sorted_games
 
 
-def collect_mapped_data(scoring_chances: list[PlayerStatsTag]) -> ResultMap:
-    """
-    Collects and maps scoring chance data into a structured format.
-
-    Args:
-        scoring_chances (list[PlayerStatsTag]): List of scoring chances to process.
-
-    Returns:
-        ResultMap: Dictionary mapping shot results to categories with ice and net coordinates.
-            So data[ShotResultTypes][MapCategories] is a list of (int, int)
-                    What outcome?    Net or ice image?   List of coordinates to draw.
-    """
-
-    data: ResultMap = {result: defaultdict(list) for result in ShotResultTypes}
-    for chance in scoring_chances:
-        ice = (chance.ice_x, chance.ice_y)
-        net = (chance.net_x, chance.net_y)
-
-        for result in MAP_RESULT_MAPPING[chance.shot_result.value]:
-            data[result][MapCategories.ICE].append(ice)
-            data[result][MapCategories.NET].append(net)
-
-    return data
-
-
-def add_player_stats(players_to_analyze: defaultdict[int, PlayerStats]) -> None:
+def add_player_stats(players_to_analyze: defaultdict[int, PlayerStats], selected_games: list[Game]) -> None:
+    games_by_id = {game.id: game for game in selected_games}
     for player_id, player_data in players_to_analyze.items():
         # 1. Build and add cell values to write to sheet
         zones = collect_shooter_zones(player_data[STATS_SHOOTER_TAGS])
@@ -242,7 +206,7 @@ def add_player_stats(players_to_analyze: defaultdict[int, PlayerStats]) -> None:
         players_to_analyze[player_id][STATS_CELL_VALUES] = player_cell_values
 
         # 2. Build and add per game stats
-        per_games_stats = collect_players_per_game_stats(player_data[STATS_ON_ICE_STATS], player_id)
+        per_games_stats = collect_players_per_game_stats(player_data[STATS_ON_ICE_STATS], player_id, games_by_id)
         players_to_analyze[player_id][STATS_PER_GAME_STATS] = per_games_stats
 
         # 3. Find the map image stats:
@@ -1,24 +1,40 @@
 from collections import defaultdict
 from io import BytesIO
-import tempfile
+from typing import Any
 from openpyxl import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.drawing.image import Image as EXCLImage
-from openpyxl import load_workbook
-from PIL import Image
 
 from routes.excel.excel_utils import workbook_to_bytesio
 from routes.excel.stats_utils import STATS_CELL_VALUES, STATS_MAP_COORDINATES, STATS_PER_GAME_STATS
 from routes.excel.player_stats.player_stats_utils import PlayerStats
-from routes.excel.image_utils import get_map_images, scale_image
+from routes.excel.render_pool import render_map_image_sets
+from routes.excel.export_progress import ExportStage, report_stage
+from routes.excel.template_cache import load_template
+from routes.excel.streaming_workbook import STREAMING_EXPORTS, StreamingWorkbook, get_sheet_layout
+
+PLAYER_STATS_TEMPLATE = "excels/players_summary_template.xlsx"
+
+# The player sheets only show the maps of the player's own shots
+PLAYER_STATS_MAP_IMAGES = ("net_for", "ice_for")
+PLAYER_STATS_IMAGE_CELLS = {
+    "net_for": "S19",
+    "ice_for": "S31",
+}
+
+FIRST_GAME_STATS_ROW = 54
 
 
 def sort_players_by_last_name(unsroted_players: defaultdict[int, PlayerStats]) -> dict[int, PlayerStats]:
     return dict(sorted(unsroted_players.items(), key=lambda item: item[1]["last_name"]))
 
 
+def player_sheet_title(player_data: PlayerStats) -> str:
+    return f"{player_data["last_name"].upper()} {player_data["first_name"]}"
+
+
 def write_name_to_sheet(player_data: PlayerStats, sheet: Worksheet) -> None:
-    sheet.title = f"{player_data["last_name"].upper()} {player_data["first_name"]}"
+    sheet.title = player_sheet_title(player_data)
 
 
 def write_data_to_cells(player_data: PlayerStats, sheet: Worksheet) -> None:
@@ -26,75 +42,95 @@ def write_data_to_cells(player_data: PlayerStats, sheet: Worksheet) -> None:
         sheet[cell] = value
 
 
-def write_game_summaries_to_sheet(player_data: PlayerStats, sheet: Worksheet):
-    FIRST_GAME_STAST_ROW = 54
-
+def game_summary_cells(player_data: PlayerStats) -> dict[str, Any]:
+    cell_values = {}
     for i, game in enumerate(player_data[STATS_PER_GAME_STATS]):
-        row = FIRST_GAME_STAST_ROW + i
+        row = FIRST_GAME_STATS_ROW + i
         for col, value in game.items():
             if col == "date":
                 continue
-            cell = f"{col}{row}"
-            sheet[cell] = value
+            cell_values[f"{col}{row}"] = value
+    return cell_values
+
+
+def write_game_summaries_to_sheet(player_data: PlayerStats, sheet: Worksheet):
+    for cell, value in game_summary_cells(player_data).items():
+        sheet[cell] = value
 
 
-def add_images_to_sheet(map_images: dict[str, Image.Image], sheet: Worksheet):
+def add_images_to_sheet(map_images: dict[str, bytes], sheet: Worksheet):
     """
-    Adds scaled images to a worksheet at predefined cell positions based on a configuration dictionary.
-    This function processes a dictionary of PIL Image objects, scales each image according to the
-    specified scale factor, saves them temporarily as PNG files, and inserts them into the worksheet
-    at the designated cell locations. The configuration is hardcoded for specific image names.
+    Adds images to a worksheet at predefined cell positions based on a configuration dictionary.
+    This function processes a dictionary of PNG images, already rendered at their size in the
+    workbook, and inserts them into the worksheet from memory at the designated cell locations.
+    The configuration is hardcoded for specific image names.
     Parameters:
     - sheet (Worksheet): The openpyxl worksheet object where the images will be added.
-    - map_images (dict[str, Image.Image]): A dictionary mapping image names (e.g., "net_for", "ice_for")
-      to PIL Image objects that will be added to the sheet.
+    - map_images (dict[str, bytes]): A dictionary mapping image names (e.g., "net_for", "ice_for")
+      to the PNG data of the images that will be added to the sheet.
     The image configuration includes:
-    - "net_for": Scaled to 0.81 and placed at cell "T20".
-    - "ice_for": Scaled to 0.73 and placed at cell "T34".
-    - "net_vs": Scaled to 0.81 and placed at cell "Y20".
-    - "ice_vs": Scaled to 0.73 and placed at cell "Y34".
-    Note: Temporary PNG files are created and not automatically deleted (delete=False in NamedTemporaryFile).
-    Ensure proper cleanup to avoid accumulating temporary files.
+    - "net_for": Placed at cell "T20".
+    - "ice_for": Placed at cell "T34".
+    - "net_vs": Placed at cell "Y20".
+    - "ice_vs": Placed at cell "Y34".
     """
 
-    image_config = {
-        "net_for": {"scale": 0.81, "cell": "S19"},
-        "ice_for": {"scale": 0.73, "cell": "S31"},
-    }
-
-    for img_name, config in image_config.items():
-        img = map_images[img_name]
-        scaled_img = scale_image(img, config["scale"])
+    for img_name, cell in PLAYER_STATS_IMAGE_CELLS.items():
+        # A buffer of its own per image, openpyxl closes it after writing the image into the workbook
+        excl_img = EXCLImage(BytesIO(map_images[img_name]))
 
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_img:
-            scaled_img.save(tmp_img.name)
-            excl_img = EXCLImage(tmp_img.name)
+        sheet.add_image(excl_img, cell)
 
-        sheet.add_image(excl_img, config["cell"])
 
-
-def write_players_sheet(sheet: Worksheet, player_data: PlayerStats):
+def write_players_sheet(sheet: Worksheet, player_data: PlayerStats, map_images: dict[str, bytes]):
 
     write_name_to_sheet(player_data, sheet)
     write_data_to_cells(player_data, sheet)
     write_game_summaries_to_sheet(player_data, sheet)
-    map_images = get_map_images(player_data[STATS_MAP_COORDINATES])
     add_images_to_sheet(map_images, sheet)
 
 
+def render_player_map_images(sorted_players: dict[int, PlayerStats]) -> list[dict[str, bytes]]:
+    # Render the map images of all the players at once, the sheets are written after them
+    report_stage(ExportStage.RENDERING_IMAGES)
+    per_player_map_images = render_map_image_sets([player_data[STATS_MAP_COORDINATES] for player_data in sorted_players.values()], PLAYER_STATS_MAP_IMAGES)
+    report_stage(ExportStage.WRITING)
+    return per_player_map_images
+
+
 def write_player_sheets(workbook: Workbook, players_to_analyze: defaultdict[int, PlayerStats]) -> None:
 
     template_sheet = workbook.worksheets[0]
     sorted_players = sort_players_by_last_name(players_to_analyze)
+    per_player_map_images = render_player_map_images(sorted_players)
 
-    for _, player_data in sorted_players.items():
+    for player_data, map_images in zip(sorted_players.values(), per_player_map_images):
         player_sheet = workbook.copy_worksheet(template_sheet)
-        write_players_sheet(player_sheet, player_data)
+        write_players_sheet(player_sheet, player_data, map_images)
 
     # Delete template sheet
     workbook.remove(workbook.worksheets[0])
 
 
+def stream_player_stats_workbook(players_to_analyze: defaultdict[int, PlayerStats]) -> BytesIO:
+    """
+    Writes the player stats workbook with xlsxwriter, streaming the player sheets out one at a time on the template sheet's layout.
+    Produces the same workbook as filling copies of the template sheet with openpyxl.
+    """
+
+    layout = get_sheet_layout(PLAYER_STATS_TEMPLATE, 0)
+    sorted_players = sort_players_by_last_name(players_to_analyze)
+    per_player_map_images = render_player_map_images(sorted_players)
+
+    workbook = StreamingWorkbook()
+    for player_data, map_images in zip(sorted_players.values(), per_player_map_images):
+        cell_values = {**player_data[STATS_CELL_VALUES], **game_summary_cells(player_data)}
+        images = {cell: map_images[img_name] for img_name, cell in PLAYER_STATS_IMAGE_CELLS.items()}
+        workbook.add_sheet(layout, cell_values, images, title=player_sheet_title(player_data))
+
+    return workbook.close()
+
+
 def build_player_stats_workbook(players_to_analyze: defaultdict[int, PlayerStats]) -> BytesIO:
     """
     Builds an Excel workbook with player statistics.
@@ -106,8 +142,11 @@ def build_player_stats_workbook(players_to_analyze: defaultdict[int, PlayerStats
         BytesIO: The generated Excel workbook as a BytesIO object.
     """
 
+    if STREAMING_EXPORTS:
+        return stream_player_stats_workbook(players_to_analyze)
+
     # 1. Create the excel file
-    workbook = load_workbook("excels/players_summary_template.xlsx")
+    workbook = load_template(PLAYER_STATS_TEMPLATE)
 
     # 2. Create + write a sheet with stats for each player
     write_player_sheets(workbook, players_to_analyze)
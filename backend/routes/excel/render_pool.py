@@ -0,0 +1,88 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from routes.excel.image_utils import MapImageJob, get_map_image_jobs, render_map_image_job
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for rendering map images, 0 or 1 renders in the request's own process
+MAP_RENDER_WORKERS = int(os.getenv("MAP_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+# Fewer distinct images than this are rendered in process, the pool round trip would cost more
+MIN_JOBS_FOR_POOL = 8
+
+_render_pool: ProcessPoolExecutor | None = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> ProcessPoolExecutor | None:
+    """Returns the process-wide rendering pool, created on first use. None if rendering in process."""
+    global _render_pool
+    if MAP_RENDER_WORKERS <= 1:
+        return None
+
+    with _render_pool_lock:
+        if _render_pool is None:
+            # Spawned, not forked: the server process has threads and open db connections
+            _render_pool = ProcessPoolExecutor(max_workers=MAP_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _render_pool
+
+
+def shutdown_render_pool() -> None:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(cancel_futures=True)
+            _render_pool = None
+
+
+def _discard_broken_pool(pool: ProcessPoolExecutor) -> None:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_map_images(jobs: list[MapImageJob]) -> list[bytes]:
+    """
+    Renders map image jobs to PNG data, identical jobs only once.
+    Distinct jobs are spread over the rendering pool's worker processes.
+    Args:
+        jobs (list[MapImageJob]): Jobs from get_map_image_jobs.
+    Returns:
+        list[bytes]: The PNG data of each job, in the order of the jobs.
+    """
+
+    unique_jobs = list(dict.fromkeys(jobs))
+    pool = get_render_pool() if len(unique_jobs) >= MIN_JOBS_FOR_POOL else None
+
+    rendered = None
+    if pool is not None:
+        try:
+            chunksize = max(1, len(unique_jobs) // (MAP_RENDER_WORKERS * 4))
+            rendered = list(pool.map(render_map_image_job, unique_jobs, chunksize=chunksize))
+        except BrokenProcessPool as e:
+            logger.warning(f"⚠️ Map rendering pool broke, rendering in process: {e}")
+            _discard_broken_pool(pool)
+
+    if rendered is None:
+        rendered = [render_map_image_job(job) for job in unique_jobs]
+
+    rendered_by_job = dict(zip(unique_jobs, rendered))
+    return [rendered_by_job[job] for job in jobs]
+
+
+def render_map_image_sets(coordinate_sets: list[dict], names: tuple[str, ...]) -> list[dict[str, bytes]]:
+    """
+    Renders the named map images for every set of coordinates (e.g. every sheet of a workbook) in one batch.
+    Returns:
+        list[dict[str, bytes]]: Image name -> PNG data, one dict per set of coordinates.
+    """
+
+    jobs_per_set = [get_map_image_jobs(coords, names) for coords in coordinate_sets]
+    rendered = iter(render_map_images([job for jobs in jobs_per_set for job in jobs.values()]))
+    return [{name: next(rendered) for name in jobs} for jobs in jobs_per_set]
@@ -0,0 +1,126 @@
+import zipfile
+from io import BytesIO
+from typing import NamedTuple
+
+from fastapi import Depends, APIRouter, Response
+from sqlalchemy.orm import Session, selectinload
+
+from db.db_manager import get_db_session
+from db.models import Game, GameInRoster, Team, TeamStatsTag, User
+from db.tag_frame import TagFrame, get_team_tag_frame
+from utils import get_current_user_and_team
+
+from routes.excel.export_cache import get_cached_export, parse_game_ids
+from routes.excel.export_pool import run_export
+from routes.excel.export_progress import ExportStage, report_stage
+from routes.excel.exports import EXCEL_EXPORTS
+from routes.excel.game_stats.get_stats import build_per_game_stats, build_total_stats
+from routes.excel.game_stats.workbook_writers import build_game_stats_workbook
+from routes.excel.player_plus_minus.get_stats import add_tags_to_players
+from routes.excel.player_plus_minus.plus_minus_utils import PlusMinusPlayer
+from routes.excel.player_plus_minus.workbook_writer import build_workbook
+from routes.excel.player_stats.players_to_analyze import add_players_tags, build_players_to_analyze_dict
+from routes.excel.player_stats.stat_collectors import add_player_stats
+from routes.excel.player_stats.workbook_writer import build_player_stats_workbook
+from routes.excel.team_stats.get_stats import get_games_stats_dict, get_team_stats_tags
+from routes.excel.team_stats.workbook_writer import build_team_stats_workbook
+
+router = APIRouter()
+
+
+class SeasonSelection(NamedTuple):
+    games: list[Game]  # With their roster entries and players loaded
+    player_stats_tags: TagFrame  # The player stats tags of the games
+    team_stats_tags: list[TeamStatsTag]
+
+
+def load_season_selection(game_ids: str | None, team: Team, db_session: Session) -> SeasonSelection:
+    """
+    Loads everything the four exports read from the db for the selected games, once for all of them.
+    Args:
+        game_ids (str | None): Comma-separated ids of the selected games, None for all the team's games.
+        team (Team): The user's team.
+        db_session (Session): Database session.
+    Returns:
+        SeasonSelection: The games in the same order as get_selected_games returns them, and their tags.
+    """
+
+    db_query = db_session.query(Game).options(selectinload(Game.in_rosters).selectinload(GameInRoster.player)).filter(Game.team_id == team.id)
+    selected_ids = parse_game_ids(game_ids)
+    if selected_ids is not None:
+        db_query = db_query.filter(Game.id.in_(selected_ids))
+    games = db_query.all()
+
+    player_stats_tags = get_team_tag_frame(team.id, db_session).for_games([game.id for game in games])
+    team_stats_tags = get_team_stats_tags(games, db_session)
+
+    return SeasonSelection(games, player_stats_tags, team_stats_tags)
+
+
+def build_game_stats_from_selection(selection: SeasonSelection) -> BytesIO:
+    per_game_stats = build_per_game_stats(selection.player_stats_tags, selection.games)
+    total_stats = build_total_stats(selection.player_stats_tags)
+    return build_game_stats_workbook(total_stats, per_game_stats)
+
+
+def build_team_stats_from_selection(selection: SeasonSelection) -> BytesIO:
+    games_stats_dict = get_games_stats_dict(selection.team_stats_tags)
+    return build_team_stats_workbook(selection.team_stats_tags, games_stats_dict)
+
+
+def build_player_stats_from_selection(selection: SeasonSelection) -> BytesIO:
+    players_to_analyze = build_players_to_analyze_dict(selection.games, selection.player_stats_tags.empty())
+    add_players_tags(players_to_analyze, selection.player_stats_tags)
+    add_player_stats(players_to_analyze, selection.games)
+    return build_player_stats_workbook(players_to_analyze)
+
+
+def build_plusminus_from_selection(selection: SeasonSelection, team: Team) -> BytesIO:
+    # The team's players in the rosters of the games, like get_players_in_games
+    players: dict[int, PlusMinusPlayer] = {}
+    for game in selection.games:
+        for roster_entry in game.in_rosters:
+            player = roster_entry.player
+            if player.team_id == team.id and player.id not in players:
+                players[player.id] = PlusMinusPlayer(player)
+
+    add_tags_to_players(players, selection.player_stats_tags)
+    return build_workbook(players, selection.games)
+
+
+def build_season_pack(game_ids: str | None, team: Team, db_session: Session) -> BytesIO:
+    """
+    Builds all four Excel exports of the selected games from a single load of their data, zipped together.
+    Returns:
+        BytesIO: The zip file of the game stats, team stats, player stats and plus/minus workbooks.
+    """
+
+    # 1. Load the games, rosters and tags once for all the workbooks
+    selection = load_season_selection(game_ids, team, db_session)
+    report_stage(ExportStage.AGGREGATING)
+
+    # 2. Build the workbooks from the shared data
+    workbooks = {
+        "game-stats": build_game_stats_from_selection(selection),
+        "teamstats": build_team_stats_from_selection(selection),
+        "player-stats": build_player_stats_from_selection(selection),
+        "plusminus": build_plusminus_from_selection(selection, team),
+    }
+
+    # 3. Zip the workbooks. They are zip files already, so they are stored without compressing them again.
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as pack:
+        for export, workbook in workbooks.items():
+            pack.writestr(EXCEL_EXPORTS[export].filename, workbook.getvalue())
+    output.seek(0)
+
+    return output
+
+
+@router.get("/season-pack")
+async def get_season_pack(game_ids: str | None = None, db_session: Session = Depends(get_db_session), user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+    """All four Excel exports of the selected games (all games by default) in one zip file."""
+    _, team = user_and_team
+    content = await run_export(get_cached_export, "season-pack", build_season_pack, game_ids, team, db_session)
+
+    return Response(content=content, media_type="application/zip", headers={"Content-Disposition": "attachment; filename=kausipaketti.zip"})
@@ -1,7 +1,9 @@
 from enum import Enum
 from typing import TypeAlias
 from collections import defaultdict
+import numpy as np
 from db.models import ShotResultTypes, Team, Game
+from db.tag_frame import RESULT_TO_CODE, TagFrame
 from sqlalchemy.orm import Session
 
 
@@ -20,6 +22,12 @@ MAP_RESULT_MAPPING: dict[ShotResultTypes, list[ShotResultTypes]] = {
     ShotResultTypes.GOAL_AGAINST: [ShotResultTypes.CHANCE_AGAINST, ShotResultTypes.GOAL_AGAINST],
 }
 
+# Result codes drawn on the map of each result, e.g. GOAL_FOR tags are drawn on both the CHANCE_FOR and the GOAL_FOR map
+MAP_SOURCE_CODES: dict[ShotResultTypes, list[int]] = {
+    result: [RESULT_TO_CODE[source] for source, targets in MAP_RESULT_MAPPING.items() if result in targets]
+    for result in ShotResultTypes
+}
+
 STATS_CELL_VALUES = "cell_values"
 STATS_MAP_COORDINATES = "coordinates"
 STATS_PER_GAME_STATS = "per_game_stats"
@@ -51,3 +59,29 @@ def get_selected_games(game_ids_str: str | None, team: Team, db: Session) -> lis
 
     games = db_query.all()
     return games
+
+
+def collect_mapped_data(scoring_chances: TagFrame) -> ResultMap:
+    """
+    Collects and maps scoring chance data into a structured format.
+
+    Args:
+        scoring_chances (TagFrame): Scoring chances to process.
+
+    Returns:
+        ResultMap: Dictionary mapping shot results to categories with ice and net coordinates.
+            So data[ShotResultTypes][MapCategories] is a list of (int, int)
+                    What outcome?    Net or ice image?   List of coordinates to draw.
+    """
+
+    data: ResultMap = {result: defaultdict(list) for result in ShotResultTypes}
+    for result, source_codes in MAP_SOURCE_CODES.items():
+        rows = np.flatnonzero(np.isin(scoring_chances.result, source_codes))
+        if len(rows) == 0:
+            continue
+
+        ice, net = scoring_chances.coordinates(rows)
+        data[result][MapCategories.ICE] = ice
+        data[result][MapCategories.NET] = net
+
+    return data
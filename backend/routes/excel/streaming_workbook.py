@@ -0,0 +1,433 @@
+import os
+import re
+import threading
+from copy import copy
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+from typing import Any, NamedTuple
+
+import xlsxwriter
+from openpyxl.cell import Cell
+from openpyxl.styles import numbers
+from openpyxl.styles.colors import COLOR_INDEX, Color as OpenpyxlColor
+from openpyxl.styles.numbers import is_date_format
+from openpyxl.worksheet.worksheet import Worksheet
+from xlsxwriter.color import Color
+from xlsxwriter.format import Format
+from xlsxwriter.utility import xl_cell_to_rowcol
+from xlsxwriter.worksheet import Worksheet as XlsxWorksheet
+
+from routes.excel.template_cache import template_cache
+
+# "xlsxwriter" streams the game and player stats exports row by row, "openpyxl" fills copies of the template sheets
+EXCEL_WRITER = os.getenv("EXCEL_WRITER", "xlsxwriter")
+STREAMING_EXPORTS = EXCEL_WRITER == "xlsxwriter"
+
+MAX_SHEET_TITLE_LENGTH = 31
+# xlsxwriter keeps the settings of every column until the workbook is closed, so the template's column ranges
+# reaching the last column of the sheet (XFD) would cost megabytes per sheet. They are cut this many columns,
+# more than a screen's width, past the template's content; further columns have Excel's default width.
+TRAILING_COLUMNS = 30
+# xlsxwriter versions (from, up to but not including) TemplateWorksheet's formula memo has been checked against.
+# It overrides a private method, so other versions write plain worksheets, slower but without relying on it.
+FORMULA_MEMO_XLSXWRITER_VERSIONS = ((3, 2, 5), (3, 3, 0))
+# Distinct formulas kept prepared, the templates have a few thousand
+PREPARED_FORMULAS_SIZE = 10_000
+
+# Number formats openpyxl gives dates and times written to a cell without a date format
+DATE_FORMATS = {
+    datetime: numbers.FORMAT_DATE_DATETIME,
+    date: numbers.FORMAT_DATE_YYYYMMDD2,
+    time: numbers.FORMAT_DATE_TIME6,
+    timedelta: numbers.FORMAT_DATE_TIMEDELTA,
+}
+
+# openpyxl style names -> xlsxwriter format indices
+BORDER_STYLES = {
+    "thin": 1, "medium": 2, "dashed": 3, "dotted": 4, "thick": 5, "double": 6, "hair": 7, "mediumDashed": 8,
+    "dashDot": 9, "mediumDashDot": 10, "dashDotDot": 11, "mediumDashDotDot": 12, "slantDashDot": 13,
+}  # fmt: skip
+FILL_PATTERNS = {
+    "solid": 1, "mediumGray": 2, "darkGray": 3, "lightGray": 4, "darkHorizontal": 5, "darkVertical": 6,
+    "darkDown": 7, "darkUp": 8, "darkGrid": 9, "darkTrellis": 10, "lightHorizontal": 11, "lightVertical": 12,
+    "lightDown": 13, "lightUp": 14, "lightGrid": 15, "lightTrellis": 16, "gray125": 17, "gray0625": 18,
+}  # fmt: skip
+UNDERLINE_STYLES = {"single": 1, "double": 2, "singleAccounting": 33, "doubleAccounting": 34}
+FONT_SCRIPTS = {"superscript": 1, "subscript": 2}
+HORIZONTAL_ALIGNMENTS = {
+    "left": "left", "center": "center", "right": "right", "fill": "fill", "justify": "justify",
+    "centerContinuous": "center_across", "distributed": "distributed",
+}  # fmt: skip
+VERTICAL_ALIGNMENTS = {"top": "top", "center": "vcenter", "justify": "vjustify", "distributed": "vdistributed"}
+
+# Tints of the shades Excel offers for each theme color (xlsxwriter's Color.theme shade indices 0-5)
+THEME_SHADE_TINTS = {
+    0: (0.0, -0.05, -0.15, -0.25, -0.35, -0.5),
+    1: (0.0, 0.5, 0.35, 0.25, 0.15, 0.05),
+    2: (0.0, -0.1, -0.25, -0.5, -0.75, -0.9),
+}
+ACCENT_SHADE_TINTS = (0.0, 0.8, 0.6, 0.4, -0.25, -0.5)
+
+# Cell (row, col) -> (static value, index in SheetLayout.formats)
+LayoutCells = dict[tuple[int, int], tuple[Any, int]]
+MergedRange = tuple[int, int, int, int]  # first row, first col, last row, last col
+
+
+class ColumnLayout(NamedTuple):
+    first_col: int
+    last_col: int
+    width: float | None  # In Excel's character units, as stored in the template
+    hidden: bool
+    format_index: int | None
+
+
+class SheetLayout(NamedTuple):
+    """
+    Everything an export copies from a template sheet: the static labels, formulas and formats of its
+    cells, merged ranges, column widths and row heights. Read once per process from the template file.
+    """
+
+    key: str
+    title: str
+    cells: LayoutCells
+    formats: list[dict]  # xlsxwriter format properties
+    default_format_index: int  # Format of cells written outside the template's cells
+    merged_ranges: list[MergedRange]
+    columns: list[ColumnLayout]
+    row_heights: dict[int, float]
+    default_row_height: float
+    margins: tuple[float, float, float, float]  # left, right, top, bottom
+
+
+def excel_color(color: OpenpyxlColor | None) -> str | Color | None:
+    if color is None:
+        return None
+    if color.type == "rgb" and color.rgb != "00000000":
+        return f"#{color.rgb[-6:]}"
+    if color.type == "theme":
+        tints = THEME_SHADE_TINTS.get(color.theme, ACCENT_SHADE_TINTS)
+        shade = min(range(len(tints)), key=lambda i: abs(tints[i] - color.tint))
+        return Color.theme(color.theme, shade)
+    if color.type == "indexed" and color.indexed < len(COLOR_INDEX) - 2:
+        return f"#{COLOR_INDEX[color.indexed][-6:]}"
+    return None  # Automatic
+
+
+def format_properties(styled: Any) -> dict:
+    """
+    Converts the style of an openpyxl cell (or row/column dimension) to xlsxwriter format properties.
+    Args:
+        styled (Any): An openpyxl object with font, fill, border, alignment, number_format and protection.
+    Returns:
+        dict: Properties for xlsxwriter's Workbook.add_format().
+    """
+
+    props = {}
+
+    font = styled.font
+    if font.name:
+        props["font_name"] = font.name
+    if font.sz:
+        props["font_size"] = font.sz
+    if font.b:
+        props["bold"] = True
+    if font.i:
+        props["italic"] = True
+    if font.u in UNDERLINE_STYLES:
+        props["underline"] = UNDERLINE_STYLES[font.u]
+    if font.strike:
+        props["font_strikeout"] = True
+    if font.vertAlign in FONT_SCRIPTS:
+        props["font_script"] = FONT_SCRIPTS[font.vertAlign]
+    if font_color := excel_color(font.color):
+        props["font_color"] = font_color
+
+    fill = styled.fill
+    if getattr(fill, "fill_type", None) in FILL_PATTERNS:
+        props["pattern"] = FILL_PATTERNS[fill.fill_type]
+        # xlsxwriter's bg_color is the foreground color of a solid fill
+        if fg_color := excel_color(fill.fgColor):
+            props["bg_color" if fill.fill_type == "solid" else "fg_color"] = fg_color
+        if fill.fill_type != "solid" and (bg_color := excel_color(fill.bgColor)):
+            props["bg_color"] = bg_color
+
+    for side_name in ("left", "right", "top", "bottom"):
+        side = getattr(styled.border, side_name)
+        if side is not None and side.style in BORDER_STYLES:
+            props[side_name] = BORDER_STYLES[side.style]
+            if side_color := excel_color(side.color):
+                props[f"{side_name}_color"] = side_color
+
+    alignment = styled.alignment
+    if alignment.horizontal in HORIZONTAL_ALIGNMENTS:
+        props["align"] = HORIZONTAL_ALIGNMENTS[alignment.horizontal]
+    if alignment.vertical in VERTICAL_ALIGNMENTS:
+        props["valign"] = VERTICAL_ALIGNMENTS[alignment.vertical]
+    if alignment.wrap_text:
+        props["text_wrap"] = True
+    if alignment.shrink_to_fit:
+        props["shrink"] = True
+    if alignment.textRotation:
+        props["rotation"] = alignment.textRotation
+    if alignment.indent:
+        props["indent"] = int(alignment.indent)
+
+    if styled.number_format != "General":
+        props["num_format"] = styled.number_format
+
+    if styled.protection.locked is False:
+        props["locked"] = False
+    if styled.protection.hidden:
+        props["hidden"] = True
+
+    return props
+
+
+def read_sheet_layout(key: str, sheet: Worksheet) -> SheetLayout:
+    """Reads the layout of an openpyxl template sheet. Rows and columns are zero indexed, like in xlsxwriter."""
+
+    formats: list[dict] = []
+    format_indexes: dict[tuple, int] = {}
+
+    def format_index(styled: Any) -> int:
+        # The style objects are read through immutable proxies, their copies compare and hash by value
+        style_key = (copy(styled.font), copy(styled.fill), copy(styled.border), copy(styled.alignment), styled.number_format, copy(styled.protection))
+        if style_key not in format_indexes:
+            format_indexes[style_key] = len(formats)
+            formats.append(format_properties(styled))
+        return format_indexes[style_key]
+
+    cells: LayoutCells = {}
+    for row in sheet.iter_rows():
+        for cell in row:
+            if cell.value is None and not cell.has_style:
+                continue
+            cells[(cell.row - 1, cell.column - 1)] = (cell.value, format_index(cell))
+
+    # A new cell of the template's workbook has the workbook's first style
+    default_format_index = format_index(Cell(sheet))
+
+    last_col = max(col for _, col in cells) + TRAILING_COLUMNS
+    columns = []
+    for dimension in sheet.column_dimensions.values():
+        if dimension.min - 1 > last_col:
+            continue
+        columns.append(
+            ColumnLayout(
+                first_col=dimension.min - 1,
+                last_col=min(dimension.max - 1, last_col),
+                width=dimension.width if dimension.customWidth else None,
+                hidden=bool(dimension.hidden),
+                format_index=format_index(dimension) if dimension.has_style else None,
+            )
+        )
+
+    # Columns without dimensions have the sheet's default width
+    default_col_width = sheet.sheet_format.defaultColWidth
+    if default_col_width:
+        next_col = 0
+        for column in sorted(columns, key=lambda column: column.first_col) + [ColumnLayout(last_col + 1, last_col + 1, None, False, None)]:
+            if column.first_col > next_col:
+                columns.append(ColumnLayout(next_col, column.first_col - 1, default_col_width, False, None))
+            next_col = max(next_col, column.last_col + 1)
+
+    return SheetLayout(
+        key=key,
+        title=sheet.title,
+        cells=cells,
+        formats=formats,
+        default_format_index=default_format_index,
+        merged_ranges=[(r.min_row - 1, r.min_col - 1, r.max_row - 1, r.max_col - 1) for r in sheet.merged_cells.ranges],
+        columns=columns,
+        row_heights={index - 1: dimension.ht for index, dimension in sheet.row_dimensions.items() if dimension.ht is not None},
+        default_row_height=sheet.sheet_format.defaultRowHeight,
+        margins=(sheet.page_margins.left, sheet.page_margins.right, sheet.page_margins.top, sheet.page_margins.bottom),
+    )
+
+
+# (template path, sheet index) -> (template version, layout), shared by all the exports of the process
+_layout_cache: dict[tuple[str, int], tuple[tuple[int, int], SheetLayout]] = {}
+_layout_lock = threading.Lock()
+
+
+def get_sheet_layout(template_path: str, sheet_index: int) -> SheetLayout:
+    """
+    Returns the layout of a sheet of an Excel template, read again only when the template file changes.
+    Args:
+        template_path (str): Path to the template workbook.
+        sheet_index (int): Index of the sheet in the template.
+    Returns:
+        SheetLayout: The shared layout, not to be modified.
+    """
+
+    key = (template_path, sheet_index)
+    snapshot = template_cache.get_snapshot(template_path)
+    cached = _layout_cache.get(key)
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+
+    with _layout_lock:
+        cached = _layout_cache.get(key)
+        if cached is None or cached[0] != snapshot.version:
+            template = template_cache.load(template_path)
+            cached = _layout_cache[key] = (snapshot.version, read_sheet_layout(f"{template_path}:{sheet_index}", template.worksheets[sheet_index]))
+
+    return cached[1]
+
+
+def numbered_title(title: str, titles: list[str]) -> str:
+    """
+    The title as is if no other sheet has it (case insensitively), otherwise the title followed by one more
+    than the highest number following it in the other titles, like openpyxl names duplicate sheets.
+    """
+    if title.lower() not in (other.lower() for other in titles):
+        return title
+    numbers_after = re.findall(f"(?:{re.escape(title)})(\\d*),?", ",".join(titles), re.I)
+    return f"{title}{max((int(number) for number in numbers_after if number), default=0) + 1}"
+
+
+def unique_sheet_title(title: str, titles: list[str]) -> str:
+    """Cuts a title to Excel's limit of 31 characters and numbers duplicates the way openpyxl does."""
+    base = title[:MAX_SHEET_TITLE_LENGTH]
+    unique_title = numbered_title(base, titles)
+    while len(unique_title) > MAX_SHEET_TITLE_LENGTH:
+        base = base[:-1]
+        unique_title = numbered_title(base, titles)
+    return unique_title
+
+
+def parse_version(version: str) -> tuple[int, ...] | None:
+    """(major, minor, patch) of a release version string, None for anything else (e.g. a pre-release)."""
+    parts = version.split(".")
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    return tuple(int(part) for part in parts)
+
+
+def formula_memo_supported() -> bool:
+    """Whether the installed xlsxwriter is one TemplateWorksheet's formula memo has been checked against."""
+    version = parse_version(xlsxwriter.__version__)
+    first, end = FORMULA_MEMO_XLSXWRITER_VERSIONS
+    return version is not None and first <= version < end and callable(getattr(XlsxWorksheet, "_prepare_formula", None))
+
+
+# (formula, use_future_functions, expand_future_functions) -> prepared formula, shared by all the exports of the process
+_prepared_formulas: dict[tuple[str, bool, bool], str] = {}
+_prepared_formulas_lock = threading.Lock()
+
+
+class TemplateWorksheet(XlsxWorksheet):
+    """
+    xlsxwriter worksheet that prepares each distinct formula only once per process. xlsxwriter runs dozens of
+    regular expressions over every formula it writes, and every sheet of an export repeats its template's formulas.
+    Only used when formula_memo_supported().
+    """
+
+    def _prepare_formula(self, formula, expand_future_functions=False):
+        key = (formula, self.use_future_functions, expand_future_functions)
+        prepared = _prepared_formulas.get(key)
+        if prepared is None:
+            prepared = super()._prepare_formula(formula, expand_future_functions)
+            with _prepared_formulas_lock:
+                if len(_prepared_formulas) < PREPARED_FORMULAS_SIZE:
+                    _prepared_formulas[key] = prepared
+        return prepared
+
+
+USE_FORMULA_MEMO = formula_memo_supported()
+
+
+class StreamingWorkbook:
+    """
+    Writes a workbook with xlsxwriter in constant_memory mode: each sheet is streamed out one row at a time
+    from a template layout and the values of the sheet, so memory use stays flat however many sheets there are.
+    """
+
+    def __init__(self):
+        self.output = BytesIO()
+        self.workbook = xlsxwriter.Workbook(self.output, {"constant_memory": True, "strings_to_urls": False})
+        self.titles: list[str] = []
+        self._formats: dict[tuple[str, int, str | None], Format] = {}
+
+    def _get_format(self, layout: SheetLayout, format_index: int | None, value: Any = None) -> Format | None:
+        num_format = None
+        if isinstance(value, (date, time, timedelta)):
+            # Dates get a date format, like openpyxl gives them when written to a cell without one
+            if format_index is None or not is_date_format(layout.formats[format_index].get("num_format", "General")):
+                num_format = DATE_FORMATS[datetime if isinstance(value, datetime) else type(value)]
+        if format_index is None and num_format is None:
+            return None
+
+        key = (layout.key, format_index, num_format)
+        cell_format = self._formats.get(key)
+        if cell_format is None:
+            props = dict(layout.formats[format_index]) if format_index is not None else {}
+            if num_format is not None:
+                props["num_format"] = num_format
+            cell_format = self._formats[key] = self.workbook.add_format(props)
+        return cell_format
+
+    def add_sheet(self, layout: SheetLayout, cell_values: dict[str, Any], images: dict[str, bytes] | None = None, title: str | None = None) -> None:
+        """
+        Streams out a sheet with the layout of a template sheet.
+        Args:
+            layout (SheetLayout): Layout of the template sheet, from get_sheet_layout().
+            cell_values (dict[str, Any]): Cell reference (e.g. "B5") -> value, written over the template's cells.
+            images (dict[str, bytes] | None): Anchor cell -> PNG data of the images of the sheet.
+            title (str | None): Title of the sheet, by default the template sheet's title.
+        """
+
+        worksheet_class = TemplateWorksheet if USE_FORMULA_MEMO else None
+        sheet = self.workbook.add_worksheet(unique_sheet_title(title or layout.title, self.titles), worksheet_class=worksheet_class)
+        self.titles.append(sheet.name)
+
+        # 1. Sheet wide settings
+        sheet.set_default_row(layout.default_row_height)
+        sheet.set_margins(*layout.margins)
+        for column in layout.columns:
+            column_format = self._get_format(layout, column.format_index)
+            options = {"hidden": True} if column.hidden else None
+            if column.width is None:
+                sheet.set_column(column.first_col, column.last_col, None, column_format, options)
+            else:
+                # Excel shows widths in whole pixels (7 per character of Calibri 11) and so does xlsxwriter
+                sheet.set_column_pixels(column.first_col, column.last_col, round(column.width * 7), column_format, options)
+
+        for anchor, png in (images or {}).items():
+            sheet.insert_image(anchor, "image.png", {"image_data": BytesIO(png)})
+
+        # 2. Overlay the values on the template's cells
+        cells = dict(layout.cells)
+        for cell_ref, value in cell_values.items():
+            row, col = xl_cell_to_rowcol(cell_ref)
+            static = cells.get((row, col))
+            cells[(row, col)] = (value, static[1] if static else layout.default_format_index)
+
+        merges_by_row: dict[int, list[MergedRange]] = {}
+        for merged_range in layout.merged_ranges:
+            merges_by_row.setdefault(merged_range[0], []).append(merged_range)
+
+        # 3. Stream the rows in order. In constant_memory mode a row is flushed once a later row is written to,
+        #    so everything of a row, including its height and the merges starting on it, is written before moving on.
+        rows = sorted({row for row, _ in cells} | layout.row_heights.keys() | merges_by_row.keys())
+        cells_by_row: dict[int, list[tuple[int, Any, int]]] = {row: [] for row in rows}
+        for (row, col), (value, format_index) in sorted(cells.items()):
+            cells_by_row[row].append((col, value, format_index))
+
+        for row in rows:
+            if row in layout.row_heights:
+                sheet.set_row(row, layout.row_heights[row])
+            for merged_range in merges_by_row.get(row, ()):
+                # Without data and format only the range is registered, the cells are written below with their own formats
+                sheet.merge_range(*merged_range, None)
+            for col, value, format_index in cells_by_row[row]:
+                sheet.write(row, col, value, self._get_format(layout, format_index, value))
+            if not cells_by_row[row]:
+                # A row without cells is skipped when flushing, a blank cell in the default format keeps its height
+                sheet.write_blank(row, 0, None, self._get_format(layout, layout.default_format_index))
+
+    def close(self) -> BytesIO:
+        """Finishes the workbook and returns it as a BytesIO object."""
+        self.workbook.close()
+        self.output.seek(0)
+        return self.output
@@ -1,4 +1,5 @@
 from collections import defaultdict
+from io import BytesIO
 
 from fastapi import Depends, APIRouter, Response
 from sqlalchemy.orm import Session
@@ -8,28 +9,38 @@ from db.db_manager import get_db_session
 from db.models import User, Team 
 from routes.excel.stats_utils import get_selected_games
 from routes.excel.excel_utils import workbook_to_bytesio
+from routes.excel.export_pool import run_export
+from routes.excel.export_cache import get_cached_export
+from routes.excel.export_progress import ExportStage, report_stage
 from routes.excel.team_stats.get_stats import get_team_stats_tags, get_games_stats_dict
 from routes.excel.team_stats.workbook_writer import build_team_stats_workbook, write_total_sheet, write_game_sheets
 
 router = APIRouter()
 
 
-@router.get("/teamstats")
-async def get_teamstats_excel(game_ids: str, db_session: Session = Depends(get_db_session), user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
-    _, team = user_and_team
+def build_team_stats_export(game_ids: str, team: Team, db_session: Session) -> BytesIO:
     games = get_selected_games(game_ids, team, db_session)
 
     # 1. Get the team_stats_tags for the selected games
     all_tags = get_team_stats_tags(games, db_session)
 
     # 2. Build a data container for per game stats, shape: defaultdict[game_id, list[TeamStatsTag]
+    report_stage(ExportStage.AGGREGATING)
     games_stats_dict = get_games_stats_dict(all_tags)
 
     # 3. Builds the full team stats workbook, and returns it as BytesIO object.
     output = build_team_stats_workbook(all_tags, games_stats_dict)
 
+    return output
+
+
+@router.get("/teamstats")
+async def get_teamstats_excel(game_ids: str, db_session: Session = Depends(get_db_session), user_and_team: tuple["User", "Team"] = Depends(get_current_user_and_team)):
+    _, team = user_and_team
+    content = await run_export(get_cached_export, "teamstats", build_team_stats_export, game_ids, team, db_session)
+
     return Response(
-        content=output.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=joukkuetilastot.xlsx"}
+        content=content, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=joukkuetilastot.xlsx"}
     )
 
 
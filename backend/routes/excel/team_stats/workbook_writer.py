@@ -1,10 +1,12 @@
 from collections import defaultdict
 from email.policy import default
 from io import BytesIO
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from db.models import TeamStatsTag
 from routes.excel.team_stats.constants import CHANCE_ROW_MAPPING, FINAL_COLUMNS, VALUE_TO_CHANCE_COLUMN, RESULT_TO_SHIFT_MAP
 from routes.excel.excel_utils import sanitize_opponent_name, workbook_to_bytesio
+from routes.excel.export_progress import ExportStage, report_stage
+from routes.excel.template_cache import load_template
 
 
 def get_chance_row(scoring_chance: TeamStatsTag):
@@ -176,7 +178,8 @@ def build_team_stats_workbook(all_tags: list[TeamStatsTag], games_stats_dict: de
     """
 
     # 1. Load the excel workbook
-    workbook = load_workbook("excels/team_stats_template.xlsx")
+    report_stage(ExportStage.WRITING)
+    workbook = load_template("excels/team_stats_template.xlsx")
 
     # 2. Write the totals stats to the workbook (edits workbook in place)
     write_total_sheet(all_tags, workbook)
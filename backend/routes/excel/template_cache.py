@@ -0,0 +1,72 @@
+import copyreg
+import os
+import pickle
+import threading
+from io import BytesIO
+from typing import NamedTuple
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.indexed_list import IndexedList
+
+
+class TemplatePickler(pickle.Pickler):
+    # openpyxl's style tables are IndexedLists, which unpickle through append() and so would drop duplicate
+    # entries and shift the style ids of the cells. Rebuilt through the constructor they keep every entry.
+    dispatch_table = {**copyreg.dispatch_table, IndexedList: lambda indexed_list: (IndexedList, (list(indexed_list),))}
+
+
+class TemplateSnapshot(NamedTuple):
+    version: tuple[int, int]  # (mtime_ns, size) of the file the snapshot was parsed from
+    data: bytes  # The parsed workbook, pickled
+
+
+def file_version(path: str) -> tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class TemplateCache:
+    """
+    Process-wide cache of the parsed Excel templates.
+    Each template is parsed once and kept as a pickled snapshot of the openpyxl workbook. Every export
+    unpickles a workbook of its own, which is several times faster than parsing the template's XML, and
+    can edit it freely. A template is parsed again when its file changes on disk.
+    """
+
+    def __init__(self):
+        self.snapshots: dict[str, TemplateSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def get_snapshot(self, path: str) -> TemplateSnapshot:
+        version = file_version(path)
+        snapshot = self.snapshots.get(path)
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self.snapshots.get(path)
+            if snapshot is None or snapshot.version != version:
+                output = BytesIO()
+                TemplatePickler(output, protocol=pickle.HIGHEST_PROTOCOL).dump(load_workbook(path))
+                snapshot = self.snapshots[path] = TemplateSnapshot(version, output.getvalue())
+
+        return snapshot
+
+    def load(self, path: str) -> Workbook:
+        """Returns a new copy of the template workbook, the same as load_workbook(path) would."""
+        return pickle.loads(self.get_snapshot(path).data)
+
+
+template_cache = TemplateCache()
+
+
+def load_template(path: str) -> Workbook:
+    """
+    Loads an Excel template from the process-wide template cache.
+    Args:
+        path (str): Path to the template workbook.
+    Returns:
+        Workbook: A copy of the template of its own, to be filled and saved by the caller.
+    """
+
+    return template_cache.load(path)
@@ -5,6 +5,7 @@ from redis import Redis
 
 from db.pydantic_schemas import PlayerResponse, PlayerUpdate
 from routes.players.players_utils import invalidate_team_cache
+from routes.dashboard.kpi_snapshots import mark_team_stale
 from db.db_manager import get_db_session
 from db.models import Player, User, Team
 from db.redis_client import get_redis
@@ -29,6 +30,8 @@ def update_player(player_id: int, player_data: PlayerUpdate, db_session: Session
     for key, value in update_data.items():
         setattr(player, key, value)
 
+    # The dashboard snapshots and the Excel exports hold player names and numbers, this bumps the data versions of both
+    mark_team_stale(team.id, db_session)
     db_session.commit()
     db_session.refresh(player)
 
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+QUESTION_TREE_PATHS = {
+    "team": Path("./tagging/team_stats_questions.json"),
+    "player": Path("./tagging/player_stats_questions.json"),
+}
+
+
+class QuestionTree:
+    """A question tree serialized once, with a content hash used as its version and ETag."""
+
+    def __init__(self, kind: str, questions: dict):
+        self.kind = kind
+        # Same serialization as FastAPI's JSONResponse, so the body is identical to returning the dict
+        self.body = json.dumps(questions, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+        self.version = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+
+
+def validate_question_tree(kind: str, questions: object) -> None:
+    """
+    Checks the structure of a question tree and that every next_question_id points to an existing question.
+    Raises:
+        ValueError: If the tree is malformed.
+    """
+    if not isinstance(questions, dict) or not isinstance(questions.get("questions"), list):
+        raise ValueError(f"{kind} questions: expected an object with a 'questions' list")
+
+    question_ids = set()
+    for question in questions["questions"]:
+        if not isinstance(question, dict) or not isinstance(question.get("id"), int):
+            raise ValueError(f"{kind} questions: every question needs an integer id")
+        if question["id"] in question_ids:
+            raise ValueError(f"{kind} questions: duplicate question id {question['id']}")
+        for field in ("type", "key", "text"):
+            if not isinstance(question.get(field), str):
+                raise ValueError(f"{kind} question {question['id']}: '{field}' must be a string")
+        question_ids.add(question["id"])
+
+    def check_next(question_id: int, next_question_id: object) -> None:
+        if next_question_id is not None and next_question_id not in question_ids:
+            raise ValueError(f"{kind} question {question_id}: next_question_id {next_question_id} does not exist")
+
+    for question in questions["questions"]:
+        check_next(question["id"], question.get("next_question_id"))
+        options = question.get("options", [])
+        if not isinstance(options, list):
+            raise ValueError(f"{kind} question {question['id']}: 'options' must be a list")
+        for option in options:
+            if not isinstance(option, dict) or "answer" not in option:
+                raise ValueError(f"{kind} question {question['id']}: every option needs an 'answer'")
+            check_next(question["id"], option.get("next_question_id"))
+
+
+class QuestionTreeRegistry:
+    """
+    Process-wide cache of the tagging question trees.
+    The trees are static files shipped with the backend, so they are read, validated and serialized
+    once at startup and served as the same bytes on every request.
+    """
+
+    def __init__(self):
+        self.trees: dict[str, QuestionTree] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """(Re)reads and validates all the question trees. Raises ValueError for a malformed tree."""
+        trees = {}
+        for kind, path in QUESTION_TREE_PATHS.items():
+            questions = json.loads(path.read_text(encoding="utf-8"))
+            validate_question_tree(kind, questions)
+            trees[kind] = QuestionTree(kind, questions)
+
+        with self._lock:
+            self.trees = trees
+
+    def get(self, kind: str) -> QuestionTree:
+        """Returns a question tree, loading the trees on first use."""
+        if not self.trees:
+            self.load()
+        return self.trees[kind]
+
+
+question_trees = QuestionTreeRegistry()
@@ -0,0 +1,133 @@
+from typing import Iterable, TypedDict
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from db.models import GameInRoster, Player
+from db.pydantic_schemas import GameInRosterResponse, PlayerResponse
+
+NUMBER_OF_FORWARD_LINES = 5
+NUMBER_OF_DEFENSE_LINES = 4
+NUMBER_OF_GOALIES = 2
+
+RosterSlot = tuple[int, str]  # (line, position)
+
+# The 25 roster slots in the order the tagging view shows them
+ROSTER_SLOTS: list[RosterSlot] = [
+    *((line, position) for line in range(1, NUMBER_OF_FORWARD_LINES + 1) for position in ("LW", "C", "RW")),
+    *((line, position) for line in range(1, NUMBER_OF_DEFENSE_LINES + 1) for position in ("LD", "RD")),
+    *((line, "G") for line in range(1, NUMBER_OF_GOALIES + 1)),
+]
+
+
+class RosterEntry(TypedDict):
+    id: int
+    player_id: int
+
+
+class RosterDiff(TypedDict):
+    to_insert: list[dict]       # GameInRoster column values
+    to_update: list[dict]       # {"id", "player_id"}
+    to_delete: list[int]        # GameInRoster ids
+
+
+def load_roster_indexes(game_ids: Iterable[int], db: Session) -> dict[int, dict[RosterSlot, RosterEntry]]:
+    """
+    Loads the roster entries of the games with one query and indexes them by (line, position).
+    Returns:
+        dict[int, dict[RosterSlot, RosterEntry]]: game_id -> slot -> entry, for every given game.
+    """
+    game_ids = list(game_ids)
+    indexes: dict[int, dict[RosterSlot, RosterEntry]] = {game_id: {} for game_id in game_ids}
+    rows = db.execute(
+        select(GameInRoster.id, GameInRoster.game_id, GameInRoster.line, GameInRoster.position, GameInRoster.player_id)
+        .where(GameInRoster.game_id.in_(game_ids))
+        .order_by(GameInRoster.id)
+    ).all()
+    for row_id, game_id, line, position, player_id in rows:
+        # A duplicated slot keeps its first entry, the one the tagging view has always shown
+        indexes[game_id].setdefault((line, position), {"id": row_id, "player_id": player_id})
+    return indexes
+
+
+def get_roster_response(game_id: int, db: Session) -> list[GameInRosterResponse]:
+    """The roster of a game in slot order, with empty slots as None players. One query."""
+    rows = db.execute(
+        select(GameInRoster.line, GameInRoster.position, Player)
+        .join(Player, Player.id == GameInRoster.player_id)
+        .where(GameInRoster.game_id == game_id)
+        .order_by(GameInRoster.id)
+    ).all()
+
+    players_by_slot: dict[RosterSlot, Player] = {}
+    for line, position, player in rows:
+        players_by_slot.setdefault((line, position), player)
+
+    roster = []
+    for line, position in ROSTER_SLOTS:
+        player = players_by_slot.get((line, position))
+        roster.append(
+            GameInRosterResponse(
+                line=line,
+                position=position,
+                player=PlayerResponse(
+                    id=player.id,
+                    first_name=player.first_name,
+                    last_name=player.last_name,
+                    jersey_number=player.jersey_number,
+                    position=player.position
+                ) if player else None
+            )
+        )
+    return roster
+
+
+def lineup_from_entries(entries: Iterable[GameInRosterResponse]) -> dict[RosterSlot, int | None]:
+    """Converts frontend roster entries to slot -> player_id, None for a slot to empty."""
+    return {(entry.line, entry.position): entry.player.id if entry.player else None for entry in entries}
+
+
+def diff_roster(game_id: int, lineup: dict[RosterSlot, int | None], current: dict[RosterSlot, RosterEntry]) -> RosterDiff:
+    """
+    Compares a lineup to a game's indexed roster. Slots that are not in the lineup are left as they are.
+    Args:
+        game_id (int): Id of the game.
+        lineup (dict[RosterSlot, int | None]): The wanted player of each slot, None to empty the slot.
+        current (dict[RosterSlot, RosterEntry]): The game's roster from load_roster_indexes().
+    Returns:
+        RosterDiff: The rows to insert, update and delete.
+    """
+    diff: RosterDiff = {"to_insert": [], "to_update": [], "to_delete": []}
+    for (line, position), player_id in lineup.items():
+        entry = current.get((line, position))
+        if entry is None:
+            if player_id is not None:
+                diff["to_insert"].append({"game_id": game_id, "line": line, "position": position, "player_id": player_id})
+        elif player_id is None:
+            diff["to_delete"].append(entry["id"])
+        elif player_id != entry["player_id"]:
+            diff["to_update"].append({"id": entry["id"], "player_id": player_id})
+    return diff
+
+
+def apply_roster_diffs(diffs: Iterable[RosterDiff], db: Session) -> dict[str, int]:
+    """
+    Applies roster diffs with one bulk statement per operation. Does not commit.
+    Returns:
+        dict[str, int]: Number of added, updated and removed entries.
+    """
+    to_insert, to_update, to_delete = [], [], []
+    for diff in diffs:
+        to_insert.extend(diff["to_insert"])
+        to_update.extend(diff["to_update"])
+        to_delete.extend(diff["to_delete"])
+
+    if to_insert:
+        db.execute(insert(GameInRoster), to_insert)
+    if to_update:
+        # Bulk UPDATE by primary key
+        db.execute(update(GameInRoster), to_update)
+    if to_delete:
+        db.execute(delete(GameInRoster).where(GameInRoster.id.in_(to_delete)))
+
+    return {"added": len(to_insert), "updated": len(to_update), "removed": len(to_delete)}
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import AsyncIterator, Literal, TypedDict
+
+from fastapi import Request
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+
+from db.redis_client import get_redis_url
+
+logger = logging.getLogger(__name__)
+
+TagEventType = Literal["tag-created", "tag-deleted", "roster-updated"]
+
+CHANNEL_PREFIX = "tagging:game:"
+CHANNEL_PATTERN = f"{CHANNEL_PREFIX}*"
+
+# Events buffered per connected client, a client this far behind is disconnected and resyncs on reconnect
+SUBSCRIBER_QUEUE_SIZE = 256
+# Seconds to skip Redis after a failed publish, so a Redis outage does not slow down every tagging request
+REDIS_RETRY_SECONDS = 30
+REDIS_RECONNECT_SECONDS = 5
+# Comment line sent on idle streams so proxies and the free-tier load balancer keep the connection open
+KEEPALIVE_SECONDS = 15
+
+
+class TagEvent(TypedDict):
+    type: TagEventType
+    game_id: int
+    data: dict
+
+
+def channel_for_game(game_id: int) -> str:
+    return f"{CHANNEL_PREFIX}{game_id}"
+
+
+class TagEventBroker:
+    """
+    Fans the tag and roster events of a game out to the clients streaming that game.
+    Every worker process has one broker holding the queues of its own clients. Events are published
+    to Redis pub/sub and each broker delivers the events it receives from Redis to its clients, so a
+    change made through one Uvicorn worker reaches the clients connected to the others.
+    Without Redis the events are delivered to the clients of the publishing process only.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[int, set[asyncio.Queue]] = {}
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.listener_task: asyncio.Task | None = None
+        self.listening = False  # True while subscribed to Redis
+        self._redis: Redis | None = None
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+
+    # Publishing, called from the (sync) route handlers after the commit
+
+    def publish(self, game_id: int, event_type: TagEventType, data: dict) -> None:
+        event: TagEvent = {"type": event_type, "game_id": game_id, "data": data}
+        published = self._publish_to_redis(event)
+
+        # The Redis listener delivers to this process's clients; deliver directly if it is not running
+        if not (published and self.listening):
+            self._deliver_threadsafe(event)
+
+    def _publish_to_redis(self, event: TagEvent) -> bool:
+        if time.monotonic() < self._redis_down_until:
+            return False
+        try:
+            with self._lock:
+                if self._redis is None:
+                    self._redis = Redis.from_url(get_redis_url(), decode_responses=True, socket_connect_timeout=1, socket_timeout=1)
+            self._redis.publish(channel_for_game(event["game_id"]), json.dumps(event))
+            return True
+        except RedisError as e:
+            self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            logger.warning(f"⚠️ Failed to publish a tag event to Redis, delivering locally only: {e}")
+            return False
+
+    def _deliver_threadsafe(self, event: TagEvent) -> None:
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return  # Nobody has subscribed in this process
+        loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: TagEvent) -> None:
+        for queue in list(self.subscribers.get(event["game_id"], ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow a client, end its stream instead of buffering without limit
+                self.unsubscribe(event["game_id"], queue)
+
+    # Subscribing, called from the event loop
+
+    def subscribe(self, game_id: int) -> asyncio.Queue:
+        self.loop = asyncio.get_running_loop()
+        if self.listener_task is None or self.listener_task.done():
+            self.listener_task = self.loop.create_task(self._listen())
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.setdefault(game_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, game_id: int, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.get(game_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[game_id]
+
+    def is_subscribed(self, game_id: int, queue: asyncio.Queue) -> bool:
+        return queue in self.subscribers.get(game_id, ())
+
+    async def _listen(self) -> None:
+        """Delivers the events from Redis to this process's clients, reconnecting until the broker is closed."""
+        while True:
+            client = AsyncRedis.from_url(get_redis_url(), decode_responses=True)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(CHANNEL_PATTERN)
+                    self.listening = True
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        try:
+                            self._deliver(json.loads(message["data"]))
+                        except (ValueError, KeyError) as e:
+                            logger.warning(f"⚠️ Skipping a malformed tag event: {e}")
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as e:
+                logger.warning(f"⚠️ Tag event listener lost Redis, retrying in {REDIS_RECONNECT_SECONDS}s: {e}")
+            finally:
+                self.listening = False
+                await client.aclose()
+            await asyncio.sleep(REDIS_RECONNECT_SECONDS)
+
+    async def close(self) -> None:
+        if self.listener_task is not None:
+            self.listener_task.cancel()
+            try:
+                await self.listener_task
+            except asyncio.CancelledError:
+                pass
+            self.listener_task = None
+        if self._redis is not None:
+            self._redis.close()
+            self._redis = None
+
+
+tag_events = TagEventBroker()
+
+
+def format_sse(event: TagEvent) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream_game_events(game_id: int, request: Request) -> AsyncIterator[str]:
+    """Yields the events of a game as SSE messages until the client disconnects or falls too far behind."""
+    queue = tag_events.subscribe(game_id)
+    try:
+        yield f"retry: {REDIS_RECONNECT_SECONDS * 1000}\n\n"
+        while tag_events.is_subscribed(game_id, queue):
+            if await request.is_disconnected():
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        tag_events.unsubscribe(game_id, queue)
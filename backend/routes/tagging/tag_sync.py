@@ -0,0 +1,36 @@
+from typing import Iterable
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from db.models import Game
+
+
+def claim_sync_seqs(game_ids: Iterable[int], db: Session) -> dict[int, int]:
+    """
+    Hands out the next tag sync sequence number of each game, for the tags and tombstones a transaction writes.
+    Bumping games.tag_sync_seq locks the game's row until the transaction ends, so the tag writes of a game
+    commit in the order of their sequence numbers, unlike ids, which are handed out before the commit.
+    Call it before writing the rows and commit soon after. Does not commit.
+    Args:
+        game_ids (Iterable[int]): Ids of the games the transaction writes tags or tombstones of.
+        db (Session): Database session.
+    Returns:
+        dict[int, int]: game_id -> the sequence number to write to the game's rows.
+    """
+
+    seqs = {}
+    # One game at a time in id order, so two transactions writing the same games can not deadlock
+    for game_id in sorted(set(game_ids)):
+        seqs[game_id] = db.execute(
+            update(Game).where(Game.id == game_id).values(tag_sync_seq=Game.tag_sync_seq + 1).returning(Game.tag_sync_seq)
+        ).scalar_one()
+    return seqs
+
+
+def get_committed_sync_seq(game_id: int, db: Session) -> int:
+    """
+    The game's last committed tag sync sequence number. Every row with a sequence number up to it has been
+    committed, so reading the rows after a cursor up to this number never skips a row committed later.
+    """
+    return db.execute(select(Game.tag_sync_seq).where(Game.id == game_id)).scalar_one()
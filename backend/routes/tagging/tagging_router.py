@@ -1,11 +1,31 @@
-from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, status
-import json
-from db.pydantic_schemas import AddTag, TagSchema, GameInRosterResponse, PlayerResponse, TeamStatsTagResponse, PlayerStatsTagResponse
-from db.models import User, Game, ShotResult, ShotType, ShotResultTypes, ShotTypeTypes, TeamStatsTag, PlayerStatsTag, PlayerStatsTagOnIce, PlayerStatsTagParticipating, ShotArea, ShotAreaTypes, GameInRoster
+from enum import Enum
+from typing import Optional, TypedDict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import RedirectResponse, StreamingResponse
+import logging
+from sqlalchemy import insert, select
+from db.pydantic_schemas import AddTag, AddTagsBatch, TagSchema, GameInRosterResponse, TeamStatsTagResponse, PlayerStatsTagResponse, PlayerStatsTagsBatchResponse, RosterCopy, StreamTicketResponse
+from db.models import User, Game, Player, ShotResultTypes, ShotTypeTypes, TeamStatsTag, PlayerStatsTag, PlayerStatsTagOnIce, PlayerStatsTagParticipating, ShotAreaTypes, TagTombstone, TAG_KIND_TEAM, TAG_KIND_PLAYER
 from db.db_manager import get_db_session
+from db.lookups import LookupRegistry, lookups
 from sqlalchemy.orm import Session
-from utils import get_current_user_id
+from utils import STREAM_TICKET_MINUTES, create_stream_ticket, get_current_user_id, get_current_user_id_for_stream, etag_matches
+from routes.dashboard.kpi_snapshots import mark_games_stale
+from routes.tagging.question_trees import question_trees
+from routes.tagging.tag_events import tag_events, stream_game_events
+from routes.tagging.tag_sync import claim_sync_seqs, get_committed_sync_seq
+from routes.tagging.roster_service import ROSTER_SLOTS, apply_roster_diffs, diff_roster, get_roster_response, lineup_from_entries, load_roster_indexes
+
+logger = logging.getLogger(__name__)
+
+# Upper limit for one queued flush from the frontend, a game has roughly 60-120 player tags
+MAX_TAGS_PER_BATCH = 500
+
+# The question files only change with a deploy: the plain URL is revalidated, the versioned URL is immutable
+QUESTIONS_CACHE_CONTROL = "public, no-cache"
+QUESTIONS_CACHE_CONTROL_VERSIONED = "public, max-age=31536000, immutable"
+
+MAX_PLAYER_TAGS_PAGE = 1000
 
 router = APIRouter(
     prefix="/tagging",
@@ -13,21 +33,42 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def question_tree_response(request: Request, kind: str, version: str | None = None) -> Response:
+    """
+    Serves a preloaded question tree.
+    The unversioned URL is revalidated with the ETag on every use, the versioned URL
+    (/questions/{kind}/{version}) never changes and may be cached for good.
+    An outdated version redirects to the current one.
+    """
+    tree = question_trees.get(kind)
+    if version is not None and version != tree.version:
+        return RedirectResponse(f"{router.prefix}/questions/{kind}/{tree.version}", status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    headers = {
+        "ETag": tree.etag,
+        "X-Questions-Version": tree.version,
+        "Cache-Control": QUESTIONS_CACHE_CONTROL_VERSIONED if version is not None else QUESTIONS_CACHE_CONTROL,
+    }
+    if etag_matches(request.headers.get("if-none-match"), tree.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=tree.body, media_type="application/json", headers=headers)
+
+
 @router.get("/questions/team")
-def get_questions():
-    questions_json_path = Path("./tagging/team_stats_questions.json")
-    text = questions_json_path.read_text()
-    parsed_json = json.loads(text)
+def get_team_questions(request: Request):
+    return question_tree_response(request, "team")
 
-    return parsed_json
+@router.get("/questions/team/{version}")
+def get_team_questions_version(version: str, request: Request):
+    return question_tree_response(request, "team", version)
 
 @router.get("/questions/player")
-def get_questions():
-    questions_json_path = Path("./tagging/player_stats_questions.json")
-    text = questions_json_path.read_text()
-    parsed_json = json.loads(text)
+def get_player_questions(request: Request):
+    return question_tree_response(request, "player")
 
-    return parsed_json
+@router.get("/questions/player/{version}")
+def get_player_questions_version(version: str, request: Request):
+    return question_tree_response(request, "player", version)
 
 @router.post("/add-team-tag")
 def add_game_stats_tag(tag_data: AddTag, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
@@ -38,15 +79,32 @@ def add_game_stats_tag(tag_data: AddTag, db_session: Session = Depends(get_db_se
         tag_for_model[key_to_use] = value
 
     new_team_stats_tag = TeamStatsTag(**tag_for_model)
+    new_team_stats_tag.sync_seq = claim_sync_seqs([new_team_stats_tag.game_id], db_session)[new_team_stats_tag.game_id]
     db_session.add(new_team_stats_tag)
     db_session.commit()
 
+    tag_events.publish(new_team_stats_tag.game_id, "tag-created", {"kind": TAG_KIND_TEAM, "ids": [new_team_stats_tag.id]})
+
     return TeamStatsTagResponse(id=new_team_stats_tag.id, succes=True, tag=filtered_tag)
 
 
-@router.post("/add-players-tag")
-def add_tag(tag_data: AddTag, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
-    received_tag = tag_data.tag
+class ParsedPlayerTag(TypedDict):
+    columns: dict
+    on_ice_ids: list[int]
+    participant_ids: list[int]
+
+
+def parse_player_tag(received_tag: dict, registry: LookupRegistry) -> ParsedPlayerTag:
+    """
+    Validates a player stats tag sent by the frontend and converts it to PlayerStatsTag column values.
+    Args:
+        received_tag (dict): The tag as sent by the frontend.
+        registry (LookupRegistry): Loaded lookup registry used to resolve the result, area and type ids.
+    Returns:
+        ParsedPlayerTag: Column values of the tag and the ids of the players on ice and participating.
+    Raises:
+        HTTPException: 400 for bad coordinates or unknown lookup values.
+    """
 
     shot_location = received_tag["location"]
     shot_zone = received_tag["shotZone"]
@@ -58,22 +116,22 @@ def add_tag(tag_data: AddTag, db_session: Session = Depends(get_db_session), cur
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad coordinates")
 
     shot_result_enum = ShotResultTypes.from_string(received_tag["shot_result"])
-    shot_result_ref = db_session.query(ShotResult).filter(ShotResult.value == shot_result_enum).first()
-    if not shot_result_ref:
+    shot_result_id = registry.results.id_of(shot_result_enum)
+    if shot_result_id is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad shot result")
 
     shot_area_enum = ShotAreaTypes.from_string(shot_zone)
-    shot_area_ref = db_session.query(ShotArea).filter(ShotArea.value == shot_area_enum).first()
-    if not shot_area_ref:
+    shot_area_id = registry.areas.id_of(shot_area_enum)
+    if shot_area_id is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad shot area")
 
     if received_tag["shot_type"]:
         shot_type_enum = ShotTypeTypes.from_string(received_tag["shot_type"])
-        shot_type_ref = db_session.query(ShotType).filter(ShotType.value == shot_type_enum).first()
-        if not shot_type_ref:
+        shot_type_id = registry.types.id_of(shot_type_enum)
+        if shot_type_id is None:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad shot type")
     else:
-        shot_type_ref = None
+        shot_type_id = None
 
     cross_ice = received_tag.get("crossice", None)
     if received_tag.get("shooter"):
@@ -81,48 +139,122 @@ def add_tag(tag_data: AddTag, db_session: Session = Depends(get_db_session), cur
     else:
         shooter_id = None
 
+    columns = {
+        "shot_result_id": shot_result_id,
+        "ice_x": shot_location["x"],
+        "ice_y": shot_location["y"],
+        "shot_area_id": shot_area_id,
+        "net_x": net_location["x"],
+        "net_y": net_location["y"],
+        "net_height": shot_height,
+        "net_width": shot_width,
+        "shot_type_id": shot_type_id,
+        "game_id": received_tag["game_id"],
+        "crossice": cross_ice,
+        "strengths": received_tag["strengths"],
+        "shooter_id": shooter_id,
+    }
+
+    return {"columns": columns, "on_ice_ids": list(received_tag["on_ices"]), "participant_ids": list(received_tag["participations"])}
+
+
+@router.post("/add-players-tag")
+def add_tag(tag_data: AddTag, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
+    # Resolve the lookup ids from the in-memory registry, no queries needed
+    parsed_tag = parse_player_tag(tag_data.tag, lookups.ensure_loaded(db_session))
+
     try:
-        new_tag = PlayerStatsTag(
-            shot_result=shot_result_ref,
-            ice_x=shot_location["x"],
-            ice_y=shot_location["y"],
-            shot_area=shot_area_ref,
-            net_x = net_location["x"],
-            net_y = net_location["y"],
-            net_height=shot_height,
-            net_width=shot_width,
-            shot_type=shot_type_ref,
-            game_id=received_tag["game_id"],
-            crossice=cross_ice,
-            strengths=received_tag["strengths"],
-            shooter_id=shooter_id,
-
-        )
+        game_id = parsed_tag["columns"]["game_id"]
+        new_tag = PlayerStatsTag(**parsed_tag["columns"], sync_seq=claim_sync_seqs([game_id], db_session)[game_id])
         db_session.add(new_tag)
         db_session.flush()
 
-        for on_ice_id in received_tag["on_ices"]:
+        for on_ice_id in parsed_tag["on_ice_ids"]:
             new_on_ice_tag = PlayerStatsTagOnIce(
                 player_id=on_ice_id,
                 tag_id=new_tag.id
             )
             db_session.add(new_on_ice_tag)
 
-        for participant_id in received_tag["participations"]:
+        for participant_id in parsed_tag["participant_ids"]:
             new_participant_tag = PlayerStatsTagParticipating(
                 player_id=participant_id,
                 tag_id=new_tag.id
             )
             db_session.add(new_participant_tag)
 
+        mark_games_stale([new_tag.game_id], db_session)
         db_session.commit()
 
     except Exception as e:
         db_session.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error recording the tag to db.")
 
+    tag_events.publish(new_tag.game_id, "tag-created", {"kind": TAG_KIND_PLAYER, "ids": [new_tag.id]})
     return PlayerStatsTagResponse(id=new_tag.id, succes=True)
 
+
+@router.post("/add-players-tags/batch", response_model=PlayerStatsTagsBatchResponse)
+def add_tags_batch(tags_data: AddTagsBatch, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
+    """
+    Records a queue of player stats tags at once.
+    All the tags are validated before anything is written, then the tags and their on-ice and
+    participating rows are written with multi-row inserts in a single transaction.
+    Returns the ids of the new tags in the order the tags were sent.
+    """
+
+    if not tags_data.tags:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No tags to record")
+    if len(tags_data.tags) > MAX_TAGS_PER_BATCH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_TAGS_PER_BATCH} tags per batch")
+
+    # 1. Validate every tag before writing anything
+    registry = lookups.ensure_loaded(db_session)
+    parsed_tags: list[ParsedPlayerTag] = []
+    for index, received_tag in enumerate(tags_data.tags):
+        try:
+            parsed_tags.append(parse_player_tag(received_tag, registry))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Tag {index}: {e.detail}")
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Tag {index}: malformed tag ({e})")
+
+    # 2. Check that all the games belong to the user's team
+    user = db_session.query(User).filter(User.id == current_user_id).first()
+    game_ids = sorted({parsed_tag["columns"]["game_id"] for parsed_tag in parsed_tags})
+    team_game_count = db_session.query(Game).filter(Game.id.in_(game_ids), Game.team_id == user.team_id).count()
+    if team_game_count != len(game_ids):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission for one or more games")
+
+    # 3. Insert the tags and their children in one transaction, a multi-row insert per table
+    try:
+        sync_seqs = claim_sync_seqs(game_ids, db_session)
+        tag_ids = db_session.scalars(
+            insert(PlayerStatsTag).returning(PlayerStatsTag.id, sort_by_parameter_order=True),
+            [{**parsed_tag["columns"], "sync_seq": sync_seqs[parsed_tag["columns"]["game_id"]]} for parsed_tag in parsed_tags],
+        ).all()
+
+        on_ice_rows = [{"tag_id": tag_id, "player_id": player_id} for tag_id, parsed_tag in zip(tag_ids, parsed_tags) for player_id in parsed_tag["on_ice_ids"]]
+        participant_rows = [{"tag_id": tag_id, "player_id": player_id} for tag_id, parsed_tag in zip(tag_ids, parsed_tags) for player_id in parsed_tag["participant_ids"]]
+        if on_ice_rows:
+            db_session.execute(insert(PlayerStatsTagOnIce), on_ice_rows)
+        if participant_rows:
+            db_session.execute(insert(PlayerStatsTagParticipating), participant_rows)
+
+        mark_games_stale(game_ids, db_session)
+        db_session.commit()
+
+    except Exception as e:
+        db_session.rollback()
+        logger.warning(f"⚠️ Failed to record a batch of {len(parsed_tags)} tags: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error recording the tags to db.")
+
+    for game_id in game_ids:
+        game_tag_ids = [tag_id for tag_id, parsed_tag in zip(tag_ids, parsed_tags) if parsed_tag["columns"]["game_id"] == game_id]
+        tag_events.publish(game_id, "tag-created", {"kind": TAG_KIND_PLAYER, "ids": game_tag_ids})
+
+    return PlayerStatsTagsBatchResponse(ids=list(tag_ids), succes=True)
+
 @router.get("/load/team-tags/{game_id}")
 def load_team_tags(game_id: int, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
     user = db_session.query(User).filter(User.id == current_user_id).first()
@@ -134,57 +266,193 @@ def load_team_tags(game_id: int, db_session: Session = Depends(get_db_session),
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to access these tags")
 
 
+# Columns of the tagging view's player tag rows, the shooter outer joined so the whole page is one query
+PLAYER_TAG_COLUMNS = (
+    PlayerStatsTag.id, PlayerStatsTag.game_id, PlayerStatsTag.crossice, PlayerStatsTag.ice_x, PlayerStatsTag.ice_y,
+    PlayerStatsTag.net_x, PlayerStatsTag.net_y, PlayerStatsTag.net_height, PlayerStatsTag.net_width,
+    PlayerStatsTag.shot_area_id, PlayerStatsTag.shot_result_id, PlayerStatsTag.shot_type_id, PlayerStatsTag.strengths,
+    Player.id.label("shooter_id"), Player.first_name, Player.last_name, Player.jersey_number, Player.position,
+)
+
+
+def select_player_tags():
+    return select(*PLAYER_TAG_COLUMNS).outerjoin(Player, Player.id == PlayerStatsTag.shooter_id)
+
+
+def enum_value(value: Enum | None) -> str | None:
+    return value.value if value is not None else None
+
+
+def normalize_player_tag(row, registry: LookupRegistry) -> dict:
+    """
+    Converts a row of select_player_tags() to the tag format the tagging view uses.
+    Args:
+        row: A row of select_player_tags().
+        registry (LookupRegistry): Loaded lookup registry used to resolve the result, area and type values.
+    Returns:
+        dict: The tag, with the shooter only if the tag has one.
+    """
+    normal_tag = {
+        "crossice": row.crossice,
+        "game_id": row.game_id,
+        "location": {"x": row.ice_x, "y": row.ice_y},
+        "net": {"x": row.net_x, "y": row.net_y},
+        "netZone": f"{row.net_height}-{row.net_width}",
+        "shotZone": enum_value(registry.areas.value_of(row.shot_area_id)),
+        "shot_result": enum_value(registry.results.value_of(row.shot_result_id)),
+        "shot_type": enum_value(registry.types.value_of(row.shot_type_id)),
+        "strengths": row.strengths,
+        "id": row.id
+    }
+    if row.shooter_id is not None:
+        normal_tag["shooter"] = {"id": row.shooter_id, "first_name": row.first_name, "last_name": row.last_name, "jersey_number": row.jersey_number, "position": row.position}
+
+    return normal_tag
+
+
 @router.get("/load/player-tags/{game_id}")
-def load_player_tags(game_id: int, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
+def load_player_tags(
+    game_id: int,
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Return the tags that come after this tag id in the chosen order"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PLAYER_TAGS_PAGE, description="Page size, all the tags if not given"),
+    latest_first: bool = Query(False, description="Newest tags first"),
+    db_session: Session = Depends(get_db_session),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Loads the player tags of a game for the tagging view, in id order (newest first with latest_first).
+    Pages are keyset paginated: pass the id of the last tag received as after_id to get the next page.
+    The X-Next-After-Id response header holds that id when more tags remain.
+    """
     user = db_session.query(User).filter(User.id == current_user_id).first()
     game = db_session.query(Game).filter(Game.id == game_id).first()
-    if user.team == game.team:
-        tags = game.player_stats_tags
-        normalized_tags = []
-        for tag in tags:
-            normal_tag = {
-                "crossice": tag.crossice,
-                "game_id": tag.game_id,
-                "location": {"x": tag.ice_x, "y": tag.ice_y},
-                "net": {"x": tag.net_x, "y": tag.net_y},
-                "netZone": f"{tag.net_height}-{tag.net_width}",
-                "shotZone": tag.shot_area.value, 
-                "shot_result": tag.shot_result.value,
-                "shot_type": tag.shot_type.value,
-                "strengths": tag.strengths,
-                "id": tag.id
-            }
-            if tag.shooter:
-                normal_tag["shooter"] = {"id": tag.shooter.id, "first_name": tag.shooter.first_name, "last_name": tag.shooter.last_name, "jersey_number": tag.shooter.jersey_number, "position": tag.shooter.position}
-
-            normalized_tags.append(normal_tag)
-        return normalized_tags
-    else:
+    if game is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+    if user.team_id != game.team_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to access these tags")
 
-def create_position_response(line_n: int, position: str, in_rosters_list: list[GameInRoster]):
-    in_roster_object = next((in_roster for in_roster in in_rosters_list if in_roster.line == line_n and in_roster.position == position), None)
-    if in_roster_object:
-        player_object = in_roster_object.player
-        player_in_roster = GameInRosterResponse(
-            line=in_roster_object.line,
-            position=in_roster_object.position,
-            player=PlayerResponse(
-                id=player_object.id,
-                first_name=player_object.first_name,
-                last_name=player_object.last_name,
-                jersey_number=player_object.jersey_number,
-                position=player_object.position
-            )
-        )
+    query = select_player_tags().where(PlayerStatsTag.game_id == game_id)
+    if latest_first:
+        query = query.order_by(PlayerStatsTag.id.desc())
+        if after_id is not None:
+            query = query.where(PlayerStatsTag.id < after_id)
     else:
-        player_in_roster = GameInRosterResponse(
-            line=line_n,
-            position=position,
-            player=None
-        )
+        query = query.order_by(PlayerStatsTag.id)
+        if after_id is not None:
+            query = query.where(PlayerStatsTag.id > after_id)
+
+    # One extra row tells whether there is a next page
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = db_session.execute(query).all()
+
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-After-Id"] = str(rows[-1].id)
+
+    registry = lookups.ensure_loaded(db_session)
+    return [normalize_player_tag(row, registry) for row in rows]
+
+def parse_sync_cursor(cursor: str | None) -> int | None:
+    """The sequence number of a sync cursor. None for no cursor and for the id-based cursors of older clients, which get a full sync."""
+    if not cursor or "." in cursor:
+        return None
+    try:
+        return int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad sync cursor")
+
+
+@router.get("/sync/{game_id}")
+def sync_tags(
+    game_id: int,
+    cursor: Optional[str] = Query(None, description="Cursor of the previous sync, all the tags if not given"),
+    db_session: Session = Depends(get_db_session),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    Incremental tag sync for coaches tagging the same game.
+    Returns the team and player tags added and the ids of the tags deleted since the cursor, and a new cursor
+    to pass to the next sync. The cursor is the game's tag sync sequence number, which the tag writes take in
+    commit order (see tag_sync.py), so a poll only reads the changes and never skips a slow transaction's rows.
+    Without a cursor (full is true) all the tags of the game are returned and the client replaces its tags.
+    Team and player tags have the same format as in /load/team-tags and /load/player-tags.
+    """
+    user = db_session.query(User).filter(User.id == current_user_id).first()
+    game = db_session.query(Game).filter(Game.id == game_id).first()
+    if game is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+    if user.team_id != game.team_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to access these tags")
+
+    since = parse_sync_cursor(cursor)
+
+    # 1. Everything up to the committed sequence number has been committed, the rows after it are left for the next sync
+    until = get_committed_sync_seq(game_id, db_session)
+
+    def changed(model):
+        condition = (model.game_id == game_id) & (model.sync_seq <= until)
+        return condition if since is None else condition & (model.sync_seq > since)
+
+    # 2. The changes between the cursor and the committed sequence number
+    tombstones = db_session.execute(
+        select(TagTombstone.tag_kind, TagTombstone.tag_id).where(changed(TagTombstone)).order_by(TagTombstone.id)
+    ).all() if since is not None else []
+    team_tags = db_session.scalars(select(TeamStatsTag).where(changed(TeamStatsTag)).order_by(TeamStatsTag.id)).all()
+    player_tag_rows = db_session.execute(select_player_tags().where(changed(PlayerStatsTag)).order_by(PlayerStatsTag.id)).all()
+
+    registry = lookups.ensure_loaded(db_session)
+    return {
+        "cursor": str(until),
+        "full": since is None,
+        "team_tags": team_tags,
+        "player_tags": [normalize_player_tag(row, registry) for row in player_tag_rows],
+        "deleted_team_tag_ids": [tombstone.tag_id for tombstone in tombstones if tombstone.tag_kind == TAG_KIND_TEAM],
+        "deleted_player_tag_ids": [tombstone.tag_id for tombstone in tombstones if tombstone.tag_kind == TAG_KIND_PLAYER],
+    }
+
+@router.post("/events/{game_id}/ticket", response_model=StreamTicketResponse)
+def create_game_events_ticket(game_id: int, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
+    """
+    Issues a ticket for opening the event stream of a game with EventSource: GET /events/{game_id}?ticket=...
+    The ticket is only checked when connecting, so fetch a new one before reconnecting.
+    """
+    user = db_session.query(User).filter(User.id == current_user_id).first()
+    game = db_session.query(Game).filter(Game.id == game_id).first()
+    if game is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+    if user.team_id != game.team_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to access this game")
+
+    return StreamTicketResponse(ticket=create_stream_ticket(current_user_id, game_id), expires_in=STREAM_TICKET_MINUTES * 60)
+
 
-    return player_in_roster
+def get_streamable_game_id(game_id: int, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id_for_stream)) -> int:
+    user = db_session.query(User).filter(User.id == current_user_id).first()
+    game = db_session.query(Game).filter(Game.id == game_id).first()
+    if game is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+    if user.team_id != game.team_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to access this game")
+
+    # The stream stays open for the whole game review, do not hold a db connection for it
+    db_session.close()
+    return game_id
+
+
+@router.get("/events/{game_id}")
+async def game_events(request: Request, game_id: int = Depends(get_streamable_game_id)):
+    """
+    Server-Sent Events stream of a game: tag-created, tag-deleted (data: kind and tag ids) and roster-updated.
+    The event data only names what changed, clients fetch the changes with /sync/{game_id}, also after reconnecting.
+    EventSource can not set headers, so browsers authenticate with a ticket query parameter from POST /events/{game_id}/ticket.
+    """
+    return StreamingResponse(
+        stream_game_events(game_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/roster-for-game")
 def get_roster_for_game(game_id: int, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
@@ -194,65 +462,7 @@ def get_roster_for_game(game_id: int, db_session: Session = Depends(get_db_sessi
     if user.team != game.team:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User has no rights to this game")
 
-    NUMBER_OF_FORWARD_LINES = 5
-    NUMBER_OF_DEFENSE_LINES = 4
-    NUMBER_OF_GOALIES = 2
-
-    players_in_roster = []
-    
-    for i in range(1, NUMBER_OF_FORWARD_LINES + 1):
-        for pos in ["LW", "C", "RW"]:
-            player_in_roster = create_position_response(i, pos, game.in_rosters)
-            players_in_roster.append(player_in_roster)
-
-    for i in range(1, NUMBER_OF_DEFENSE_LINES + 1):
-        for pos in ["LD", "RD"]:
-            player_in_roster = create_position_response(i, pos, game.in_rosters)
-            players_in_roster.append(player_in_roster)
-
-    for i in range(1, NUMBER_OF_GOALIES + 1):
-        player_in_roster = create_position_response(i, "G", game.in_rosters)
-        players_in_roster.append(player_in_roster)
-
-    return players_in_roster
-
-def filter_changed_in_rosters(frontend_entries: list[GameInRosterResponse], db_entries: list[GameInRoster], game_id: int):
-    matched = []
-    for fe_entry in frontend_entries:
-        match = find_in_roster_entry(fe_entry.line, fe_entry.position, db_entries)
-        matched.append((fe_entry, match))
-
-    rows_to_add = []
-    rows_to_delete = []
-    rows_to_update = []
-    for pair in matched:
-        fe_entry = pair[0]
-        db_entry = pair[1]
-
-        if fe_entry.player == None and db_entry == None:
-            continue
-
-        elif fe_entry.player != None and db_entry == None:
-            new_db_entry = GameInRoster(
-                game_id=game_id,
-                line=fe_entry.line,
-                position=fe_entry.position,
-                player_id=fe_entry.player.id
-            )
-            rows_to_add.append(new_db_entry)
-
-        elif fe_entry.player == None and db_entry != None:
-            rows_to_delete.append(db_entry)
-
-        elif fe_entry.player.id != db_entry.player_id:
-            db_entry.player_id = fe_entry.player.id
-            rows_to_update.append(db_entry)
-
-
-    return rows_to_add, rows_to_delete, rows_to_update
-
-def find_in_roster_entry(line: int, position: str, in_rosters: list[GameInRoster]):
-    return next((entry for entry in in_rosters if entry.line == line and entry.position == position), None)
+    return get_roster_response(game_id, db_session)
 
 @router.put("/roster-for-game")
 def update_roster_for_game(game_id: int, new_roster: list[GameInRosterResponse], db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
@@ -263,55 +473,111 @@ def update_roster_for_game(game_id: int, new_roster: list[GameInRosterResponse],
         if user.team != game.team:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to update this game's roster")
 
-        roster_entries_for_game = db_session.query(GameInRoster).filter(GameInRoster.game_id == game_id).all()
-        rows_to_add, rows_to_delete, rows_to_update = filter_changed_in_rosters(new_roster, roster_entries_for_game, game_id)
-
-        for row in rows_to_add:
-            db_session.add(row)
-
-        for row in rows_to_delete:
-            db_session.delete(row)
-
-        for row in rows_to_update:
-            pass
-            # Do nothing change they were already changed inside filter_changed_in_roster()
+        current_roster = load_roster_indexes([game_id], db_session)[game_id]
+        apply_roster_diffs([diff_roster(game_id, lineup_from_entries(new_roster), current_roster)], db_session)
 
+        mark_games_stale([game_id], db_session)
         db_session.commit()
+        tag_events.publish(game_id, "roster-updated", {})
         return {"message": "Roster updated successfully", "success": True}
 
+    except HTTPException:
+        raise
     except Exception as e:
+        db_session.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error processing the roster update")
 
+@router.put("/roster/copy")
+def copy_roster(copy_data: RosterCopy, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
+    """
+    Applies one lineup to many games in one transaction.
+    The lineup is either the whole roster of source_game_id (its empty slots empty the targets' slots too)
+    or the given roster entries, which like PUT /roster-for-game only touch the slots they list.
+    """
+    if (copy_data.source_game_id is None) == (copy_data.roster is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give either source_game_id or roster")
+
+    target_game_ids = list(dict.fromkeys(copy_data.target_game_ids))
+    if not target_game_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No target games")
+
+    # 1. All the games must belong to the user's team
+    user = db_session.query(User).filter(User.id == current_user_id).first()
+    game_ids = {*target_game_ids, *([copy_data.source_game_id] if copy_data.source_game_id is not None else [])}
+    team_game_count = db_session.query(Game).filter(Game.id.in_(game_ids), Game.team_id == user.team_id).count()
+    if team_game_count != len(game_ids):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission for one or more games")
+
+    # 2. The lineup to apply, and the target rosters indexed by slot, loaded together
+    indexes = load_roster_indexes(game_ids, db_session)
+    if copy_data.source_game_id is not None:
+        source_roster = indexes[copy_data.source_game_id]
+        lineup = {slot: source_roster[slot]["player_id"] if slot in source_roster else None for slot in ROSTER_SLOTS}
+    else:
+        lineup = lineup_from_entries(copy_data.roster)
+
+    player_ids = {player_id for player_id in lineup.values() if player_id is not None}
+    team_player_count = db_session.query(Player).filter(Player.id.in_(player_ids), Player.team_id == user.team_id).count()
+    if team_player_count != len(player_ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The lineup has players of another team")
+
+    # 3. Diff every target and apply all the diffs together
+    diffs = [diff_roster(game_id, lineup, indexes[game_id]) for game_id in target_game_ids]
+    try:
+        counts = apply_roster_diffs(diffs, db_session)
+        mark_games_stale(target_game_ids, db_session)
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        logger.warning(f"⚠️ Failed to copy a roster to games {target_game_ids}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error copying the roster")
+
+    for game_id, diff in zip(target_game_ids, diffs):
+        if diff["to_insert"] or diff["to_update"] or diff["to_delete"]:
+            tag_events.publish(game_id, "roster-updated", {})
+
+    return {"message": "Roster copied successfully", "success": True, "game_ids": target_game_ids, **counts}
+
 @router.delete("/delete/team-tag/{tag_id}")
 def update_player(tag_id: int, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
     user = db_session.query(User).filter(User.id == current_user_id).first()
     tag = db_session.query(TeamStatsTag).filter(TeamStatsTag.id == tag_id).first()
-    tag_game = tag.game
 
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
+    tag_game = tag.game
 
     if user.team != tag_game.team:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to delete this tag")
 
+    game_id = tag.game_id
     db_session.delete(tag)
+    # Tombstone for the tag sync of other clients
+    db_session.add(TagTombstone(game_id=game_id, tag_kind=TAG_KIND_TEAM, tag_id=tag.id, sync_seq=claim_sync_seqs([game_id], db_session)[game_id]))
     db_session.commit()
 
+    tag_events.publish(game_id, "tag-deleted", {"kind": TAG_KIND_TEAM, "ids": [tag_id]})
+
     return {"message": "Tag deleted successfully", "success": True}
 
 @router.delete("/delete/player-tag/{tag_id}")
 def update_player(tag_id: int, db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)):
     user = db_session.query(User).filter(User.id == current_user_id).first()
     tag = db_session.query(PlayerStatsTag).filter(PlayerStatsTag.id == tag_id).first()
-    tag_game = tag.game
 
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
+    tag_game = tag.game
 
     if user.team != tag_game.team:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No permission to delete this tag")
 
+    game_id = tag.game_id
     db_session.delete(tag)
+    db_session.add(TagTombstone(game_id=game_id, tag_kind=TAG_KIND_PLAYER, tag_id=tag.id, sync_seq=claim_sync_seqs([game_id], db_session)[game_id]))
+    mark_games_stale([game_id], db_session)
     db_session.commit()
 
+    tag_events.publish(game_id, "tag-deleted", {"kind": TAG_KIND_PLAYER, "ids": [tag_id]})
+
     return {"message": "Tag deleted successfully", "success": True}
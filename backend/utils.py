@@ -4,13 +4,14 @@ from jose import jwt
 from jose.exceptions import JWTError
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+import hashlib
 import os
 import random
 import string
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordBearer
 
 from typing import Optional, Iterable, List, Union
@@ -126,6 +127,10 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+# Game event stream tickets are only checked when the stream connects, a reconnect needs a new ticket
+STREAM_TICKET_MINUTES = 1
+STREAM_TICKET_SCOPE = "game-events"
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -179,6 +184,38 @@ def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
         )
 
 
+def create_stream_ticket(user_id: int, game_id: int) -> str:
+    """
+    Short-lived token for opening the event stream of one game. The browser's EventSource can not send an
+    Authorization header, so the ticket goes in the query string instead of the login token, which would end up
+    in access and proxy logs. It has no "sub", so it is not accepted in place of the login token.
+    """
+    return create_jwt({"scope": STREAM_TICKET_SCOPE, "user_id": user_id, "game_id": game_id}, STREAM_TICKET_MINUTES)
+
+
+def get_current_user_id_for_stream(game_id: int, token: Optional[str] = Depends(optional_oauth2_scheme), ticket: Optional[str] = Query(None)) -> int:
+    """
+    Same as get_current_user_id, but instead of the Authorization header also accepts a ticket query parameter
+    from create_stream_ticket, valid for the game of the stream only.
+    """
+    if token is not None:
+        return get_current_user_id(token)
+
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+    )
+    if ticket is None:
+        raise credentials_exception
+    try:
+        payload = decode_jwt(ticket)
+    except JWTError:
+        raise credentials_exception
+    if payload.get("scope") != STREAM_TICKET_SCOPE or payload.get("game_id") != game_id or payload.get("user_id") is None:
+        raise credentials_exception
+    return payload["user_id"]
+
+
 def get_current_user_and_team(db_session: Session = Depends(get_db_session), current_user_id: int = Depends(get_current_user_id)) -> tuple["User", "Team"]:
     """Retrieve the current user and their team from the database.
     Args:
@@ -236,3 +273,36 @@ def add_creator_code(admin: bool = False, identifier: str | None = None) -> RegC
 
     print(f"Seeded creator code: {random_code}")
     return new_code
+
+
+# =========================================================== #
+# HTTP caching utilities                                      #
+# =========================================================== #
+
+
+def make_etag(*parts: object) -> str:
+    """Build a weak ETag from the given parts (e.g. route name, data version, query params)."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match request header against an ETag, using weak comparison."""
+    if not if_none_match:
+        return False
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    candidates = [opaque(tag) for tag in if_none_match.split(",")]
+    return "*" in candidates or opaque(etag) in candidates
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    """Headers that let the browser keep the response but revalidate it on every use."""
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))